@@ -0,0 +1,18 @@
+"""
+Reproducible benchmarks for the hot paths
+
+- data.seed() fills the database with students, applications, payments,
+  documents and messages at production-like ratios
+  (``manage.py seed_benchmark_data``).
+- views.run() measures latency and query counts of the dashboard, list
+  views, PDF exports and payment polling through the test client, inside a
+  throwaway test database (``manage.py run_benchmarks --output results.json``,
+  ``--compare`` flags regressions against an earlier run).
+- fake_clickpesa is a local stand-in for the ClickPesa API so payment flows
+  can be exercised without the network.
+- loadtest drives a running server with concurrent simulated users
+  (``python -m benchmarks.loadtest``).
+
+The same runs work on SQLite and MySQL: the project settings use MySQL,
+``DJANGO_SETTINGS_MODULE=benchmarks.settings_sqlite`` switches to SQLite.
+"""
@@ -0,0 +1,16 @@
+"""
+Names and password of the generated users, shared by the data generator and
+the load script (which must not import Django)
+"""
+PREFIX = 'bench-'
+PASSWORD = 'benchmark-pass-123'
+ADMIN_USERNAME = f'{PREFIX}admin'
+STAFF_COUNT = 5
+
+
+def staff_username(i):
+    return f'{PREFIX}staff-{i}'
+
+
+def student_username(i):
+    return f'{PREFIX}student-{i}@example.com'
@@ -0,0 +1,210 @@
+"""
+Benchmark data generator
+
+Ratios follow production: most students have one application, some two or
+three; roughly two thirds of applications have a payment (mostly successful,
+a few still pending with ClickPesa); every student uploads several documents
+and exchanges a couple of messages. Rows are bulk-inserted and every user
+shares one password hash, so seeding thousands of students takes seconds.
+All generated usernames start with PREFIX so they can be removed again.
+"""
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from employee.models import UserProfile
+from global_agency.models import ContactMessage, StudentApplication
+from student_portal.models import Application, Document, Message, Payment, StudentProfile
+from student_portal.storage import content_hash_from_name, document_storage
+from .accounts import ADMIN_USERNAME, PASSWORD, PREFIX, STAFF_COUNT, staff_username, student_username
+
+APPLICATIONS_PER_STUDENT = (1, 1, 1, 2, 2, 3)
+PAID_RATIO = 0.65
+PENDING_PAYMENT_RATIO = 0.1
+DOCUMENTS_PER_STUDENT = 4
+MESSAGES_PER_STUDENT = 2
+DISTINCT_DOCUMENTS = 25
+CONTACT_MESSAGES_RATIO = 0.5
+LEGACY_APPLICATIONS_RATIO = 0.25
+BATCH_SIZE = 500
+
+FIRST_NAMES = ['Amina', 'Baraka', 'Neema', 'Juma', 'Rehema', 'Daudi', 'Zawadi', 'Elia', 'Upendo', 'Hamisi']
+LAST_NAMES = ['Mushi', 'Mwakyusa', 'Njau', 'Kimaro', 'Mbwana', 'Said', 'Massawe', 'Lyimo', 'Temba', 'Shayo']
+COUNTRIES = ['Tanzania', 'Kenya', 'India', 'China', 'Turkey', 'Malaysia', 'United Kingdom', 'Canada']
+COURSES = ['Computer Science', 'Medicine', 'Civil Engineering', 'Business Administration', 'Nursing', 'Law']
+STATUSES = ['pending_payment', 'submitted', 'submitted', 'under_review', 'approved', 'rejected', 'selected']
+
+
+def _users(prefix):
+    # MySQL's bulk_create does not return primary keys, so read them back
+    return list(User.objects.filter(username__startswith=prefix).order_by('id'))
+
+
+def _document_blobs(rng):
+    """A pool of distinct small files, stored once and shared like real re-uploads"""
+    names = []
+    for i in range(DISTINCT_DOCUMENTS):
+        body = b'%PDF-1.4\n' + bytes(rng.getrandbits(8) for _ in range(2048))
+        names.append(document_storage.save(f'documents/bench-{i}.pdf', ContentFile(body)))
+    return names
+
+
+def seed(students=200, seed=1):
+    """Create ``students`` students and their related rows; returns row counts"""
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+
+    with transaction.atomic():
+        staff_names = [ADMIN_USERNAME] + [staff_username(i) for i in range(STAFF_COUNT)]
+        User.objects.bulk_create([
+            User(username=name, email=f'{name}@example.com', password=password, first_name='Staff', last_name=str(i))
+            for i, name in enumerate(staff_names)
+        ])
+        staff = _users(f'{PREFIX}staff-') + _users(ADMIN_USERNAME)
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, role='admin' if user.username == ADMIN_USERNAME else 'employee',
+                        registration_method='admin')
+            for user in staff
+        ])
+
+        User.objects.bulk_create([
+            User(username=student_username(i), email=student_username(i), password=password,
+                 first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES))
+            for i in range(students)
+        ], batch_size=BATCH_SIZE)
+        users = _users(f'{PREFIX}student-')
+
+        UserProfile.objects.bulk_create(
+            [UserProfile(user=user, role='student', registration_method='self') for user in users],
+            batch_size=BATCH_SIZE,
+        )
+        profiles = [
+            StudentProfile(
+                user=user,
+                phone_number=f'2557{rng.randrange(10 ** 8):08d}',
+                address='Dar es Salaam',
+                # Personal details are complete for about 80% of students
+                date_of_birth=datetime.date(2004, 1, 1) if rng.random() < 0.8 else None,
+                gender=rng.choice(['male', 'female']),
+                olevel_school='Azania Secondary', olevel_year='2019', olevel_gpa='B',
+                preferred_country_1=rng.choice(COUNTRIES), preferred_program_1=rng.choice(COURSES),
+            )
+            for user in users
+        ]
+        for profile in profiles:
+            profile.update_completion()
+        StudentProfile.objects.bulk_create(profiles, batch_size=BATCH_SIZE)
+
+        Application.objects.bulk_create([
+            Application(
+                student=user,
+                application_type=rng.choice(['university', 'university', 'visa', 'scholarship', 'loan']),
+                university_name=f'University of {rng.choice(COUNTRIES)}',
+                course=rng.choice(COURSES),
+                country=rng.choice(COUNTRIES),
+                status=rng.choice(STATUSES),
+            )
+            for user in users
+            for _ in range(rng.choice(APPLICATIONS_PER_STUDENT))
+        ], batch_size=BATCH_SIZE)
+        applications = list(
+            Application.objects.filter(student__username__startswith=f'{PREFIX}student-').order_by('id')
+        )
+
+        payments = []
+        for application in applications:
+            if rng.random() >= PAID_RATIO:
+                continue
+            pending = rng.random() < PENDING_PAYMENT_RATIO
+            payments.append(Payment(
+                student_id=application.student_id,
+                application=application,
+                amount=Decimal('5000.00'),
+                phone_number='255700000000',
+                order_reference=f'BENCH{application.id}X{rng.randrange(10 ** 6)}',
+                status='processing' if pending else 'success',
+                is_successful=not pending,
+                channel='M-PESA',
+            ))
+        Payment.objects.bulk_create(payments, batch_size=BATCH_SIZE)
+        Application.objects.filter(
+            id__in=[payment.application_id for payment in payments if payment.is_successful]
+        ).update(is_paid=True, payment_status='paid')
+
+        blobs = _document_blobs(rng)
+        Document.objects.bulk_create([
+            Document(
+                student=user,
+                document_type=rng.choice(Document.DOCUMENT_TYPES)[0],
+                file=name,
+                content_hash=content_hash_from_name(name),
+                original_filename=f'scan-{i}.pdf',
+                is_verified=rng.random() < 0.5,
+            )
+            for user in users
+            for i, name in enumerate(rng.sample(blobs, DOCUMENTS_PER_STUDENT))
+        ], batch_size=BATCH_SIZE)
+
+        Message.objects.bulk_create([
+            Message(student=user, subject='Application update', message='Your application is being processed.',
+                    is_read=rng.random() < 0.5)
+            for user in users
+            for _ in range(MESSAGES_PER_STUDENT)
+        ], batch_size=BATCH_SIZE)
+
+        ContactMessage.objects.bulk_create([
+            ContactMessage(name=rng.choice(FIRST_NAMES), email=f'{PREFIX}contact-{i}@example.com',
+                           phone='255700000000', destination=rng.choice(COUNTRIES), message='I would like to study abroad.')
+            for i in range(int(students * CONTACT_MESSAGES_RATIO))
+        ], batch_size=BATCH_SIZE)
+
+        StudentApplication.objects.bulk_create([
+            StudentApplication(
+                full_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', gender=rng.choice(['male', 'female']),
+                email=f'{PREFIX}legacy-{i}@example.com', phone='255700000000', address='Arusha',
+                emergency_name='Parent', emergency_address='Arusha', emergency_gender='female', emergency_relation='Mother',
+            )
+            for i in range(int(students * LEGACY_APPLICATIONS_RATIO))
+        ], batch_size=BATCH_SIZE)
+
+    return {
+        'students': len(users),
+        'staff': len(staff),
+        'applications': len(applications),
+        'payments': len(payments),
+        'documents': len(users) * DOCUMENTS_PER_STUDENT,
+        'messages': len(users) * MESSAGES_PER_STUDENT,
+    }
+
+
+def flush():
+    """Delete everything seed() created (blobs are left to gc_documents)"""
+    with transaction.atomic():
+        ContactMessage.objects.filter(email__startswith=PREFIX).delete()
+        StudentApplication.objects.filter(email__startswith=PREFIX).delete()
+        return User.objects.filter(username__startswith=PREFIX).delete()[0]
+
+
+def accounts():
+    """Logins for the load script: staff, and students with their pending payments"""
+    pending = {}
+    for student_id, payment_id in Payment.objects.filter(
+        student__username__startswith=f'{PREFIX}student-', status='processing',
+    ).values_list('student_id', 'id'):
+        pending.setdefault(student_id, []).append(payment_id)
+    students = [
+        {'username': user.username, 'pending_payments': pending.get(user.id, [])}
+        for user in _users(f'{PREFIX}student-')
+    ]
+    # Students who can poll a payment are handed out first
+    students.sort(key=lambda account: not account['pending_payments'])
+    return {
+        'password': PASSWORD,
+        'staff': [staff_username(i) for i in range(STAFF_COUNT)],
+        'students': students,
+    }
@@ -0,0 +1,146 @@
+"""
+Local stand-in for the ClickPesa API
+
+Answers the endpoints ClickPesaService calls (token, USSD push preview and
+initiation, card payments, payment status) with realistic bodies after a
+configurable delay, so payment flows can be benchmarked without the network.
+A payment reports PROCESSING for the first ``polls_until_success`` status
+checks and SUCCESS afterwards, like a customer entering their PIN.
+
+Standalone (point the app at it with CLICKPESA_BASE_URL):
+
+    python -m benchmarks.fake_clickpesa --port 8765 --latency 150
+"""
+import argparse
+import asyncio
+import json
+import threading
+import uuid
+from collections import Counter
+from http import HTTPStatus
+
+
+class FakeClickPesa:
+    def __init__(self, latency=0.1, polls_until_success=2):
+        self.latency = latency
+        self.polls_until_success = polls_until_success
+        self.polls = Counter()
+        self.server = None
+
+    def respond(self, method, path, body):
+        """(status, payload) for a request"""
+        path = path.split('?', 1)[0].rstrip('/')
+
+        if method == 'POST' and path.endswith('/generate-token'):
+            return 200, {'success': True, 'token': f'Bearer {uuid.uuid4().hex}'}
+        if method == 'POST' and path.endswith(('/preview-ussd-push-request', '/preview-card-payment')):
+            return 200, {'activeMethods': [{'name': 'M-PESA', 'status': 'AVAILABLE', 'fee': 0}]}
+        if method == 'POST' and path.endswith(('/initiate-ussd-push-request', '/initiate-card-payment')):
+            return 200, {
+                'id': uuid.uuid4().hex,
+                'status': 'PROCESSING',
+                'channel': 'M-PESA',
+                'orderReference': body.get('orderReference', ''),
+                'cardPaymentLink': 'https://example.com/pay',
+            }
+        if method == 'GET' and '/payments/' in path:
+            reference = path.rsplit('/', 1)[1]
+            self.polls[reference] += 1
+            done = self.polls[reference] > self.polls_until_success
+            return 200, [{
+                'id': reference.lower(),
+                'orderReference': reference,
+                'status': 'SUCCESS' if done else 'PROCESSING',
+                'paymentReference': f'MP{reference[-8:]}' if done else '',
+                'message': 'Payment received' if done else 'Waiting for customer',
+            }]
+        return 404, {'message': f'No fake for {method} {path}'}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                raw = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    body = {}
+
+                await asyncio.sleep(self.latency)
+                status, payload = self.respond(method, path, body if isinstance(body, dict) else {})
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n'
+                    f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n'.encode() + data
+                )
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}'
+
+    def start_in_thread(self, host='127.0.0.1', port=0):
+        """Serve from a daemon thread (for synchronous callers); returns the base URL"""
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        result = {}
+
+        def run():
+            asyncio.set_event_loop(loop)
+            result['url'] = loop.run_until_complete(self.start(host, port))
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name='fake-clickpesa', daemon=True).start()
+        ready.wait()
+        self._loop = loop
+        return result['url']
+
+    def stop(self):
+        loop = getattr(self, '_loop', None)
+        if loop is not None:
+            loop.call_soon_threadsafe(self.server.close)
+            loop.call_soon_threadsafe(loop.stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=150, help='milliseconds per request')
+    parser.add_argument('--polls-until-success', type=int, default=2)
+    args = parser.parse_args()
+
+    fake = FakeClickPesa(args.latency / 1e3, args.polls_until_success)
+
+    async def serve():
+        url = await fake.start(args.host, args.port)
+        print(f'Fake ClickPesa listening on {url} (set CLICKPESA_BASE_URL={url})')
+        async with fake.server:
+            await fake.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""
+Concurrent load against a running server
+
+Simulated users (asyncio, standard library only) browse the public pages,
+log in as generated students who open their dashboard and poll a pending
+payment, or log in as staff who work through the dashboard, list views and
+PDF export. Each user sends its own X-Forwarded-For address, standing in for
+the proxy in front of production; start the server with NUM_PROXIES=1 so the
+rate limits trust that header and apply per user. Without it every user
+shares 127.0.0.1 and the logins soon get 429s.
+
+    python manage.py seed_benchmark_data --students 500 --accounts accounts.json
+    python -m benchmarks.fake_clickpesa --port 8765 &     # or --fake-clickpesa below
+    NUM_PROXIES=1 CLICKPESA_BASE_URL=http://127.0.0.1:8765 gunicorn globalagency_project.wsgi
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8000 \\
+        --accounts accounts.json --users 50 --duration 60 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import statistics
+import sys
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from .fake_clickpesa import FakeClickPesa
+
+# Share of simulated users per kind
+MIX = {'visitor': 0.6, 'student': 0.3, 'staff': 0.1}
+
+CSRF_INPUT_RE = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class Session:
+    """Minimal keep-alive HTTP/1.1 client with a cookie jar"""
+
+    def __init__(self, base_url, client_ip, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.client_ip = client_ip
+        self.timeout = timeout
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, form=None):
+        body = urlencode(form).encode() if form is not None else b''
+        headers = {
+            'Host': f'{self.host}:{self.port}',
+            'User-Agent': 'benchmarks.loadtest',
+            'X-Forwarded-For': self.client_ip,
+            'Content-Length': str(len(body)),
+        }
+        if form is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['Referer'] = f'http://{self.host}:{self.port}{path}'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        raw = f'{method} {path} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in headers.items()) + '\r\n'
+
+        for attempt in (1, 2):
+            if self.writer is None:
+                await self._connect()
+            try:
+                self.writer.write(raw.encode('latin-1') + body)
+                return await asyncio.wait_for(self._read_response(), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The server closed an idle keep-alive connection; retry once
+                await self.close()
+                if attempt == 2:
+                    raise
+
+    async def _read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed')
+        status = int(status_line.split()[1])
+        headers = defaultdict(list)
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()].append(value.strip())
+
+        if headers.get('transfer-encoding', [''])[0].lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            content = b''.join(chunks)
+        elif 'content-length' in headers:
+            content = await self.reader.readexactly(int(headers['content-length'][0]))
+        else:
+            content = await self.reader.read()
+            await self.close()
+
+        for value in headers.get('set-cookie', []):
+            cookie = SimpleCookie()
+            cookie.load(value)
+            for name, morsel in cookie.items():
+                self.cookies[name] = morsel.value
+        if headers.get('connection', [''])[0].lower() == 'close' and self.writer is not None:
+            await self.close()
+        return status, content
+
+
+class Stats:
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+
+    async def call(self, session, label, method, path, form=None, expect=(200,)):
+        start = time.perf_counter()
+        try:
+            status, content = await session.request(method, path, form)
+        except (OSError, asyncio.TimeoutError, ValueError) as e:
+            self.errors[f'{label}: {type(e).__name__}'] += 1
+            return None
+        self.timings[label].append((time.perf_counter() - start) * 1e3)
+        self.statuses[label][status] += 1
+        if status not in expect:
+            self.errors[f'{label}: HTTP {status}'] += 1
+        return content
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for label, timings in sorted(self.timings.items()):
+            timings.sort()
+            endpoints[label] = {
+                'requests': len(timings),
+                'rps': round(len(timings) / elapsed, 2),
+                'p50_ms': round(statistics.median(timings), 1),
+                'p90_ms': round(timings[int(0.9 * (len(timings) - 1))], 1),
+                'p99_ms': round(timings[int(0.99 * (len(timings) - 1))], 1),
+                'max_ms': round(timings[-1], 1),
+                'statuses': dict(self.statuses[label]),
+            }
+        total = sum(len(t) for t in self.timings.values())
+        return {
+            'requests': total,
+            'rps': round(total / elapsed, 2),
+            'errors': dict(self.errors),
+            'endpoints': endpoints,
+        }
+
+
+async def login(stats, session, label, path, username, password):
+    page = await stats.call(session, f'{label} login page', 'GET', path)
+    match = CSRF_INPUT_RE.search(page or b'')
+    if match is None:
+        return False
+    form = {'csrfmiddlewaretoken': match.group(1).decode(), 'username': username, 'password': password}
+    return await stats.call(session, f'{label} login', 'POST', path, form, expect=(302,)) is not None
+
+
+async def visitor(stats, session, think, deadline):
+    pages = ['/', '/universities/countries/', '/tcu-services/', '/vyuo-vya-ndani/', '/start-application/']
+    while time.monotonic() < deadline:
+        path = random.choice(pages)
+        await stats.call(session, path, 'GET', path)
+        await asyncio.sleep(think())
+
+
+async def student(stats, session, think, deadline, account, password):
+    if not await login(stats, session, 'student', '/student-portal/login/', account['username'], password):
+        return
+    while time.monotonic() < deadline:
+        await stats.call(session, 'student dashboard', 'GET', '/student-portal/')
+        await asyncio.sleep(think())
+        await stats.call(session, 'student applications', 'GET', '/student-portal/applications/')
+        # The payment page polls every few seconds while the customer confirms
+        for payment_id in account['pending_payments'][:1]:
+            for _ in range(3):
+                await stats.call(session, 'payment status poll', 'GET', f'/student-portal/payment/{payment_id}/status/')
+                await asyncio.sleep(3)
+        await asyncio.sleep(think())
+
+
+async def staff(stats, session, think, deadline, username, password):
+    if not await login(stats, session, 'staff', '/employee/login/', username, password):
+        return
+    pages = [
+        ('staff dashboard', '/employee/dashboard/'),
+        ('staff application list', '/employee/student-applications/'),
+        ('staff document list', '/employee/documents/'),
+        ('staff contact messages', '/employee/contact-messages/'),
+        ('staff export all pdf', '/employee/student-applications/export-all-pdf/'),
+    ]
+    while time.monotonic() < deadline:
+        label, path = random.choice(pages)
+        await stats.call(session, label, 'GET', path)
+        await asyncio.sleep(think())
+
+
+async def run(args):
+    with open(args.accounts) as f:
+        accounts = json.load(f)
+
+    fake = None
+    if args.fake_clickpesa:
+        fake = FakeClickPesa(args.gateway_latency / 1e3, args.polls_until_success)
+        url = await fake.start(port=args.fake_clickpesa)
+        print(f'Fake ClickPesa on {url}; start the server with NUM_PROXIES=1 CLICKPESA_BASE_URL={url}')
+
+    stats = Stats()
+    deadline = time.monotonic() + args.duration
+
+    def think():
+        return random.uniform(args.think / 2, args.think * 1.5)
+
+    kinds = random.choices(list(MIX), weights=list(MIX.values()), k=args.users)
+    students = iter(accounts['students'])
+    tasks = []
+    for i, kind in enumerate(kinds):
+        session = Session(args.base_url, f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256 + 1}')
+        if kind == 'student':
+            account = next(students, None)
+            if account is None:
+                kind = 'visitor'
+            else:
+                job = student(stats, session, think, deadline, account, accounts['password'])
+        if kind == 'staff':
+            username = accounts['staff'][i % len(accounts['staff'])]
+            job = staff(stats, session, think, deadline, username, accounts['password'])
+        if kind == 'visitor':
+            job = visitor(stats, session, think, deadline)
+
+        async def user(job=job, session=session, delay=random.uniform(0, args.ramp_up)):
+            await asyncio.sleep(delay)
+            try:
+                await job
+            finally:
+                await session.close()
+
+        tasks.append(asyncio.create_task(user()))
+
+    started = time.monotonic()
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+    if fake is not None:
+        fake.server.close()
+    if any(429 in counts for counts in stats.statuses.values()):
+        print('Some requests were rate limited (HTTP 429); is the server running with NUM_PROXIES=1?',
+              file=sys.stderr)
+
+    report = {
+        'meta': {
+            'base_url': args.base_url,
+            'users': args.users,
+            'mix': {kind: kinds.count(kind) for kind in MIX},
+            'duration_s': round(elapsed, 1),
+            'gateway_latency_ms': args.gateway_latency if fake else None,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        **stats.summary(elapsed),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive a running server with simulated users')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--accounts', required=True, help='File written by seed_benchmark_data --accounts')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=60, help='seconds')
+    parser.add_argument('--ramp-up', type=float, default=5, help='seconds over which users start')
+    parser.add_argument('--think', type=float, default=1.0, help='mean seconds between page views')
+    parser.add_argument('--fake-clickpesa', type=int, metavar='PORT', help='Also serve a fake ClickPesa on this port')
+    parser.add_argument('--gateway-latency', type=float, default=150, help='fake ClickPesa delay in ms')
+    parser.add_argument('--polls-until-success', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the report to this JSON file')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
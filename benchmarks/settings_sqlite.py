@@ -0,0 +1,22 @@
+"""
+Project settings on SQLite, for comparing benchmark runs across databases:
+
+    DJANGO_SETTINGS_MODULE=benchmarks.settings_sqlite python manage.py run_benchmarks
+"""
+import os
+
+for name in ('DB_NAME', 'DB_USER', 'DB_PASSWORD'):
+    os.environ.setdefault(name, 'unused')
+# Benchmarks talk to benchmarks.fake_clickpesa, never the real gateway
+os.environ.setdefault('CLICKPESA_CLIENT_ID', 'benchmark-client-id-0000000')
+os.environ.setdefault('CLICKPESA_API_KEY', 'benchmark-api-key-00000000000')
+
+from globalagency_project.settings import *  # noqa: E402,F401,F403
+from globalagency_project.settings import BASE_DIR  # noqa: E402
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'benchmark.sqlite3',
+    }
+}
@@ -0,0 +1,143 @@
+"""
+Per-view latency and query-count benchmarks
+
+Every case is requested through the Django test client as the right kind of
+user: staff for the dashboard, list views and PDF exports, the student who
+owns the data for the portal pages and payment polling. Each case is warmed
+up, then timed over ``iterations`` requests. Query counts come from the last
+request (they do not vary between iterations).
+
+Payment polling goes to a FakeClickPesa that never completes the payment,
+so every poll makes the gateway round trip like a customer who has not
+entered their PIN yet.
+"""
+import statistics
+import time
+from dataclasses import dataclass
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from globalagency_project.utils.perf import percentile
+from student_portal.clickpesa_service import clickpesa_service
+from student_portal.models import Application, Payment
+from . import data
+from .fake_clickpesa import FakeClickPesa
+
+
+@dataclass
+class Case:
+    name: str
+    user: str  # 'staff', 'student' or 'anonymous'
+    url_name: str
+    args: tuple = ()
+    query: str = ''
+
+    def url(self, ids):
+        return reverse(self.url_name, args=[ids[arg] for arg in self.args]) + (f'?{self.query}' if self.query else '')
+
+
+CASES = [
+    Case('employee_dashboard', 'staff', 'employee:employee_dashboard'),
+    Case('student_application_list', 'staff', 'employee:student_application_list'),
+    Case('student_application_list_search', 'staff', 'employee:student_application_list', query='search=Amina'),
+    Case('student_application_detail', 'staff', 'employee:student_application_detail', args=('application',)),
+    Case('document_list', 'staff', 'employee:document_list'),
+    Case('contact_messages', 'staff', 'employee:contact_messages'),
+    Case('export_single_application_pdf', 'staff', 'employee:export_single_application_pdf', args=('application',)),
+    Case('export_all_applications_pdf', 'staff', 'employee:export_all_applications_pdf'),
+    Case('student_dashboard', 'student', 'student_portal:dashboard'),
+    Case('student_applications', 'student', 'student_portal:applications'),
+    Case('student_documents', 'student', 'student_portal:documents'),
+    Case('payment_status_poll', 'student', 'student_portal:check_payment_status', args=('pending_payment',)),
+    Case('home', 'anonymous', 'global_agency:home'),
+]
+
+
+def _fixtures():
+    """Ids and users the cases need, from the seeded data"""
+    payment = Payment.objects.filter(
+        status='processing', student__username__startswith=data.PREFIX,
+    ).select_related('student').order_by('id').first()
+    if payment is None:
+        raise RuntimeError('No pending benchmark payment; seed more students')
+    application = Application.objects.filter(student=payment.student).order_by('id').first()
+    return {
+        'staff': User.objects.get(username=data.ADMIN_USERNAME),
+        'student': payment.student,
+        'application': application.id,
+        'pending_payment': payment.id,
+    }
+
+
+def _summary(timings):
+    timings = sorted(timings)
+    return {
+        'min_ms': round(timings[0], 2),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p90_ms': round(percentile(timings, 0.9), 2),
+        'max_ms': round(timings[-1], 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+    }
+
+
+def run_case(case, client, ids, iterations, warmup=2):
+    url = case.url(ids)
+    for _ in range(warmup):
+        client.get(url)
+
+    timings = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+            timings.append((time.perf_counter() - start) * 1e3)
+    return {
+        'url': url,
+        'status': response.status_code,
+        'queries': len(queries),
+        'bytes': size,
+        **_summary(timings),
+    }
+
+
+def run(iterations=20, cases=None, gateway_latency=0.0):
+    """Run the selected cases (all by default) against the seeded data"""
+    ids = _fixtures()
+    clients = {'anonymous': Client()}
+    for role in ('staff', 'student'):
+        clients[role] = Client()
+        clients[role].force_login(ids[role])
+
+    fake = FakeClickPesa(latency=gateway_latency, polls_until_success=10 ** 9)
+    original_url, clickpesa_service.base_url = clickpesa_service.base_url, fake.start_in_thread()
+    try:
+        return {
+            case.name: run_case(case, clients[case.user], ids, iterations)
+            for case in CASES
+            if cases is None or case.name in cases
+        }
+    finally:
+        clickpesa_service.base_url = original_url
+        fake.stop()
+
+
+def compare(baseline, results, threshold=0.2):
+    """Cases whose median got more than ``threshold`` slower or that run more queries"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+        if result['p50_ms'] > before['p50_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p50 {before['p50_ms']} -> {result['p50_ms']} ms")
+    return regressions
@@ -9,6 +9,10 @@ pip install -r requirements.txt
 echo "=== Collecting static files ===" 
 python manage.py collectstatic --noinput 
  
+echo "=== Building sitemap ===" 
+# lastmod comes from git commit times, so the checkout must include .git 
+python manage.py build_sitemap 
+ 
 echo "=== Applying migrations ===" 
 python manage.py migrate 
  
@@ -0,0 +1,94 @@
+"""
+Status changes applied to many objects at once
+
+Each action locks the selected rows with one SELECT ... FOR UPDATE, writes
+every row that changes with one UPDATE and records their ApplicationEvents
+with one INSERT, all in one transaction, whatever the number of rows.
+
+QuerySet.update() sends no post_save, so the cache tags the signals would
+have bumped are invalidated here after commit.
+
+Every action returns one result per requested id, in request order:
+``{'id': 7, 'result': 'updated' | 'unchanged' | 'not_found'}``.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from global_agency.models import ContactMessage
+from globalagency_project.utils.cache_utils import USER_APPLICATIONS_TAG, invalidate_tags
+from student_portal.models import Application
+from student_portal.notifications import application_event, emit
+
+MAX_ITEMS = 500
+
+
+def _results(ids, found, changed):
+    changed = {obj.pk for obj in changed}
+    return [
+        {'id': pk, 'result': 'updated' if pk in changed else 'unchanged' if pk in found else 'not_found'}
+        for pk in ids
+    ]
+
+
+def _lock_applications(ids):
+    applications = Application.objects.select_for_update().filter(pk__in=ids)
+    return {application.pk: application
+            for application in applications.only('id', 'student_id', 'status', 'payment_status')}
+
+
+def _invalidate_applications(applications):
+    tags = {USER_APPLICATIONS_TAG.format(user_id=application.student_id) for application in applications}
+    if tags:
+        transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+def update_application_status(ids, new_status):
+    """Move the applications to ``new_status``"""
+    now = timezone.now()
+    with transaction.atomic():
+        found = _lock_applications(ids)
+        changed = [application for application in found.values() if application.status != new_status]
+        if changed:
+            Application.objects.filter(pk__in=[application.pk for application in changed]).update(
+                status=new_status, updated_at=now,
+            )
+            emit([application_event(application, 'status', application.status, new_status)
+                  for application in changed])
+            _invalidate_applications(changed)
+    return _results(ids, found, changed)
+
+
+def verify_payments(ids, user, verified, rejection_reason=''):
+    """Mark the applications' M-PESA payments as verified, or rejected with a reason"""
+    new_status = 'paid' if verified else 'rejected'
+    now = timezone.now()
+    changes = {
+        'payment_status': new_status,
+        'is_paid': verified,
+        'payment_verified_at': now,
+        'payment_verified_by': user,
+        'updated_at': now,
+    }
+    if not verified:
+        changes['payment_notes'] = rejection_reason
+    with transaction.atomic():
+        found = _lock_applications(ids)
+        changed = [application for application in found.values() if application.payment_status != new_status]
+        if changed:
+            Application.objects.filter(pk__in=[application.pk for application in changed]).update(**changes)
+            emit([application_event(application, 'payment', application.payment_status, new_status,
+                                    '' if verified else rejection_reason)
+                  for application in changed])
+            _invalidate_applications(changed)
+    return _results(ids, found, changed)
+
+
+def mark_contact_messages(ids, handled):
+    """Mark contact messages as handled or not"""
+    with transaction.atomic():
+        found = {message.pk: message
+                 for message in ContactMessage.objects.select_for_update().filter(pk__in=ids).only('id', 'handled')}
+        changed = [message for message in found.values() if message.handled != handled]
+        if changed:
+            ContactMessage.objects.filter(pk__in=[message.pk for message in changed]).update(handled=handled)
+    return _results(ids, found, changed)
@@ -4,23 +4,29 @@ Password Reset Views for Employee Portal
 from django.shortcuts import render, redirect
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.urls import reverse
-from django.conf import settings
+from global_agency.outbox import queue_email
+from globalagency_project.utils.query_budget import query_budget
 
+@query_budget(5)
 def employee_forgot_password(request):
     """Employee forgot password - request reset"""
     if request.method == 'POST':
-        email = request.POST.get('email')
+        email = request.POST.get('email', '').strip()
+        # Several accounts can share an address; each employee account gets its own link
+        users = list(
+            User.objects.filter(email__iexact=email, is_active=True).select_related('userprofile')
+        ) if email else []
+        employees = [
+            user for user in users
+            if hasattr(user, 'userprofile') and user.userprofile.can_access_employee_portal()
+        ]
         
-        try:
-            user = User.objects.get(email=email)
-            
-            # Check if user is an employee
-            if hasattr(user, 'userprofile') and user.userprofile.can_access_employee_portal():
+        if employees:
+            for user in employees:
                 # Generate token
                 token = default_token_generator.make_token(user)
                 uid = urlsafe_base64_encode(force_bytes(user.pk))
@@ -30,7 +36,7 @@ def employee_forgot_password(request):
                     reverse('employee:password_reset_confirm', kwargs={'uidb64': uid, 'token': token})
                 )
                 
-                # Send email
+                # Queue email; the send_queued_emails worker delivers it
                 subject = 'Password Reset Request - Employee Portal'
                 message = f"""
 Hello {user.first_name},
@@ -47,32 +53,19 @@ If you did not request this reset, please ignore this email and contact your adm
 Best regards,
 Africa Western Education Team
                 """
-                
-                try:
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@africawesternedu.com',
-                        [email],
-                        fail_silently=False,
-                    )
-                    messages.success(request, 'Password reset link has been sent to your email.')
-                except Exception as e:
-                    # If email fails, show console message and still provide success feedback
-                    print(f"Email sending failed: {e}")
-                    print(f"Reset link: {reset_link}")
-                    messages.success(request, 'Password reset instructions have been generated. Check the console for the reset link.')
-                
-                return redirect('employee:employee_login')
-            else:
-                messages.error(request, 'This email is not associated with an employee account.')
+                queue_email(subject, message, [user.email])
             
-        except User.DoesNotExist:
+            messages.success(request, 'Password reset link has been sent to your email.')
+            return redirect('employee:employee_login')
+        elif users:
+            messages.error(request, 'This email is not associated with an employee account.')
+        else:
             messages.error(request, 'No account found with this email address.')
     
     return render(request, 'employee/forgot_password.html')
 
 
+@query_budget(6)
 def employee_password_reset_confirm(request, uidb64, token):
     """Employee password reset confirmation"""
     try:
@@ -1,3 +1,419 @@
-from django.test import TestCase
+import csv
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from global_agency.models import ContactMessage
+from globalagency_project.utils import perf
+from globalagency_project.utils.cache_utils import get_user_application_stats
+from globalagency_project.utils.tabular_export import keyset_rows
+from student_portal.models import Application, ApplicationEvent, Document, Payment, StudentProfile
+from student_portal.notifications import process_all
+from .models import UserProfile
+
+
+def make_photo(size=(3000, 3000)):
+    # Noise so the JPEG is realistically large
+    buffer = BytesIO()
+    Image.effect_noise(size, 64).convert('RGB').save(buffer, 'JPEG', quality=95)
+    return buffer.getvalue()
+
+
+class ApplicationPdfExportTests(TestCase):
+    """The exported PDF embeds the profile picture thumbnail, not the upload"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        staff = User.objects.create_user(username='staff', password='pass12345')
+        UserProfile.objects.create(user=staff, role='employee', registration_method='admin')
+        self.client.force_login(staff)
+
+        self.photo = make_photo()
+        student = User.objects.create_user(username='student@example.com', password='pass12345')
+        StudentProfile.objects.create(
+            user=student,
+            profile_picture=SimpleUploadedFile('me.jpg', self.photo, content_type='image/jpeg'),
+        )
+        self.application = Application.objects.create(student=student, application_type='university')
+
+    def test_pdf_embeds_thumbnail(self):
+        response = self.client.get(f'/employee/student-applications/{self.application.id}/export-pdf/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertLess(len(response.content), len(self.photo) / 10)
+
+
+class DocumentZipTests(TestCase):
+    """Staff download a student's documents as one streamed ZIP"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        staff = User.objects.create_user(username='staff', password='pass12345')
+        UserProfile.objects.create(user=staff, role='employee', registration_method='admin')
+        self.client.force_login(staff)
+
+        self.student = User.objects.create_user(username='student@example.com', password='pass12345')
+        self.application = Application.objects.create(student=self.student, application_type='university')
+        for name, content in (('scan.pdf', b'%PDF-1.4 scan'), ('notes.txt', b'notes ' * 100), ('scan.pdf', b'%PDF-1.4 other')):
+            Document.objects.create(student=self.student, document_type='passport',
+                                    file=SimpleUploadedFile(name, content))
+
+    def read_zip(self, response):
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+
+    def test_student_documents_zip(self):
+        response = self.client.get(
+            reverse('employee:download_student_documents_zip', args=[self.application.id])
+        )
+
+        archive = self.read_zip(response)
+        self.assertIsNone(archive.testzip())
+        infos = {info.filename: info for info in archive.infolist()}
+        self.assertEqual(set(infos), {'Passport - scan.pdf', 'Passport - scan (2).pdf', 'Passport - notes.txt'})
+        self.assertEqual(infos['Passport - scan.pdf'].compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(infos['Passport - notes.txt'].compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.read('Passport - notes.txt'), b'notes ' * 100)
+
+    def test_filtered_list_zip_has_a_folder_per_student(self):
+        other = User.objects.create_user(username='other@example.com', password='pass12345')
+        Document.objects.create(student=other, document_type='cv', file=SimpleUploadedFile('cv.pdf', b'%PDF cv'))
+
+        response = self.client.get(reverse('employee:download_documents_zip'), {'doc_type': 'cv'})
+
+        self.assertEqual(self.read_zip(response).namelist(), ['other@example.com/CV - cv.pdf'])
+
+
+class PerformanceInstrumentationTests(TestCase):
+    """PerformanceMiddleware times requests and the perf page summarises them"""
+
+    def setUp(self):
+        stats_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, stats_dir, ignore_errors=True)
+        override = override_settings(PERF_INSTRUMENTATION_ENABLED=True, PERF_STATS_DIR=stats_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        perf.recorder.reset()
+        self.addCleanup(perf.recorder.reset)
+
+        self.admin = User.objects.create_user(username='admin', password='pass12345')
+        UserProfile.objects.create(user=self.admin, role='admin', registration_method='admin')
+
+    def test_server_timing_header(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('employee:document_list'))
+
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertRegex(timing, r'total;dur=[\d.]+')
+
+    def test_samples_recorded_per_route(self):
+        self.client.force_login(self.admin)
+        for _ in range(3):
+            self.client.get(reverse('employee:document_list'))
+
+        entry = perf.recorder.snapshot()['GET employee:document_list']
+        self.assertEqual(entry['count'], 3)
+        total, db, template, python, queries = entry['samples'][0][:5]
+        self.assertGreater(queries, 0)
+        self.assertGreater(template, 0)
+        self.assertAlmostEqual(total, db + template + python, delta=0.05)
+
+    def test_perf_page_is_admin_only(self):
+        employee = User.objects.create_user(username='staff', password='pass12345')
+        UserProfile.objects.create(user=employee, role='employee', registration_method='admin')
+        self.client.force_login(employee)
+        self.assertEqual(self.client.get(reverse('employee:performance_stats')).status_code, 403)
+
+        self.client.force_login(self.admin)
+        self.client.get(reverse('employee:document_list'))
+        data = self.client.get(reverse('employee:performance_stats'), {'format': 'json'}).json()
+
+        routes = {row['route']: row for row in data['routes']}
+        self.assertEqual(routes['GET employee:document_list']['count'], 1)
+
+    def test_disabled_by_default(self):
+        with override_settings(PERF_INSTRUMENTATION_ENABLED=False):
+            client = self.client_class()
+            response = client.get(reverse('employee:performance_stats'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(perf.percentile(values, 0.5), 50)
+        self.assertEqual(perf.percentile(values, 0.99), 99)
+        self.assertEqual(perf.percentile([7], 0.9), 7)
+
+
+class StudentImportViewTests(TestCase):
+    """Staff upload an intake CSV, dry run first"""
+
+    CSV = b'email,full_name,password\namina@example.com,Amina Mushi,Kilimanjaro-2024\nbroken,Nobody,\n'
+
+    def setUp(self):
+        staff = User.objects.create_user(username='staff', password='pass12345')
+        UserProfile.objects.create(user=staff, role='employee', registration_method='admin')
+        self.client.force_login(staff)
+        self.url = reverse('employee:import_students')
+
+    def upload(self, **data):
+        return self.client.post(self.url, {'file': SimpleUploadedFile('intake.csv', self.CSV, 'text/csv'), **data})
+
+    def test_dry_run_then_import(self):
+        response = self.upload(dry_run='1')
+        self.assertContains(response, 'Dry run: 1 row(s) valid, 1 error(s)')
+        self.assertContains(response, 'Enter a valid email address.')
+        self.assertFalse(User.objects.filter(username='amina@example.com').exists())
+
+        response = self.upload(download_report='1')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('amina@example.com,created', response.content.decode())
+        self.assertTrue(User.objects.get(username='amina@example.com').check_password('Kilimanjaro-2024'))
+
+    @override_settings(STUDENT_IMPORT_MAX_ROWS=1)
+    def test_files_over_the_row_limit_are_refused(self):
+        response = self.upload()
+        self.assertContains(response, 'more than 1 rows')
+        self.assertFalse(User.objects.filter(username='amina@example.com').exists())
+
+    @override_settings(STUDENT_IMPORT_MAX_ROWS=2)
+    def test_row_limit_counts_csv_rows_not_lines(self):
+        self.CSV = b'email,full_name,address\na@example.com,A,"Plot 1\nArusha"\nb@example.com,B,"Box 2\n\nMoshi"\n'
+        response = self.upload(dry_run='1')
+        self.assertContains(response, 'Dry run: 2 row(s) valid')
+
+    def test_students_cannot_import(self):
+        student = User.objects.create_user(username='student@example.com', password='pass12345')
+        UserProfile.objects.create(user=student, role='student', registration_method='self')
+        self.client.force_login(student)
+        self.assertEqual(self.upload().status_code, 403)
+
+
+class ApplicationNotificationTests(TestCase):
+    """Status and payment changes record events for the notification worker"""
+
+    def setUp(self):
+        staff = User.objects.create_user(username='staff', password='pass12345')
+        UserProfile.objects.create(user=staff, role='employee', registration_method='admin')
+        self.client.force_login(staff)
+        student = User.objects.create_user(username='amina@example.com', email='amina@example.com')
+        self.application = Application.objects.create(student=student, application_type='visa',
+                                                      payment_status='pending_verification')
+
+    def test_status_and_payment_changes_are_recorded(self):
+        self.client.post(reverse('employee:update_student_application_status', args=[self.application.id]),
+                         {'status': 'under_review'})
+        self.client.post(reverse('employee:update_student_application_status', args=[self.application.id]),
+                         {'status': 'under_review', 'notes': 'Same status'})
+        self.client.post(reverse('employee:verify_payment', args=[self.application.id]),
+                         {'action': 'reject', 'rejection_reason': 'Receipt unreadable'})
+
+        events = list(self.application.events.order_by('pk').values_list('kind', 'old_value', 'new_value', 'note'))
+        self.assertEqual(events, [
+            ('status', 'pending_payment', 'under_review', ''),
+            ('payment', 'pending_verification', 'rejected', 'Receipt unreadable'),
+        ])
+        self.assertEqual(process_all(window=0), (2, 2))
+
+
+class BulkActionTests(TestCase):
+    """Status and payment changes applied to many selected applications at once"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='pass12345')
+        UserProfile.objects.create(user=self.staff, role='employee', registration_method='admin')
+        self.client.force_login(self.staff)
+        self.student = User.objects.create_user(username='amina@example.com')
+        self.applications = [
+            Application.objects.create(student=self.student, application_type='visa',
+                                       payment_status='pending_verification')
+            for _ in range(3)
+        ]
+        self.ids = [application.id for application in self.applications]
+
+    def post_json(self, name, **data):
+        response = self.client.post(reverse(f'employee:{name}'), data, HTTP_ACCEPT='application/json')
+        return response.status_code, response.json()
+
+    def test_status_update_reports_each_item(self):
+        Application.objects.filter(id=self.ids[0]).update(status='approved')
+        self.assertEqual(get_user_application_stats(self.student.id)['approved'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            status, body = self.post_json('bulk_update_application_status',
+                                          ids=self.ids + [self.ids[1], 999999], status='approved')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body['results'], [
+            {'id': self.ids[0], 'result': 'unchanged'},
+            {'id': self.ids[1], 'result': 'updated'},
+            {'id': self.ids[2], 'result': 'updated'},
+            {'id': 999999, 'result': 'not_found'},
+        ])
+        self.assertEqual(body['counts'], {'unchanged': 1, 'updated': 2, 'not_found': 1})
+        self.assertEqual(Application.objects.filter(status='approved').count(), 3)
+        self.assertEqual(ApplicationEvent.objects.filter(kind='status').count(), 2)
+        # update() sends no post_save; the cached stats are invalidated anyway
+        self.assertEqual(get_user_application_stats(self.student.id)['approved'], 3)
+
+    def test_queries_do_not_grow_with_the_selection(self):
+        def queries(ids):
+            with CaptureQueriesContext(connection) as captured:
+                self.post_json('bulk_verify_payments', ids=ids, action='verify')
+            return len(captured)
+
+        queries([999999])  # The first request also saves the session
+        few = queries(self.ids)
+        many = [Application.objects.create(student=self.student, application_type='visa').id for _ in range(50)]
+        self.assertEqual(queries(many), few)
+
+    def test_form_verifies_payments_and_returns_to_the_list(self):
+        next_url = reverse('employee:student_application_list') + '?status=pending_payment'
+        response = self.client.post(reverse('employee:bulk_verify_payments'),
+                                    {'ids': self.ids[:2], 'action': 'verify', 'next': next_url}, follow=True)
+
+        self.assertRedirects(response, next_url)
+        self.assertContains(response, '2 selected: 2 updated.')
+        verified = Application.objects.filter(payment_status='paid', is_paid=True, payment_verified_by=self.staff)
+        self.assertEqual(sorted(verified.values_list('id', flat=True)), self.ids[:2])
+
+    def test_rejection_records_the_reason(self):
+        self.post_json('bulk_verify_payments', ids=self.ids, action='reject', rejection_reason='No such receipt')
+
+        self.assertEqual(Application.objects.filter(payment_status='rejected', payment_notes='No such receipt',
+                                                    is_paid=False).count(), 3)
+        self.assertEqual(set(ApplicationEvent.objects.values_list('note', flat=True)), {'No such receipt'})
+
+    def test_contact_messages_are_marked_handled(self):
+        ids = [ContactMessage.objects.create(name='Juma', email='juma@example.com').id for _ in range(2)]
+
+        status, body = self.post_json('bulk_mark_contact_messages', ids=ids)
+        self.assertEqual(body['counts'], {'updated': 2})
+        self.assertEqual(ContactMessage.objects.filter(handled=True).count(), 2)
+
+        status, body = self.post_json('bulk_mark_contact_messages', ids=ids[:1], handled='0')
+        self.assertFalse(ContactMessage.objects.get(id=ids[0]).handled)
+
+    def test_invalid_requests_are_refused(self):
+        self.assertEqual(self.post_json('bulk_update_application_status', status='approved'),
+                         (400, {'status': 'error', 'message': 'Select at least one item.'}))
+        self.assertEqual(self.post_json('bulk_update_application_status', ids=self.ids, status='bogus')[0], 400)
+        self.assertEqual(self.post_json('bulk_verify_payments', ids=['x'], action='verify')[0], 400)
+        self.assertEqual(self.client.get(reverse('employee:bulk_verify_payments')).status_code, 405)
+        self.assertFalse(ApplicationEvent.objects.exists())
+
+
+class TabularExportTests(TestCase):
+    """Applications, payments and documents stream out as CSV or XLSX"""
+
+    SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='pass12345')
+        self.profile = UserProfile.objects.create(user=self.staff, role='employee', registration_method='admin')
+        self.client.force_login(self.staff)
+
+        amina = User.objects.create_user(username='amina@example.com', email='amina@example.com',
+                                         first_name='Amina', last_name='Mushi')
+        StudentProfile.objects.create(user=amina, phone_number='255700000001')
+        juma = User.objects.create_user(username='juma@example.com', email='juma@example.com',
+                                        first_name='=HYPERLINK("x")', last_name='Njau')
+        self.approved = Application.objects.create(student=amina, application_type='visa', status='approved',
+                                                   university_name='Université de Lyon')
+        Application.objects.create(student=juma, application_type='university', status='submitted')
+        Payment.objects.create(student=amina, application=self.approved, amount='5000.00',
+                               order_reference='REF1', status='success', is_successful=True)
+
+    def content(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def read_xlsx(self, data):
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            self.assertIn('xl/workbook.xml', archive.namelist())
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        rows = []
+        for row in sheet.iter(f'{self.SHEET_NS}row'):
+            cells = []
+            for cell in row:
+                text = cell.find(f'{self.SHEET_NS}is/{self.SHEET_NS}t')
+                cells.append(text.text or '' if text is not None else cell.find(f'{self.SHEET_NS}v').text)
+            rows.append(cells)
+        return rows
+
+    def test_csv_honours_list_filters(self):
+        data = self.content(reverse('employee:export_applications', args=['csv']) + '?status=approved')
+
+        self.assertTrue(data.startswith(b'\xef\xbb\xbf'))
+        rows = list(csv.reader(StringIO(data.decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:4], ['ID', 'First name', 'Last name', 'Email'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][1:5], ['Amina', 'Mushi', 'amina@example.com', '255700000001'])
+        self.assertIn('Visa Application', rows[1])
+        self.assertIn('Approved', rows[1])
+        self.assertIn('Université de Lyon', rows[1])
+
+    def test_csv_neutralises_formulas(self):
+        data = self.content(reverse('employee:export_applications', args=['csv']) + '?search=Njau')
+        rows = list(csv.reader(StringIO(data.decode('utf-8-sig'))))
+        self.assertEqual(rows[1][1], '\'=HYPERLINK("x")')
+
+    def test_xlsx_workbook(self):
+        rows = self.read_xlsx(self.content(reverse('employee:export_applications', args=['xlsx'])))
+
+        self.assertEqual(rows[0][0], 'ID')
+        # Newest first, one row per application
+        self.assertEqual([row[1] for row in rows[1:]], ['=HYPERLINK("x")', 'Amina'])
+
+    def test_documents_export_honours_filters(self):
+        Document.objects.create(student=self.approved.student, document_type='passport', file='documents/a.pdf')
+        Document.objects.create(student=self.approved.student, document_type='transcript', file='documents/b.pdf',
+                                original_filename='grades.pdf')
+        rows = self.read_xlsx(self.content(reverse('employee:export_documents', args=['xlsx']) + '?doc_type=passport'))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][6], 'a.pdf')
+
+    def test_payments_are_admin_only(self):
+        url = reverse('employee:export_payments', args=['csv'])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.profile.role = 'admin'
+        self.profile.save()
+        rows = list(csv.reader(StringIO(self.content(url + '?status=successful').decode('utf-8-sig'))))
+        self.assertEqual(rows[1][1], 'REF1')
+        self.assertEqual(rows[1][7], '5000.00')
+        self.assertEqual(self.client.get(reverse('employee:export_payments', args=['pdf'])).status_code, 404)
+
+    def test_keyset_pages_cover_every_row_once(self):
+        for _ in range(3):
+            Application.objects.create(student=self.staff, application_type='loan')
+        expected = list(Application.objects.order_by('-pk').values_list('id', flat=True))
+
+        with self.assertNumQueries(3):
+            ids = [row[0] for row in keyset_rows(Application.objects.all(), ('id',), page_size=2)]
+        self.assertEqual(ids, expected)
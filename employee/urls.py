@@ -24,14 +24,28 @@ urlpatterns = [
     # Payment Verification (M-PESA)
     path('student-applications/<int:application_id>/verify-payment/', views.verify_payment, name='verify_payment'),
     
+    # Bulk actions on the selected rows of a list
+    path('student-applications/bulk/status/', views.bulk_update_application_status, name='bulk_update_application_status'),
+    path('student-applications/bulk/verify-payment/', views.bulk_verify_payments, name='bulk_verify_payments'),
+    path('contact-messages/bulk/handled/', views.bulk_mark_contact_messages, name='bulk_mark_contact_messages'),
+    
     # PDF Export
     path('student-applications/<int:application_id>/export-pdf/', views.export_single_application_pdf, name='export_single_application_pdf'),
     path('student-applications/export-all-pdf/', views.export_all_applications_pdf, name='export_all_applications_pdf'),
+    path('student-applications/export.<str:file_format>', views.export_applications, name='export_applications'),
+    path('payments/export.<str:file_format>', views.export_payments, name='export_payments'),
+    path('documents/export.<str:file_format>', views.export_documents, name='export_documents'),
     
     # Documents
     path('documents/', views.document_list, name='document_list'),
+    path('documents/download.zip', views.download_documents_zip, name='download_documents_zip'),
+    path('student-applications/<int:application_id>/documents.zip', views.download_student_documents_zip, name='download_student_documents_zip'),
     
     # Contact messages
     path('contact-messages/', views.contact_messages, name='contact_messages'),
     path('contact-messages/<int:message_id>/update-status/', views.update_message_status, name='update_message_status'),
+    
+    # Request timings (PERF_INSTRUMENTATION_ENABLED)
+    path('perf/', views.performance_stats, name='performance_stats'),
+    path('students/import/', views.import_students, name='import_students'),
 ]
\ No newline at end of file
@@ -1,16 +1,37 @@
+import io
+import os
+from collections import Counter
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q
-from django.views.decorators.csrf import csrf_protect
-from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.http import content_disposition_header, url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 from global_agency.models import ContactMessage, StudentApplication
+from student_portal.importer import IMPORT_FIELDS, ImportFileError, count_rows, import_students as run_student_import
 from student_portal.models import Application, Document, Payment, StudentProfile
+from student_portal.notifications import application_event, emit
+from student_portal.storage import document_storage
+from student_portal.thumbnails import thumbnail_path
+from globalagency_project.utils import perf
+from globalagency_project.utils.query_budget import query_budget
+from globalagency_project.utils.tabular_export import (
+    CSV_CONTENT_TYPE, XLSX_CONTENT_TYPE, keyset_rows, stream_csv, stream_xlsx,
+)
+from globalagency_project.utils.upload_handlers import StreamingUploadHandler, upload_errors
+from globalagency_project.utils.zip_stream import stream_zip, unique_name
 from .models import UserProfile
 from .decorators import employee_required, admin_required
+from . import bulk_actions
 
+@query_budget(12)
 @csrf_protect
 def employee_login(request):
     # If user is already authenticated and can access employee portal, redirect to dashboard
@@ -54,6 +75,7 @@ def employee_login(request):
     
     return render(request, "employee/login.html")
 
+@query_budget(28)
 @login_required
 @employee_required
 def employee_dashboard(request):
@@ -116,6 +138,7 @@ def admin_dashboard(request):
     }
     return render(request, 'employee/admin_dashboard.html', context)
 
+@query_budget(6)
 @login_required
 @csrf_protect
 def employee_logout(request):
@@ -123,6 +146,7 @@ def employee_logout(request):
     messages.success(request, "You have been successfully logged out.")
     return redirect("employee:employee_login")
 
+@query_budget(6)
 @login_required
 @employee_required
 def application_detail(request, pk):
@@ -135,20 +159,20 @@ def application_detail(request, pk):
     }
     return render(request, 'employee/application_detail.html', context)
 
-@login_required
-@employee_required
-def student_application_list(request):
-    """View all student portal applications"""
-    profile = UserProfile.objects.get(user=request.user)
-    
-    # ALL employees see ALL applications (removed admin/employee distinction)
-    applications = Application.objects.all().order_by('-created_at')
+def _filtered_applications(request):
+    """Applications matching the application list's status, completion and search filters"""
+    applications = Application.objects.select_related('student').order_by('-created_at')
     
     # Filter by status if provided
     status_filter = request.GET.get('status')
     if status_filter:
         applications = applications.filter(status=status_filter)
     
+    # Filter by the student's profile completion percentage (indexed)
+    completion_filter = request.GET.get('completion')
+    if completion_filter and completion_filter.isdigit():
+        applications = applications.filter(student__studentprofile__completion_percentage=int(completion_filter))
+    
     # Search functionality
     search_query = request.GET.get('search')
     if search_query:
@@ -160,15 +184,54 @@ def student_application_list(request):
             Q(course__icontains=search_query) |
             Q(country__icontains=search_query)
         )
+    return applications
+
+def _filtered_payments(request):
+    """Payments matching payment management's status and search filters"""
+    payments = Payment.objects.all()
+    
+    status_filter = request.GET.get('status')
+    if status_filter == 'successful':
+        payments = payments.filter(is_successful=True)
+    elif status_filter == 'failed':
+        payments = payments.filter(is_successful=False)
+    elif status_filter:
+        payments = payments.filter(status=status_filter)
+    
+    search_query = request.GET.get('search')
+    if search_query:
+        payments = payments.filter(
+            Q(transaction_id__icontains=search_query) |
+            Q(order_reference__icontains=search_query) |
+            Q(student__username__icontains=search_query) |
+            Q(student__first_name__icontains=search_query) |
+            Q(student__last_name__icontains=search_query)
+        )
+    return payments
+
+@query_budget(6)
+@login_required
+@employee_required
+def student_application_list(request):
+    """View all student portal applications"""
+    profile = UserProfile.objects.get(user=request.user)
+    
+    # ALL employees see ALL applications (removed admin/employee distinction)
+    applications = _filtered_applications(request)
+    status_filter = request.GET.get('status')
+    search_query = request.GET.get('search')
     
     context = {
         'applications': applications,
         'status_filter': status_filter,
+        'completion_filter': request.GET.get('completion', ''),
+        'completion_choices': range(0, 101, 100 // len(StudentProfile.COMPLETION_SECTIONS)),
         'search_query': search_query,
         'is_admin': profile.is_admin(),
     }
     return render(request, 'employee/student_application_list.html', context)
 
+@query_budget(10)
 @login_required
 @employee_required
 def student_application_detail(request, application_id):
@@ -196,6 +259,7 @@ def student_application_detail(request, application_id):
     }
     return render(request, 'employee/student_application_detail.html', context)
 
+@query_budget(11)
 @login_required
 @employee_required
 @csrf_protect
@@ -211,23 +275,21 @@ def update_student_application_status(request, application_id):
         notes = request.POST.get('notes', '')
         
         if new_status in dict(Application.APPLICATION_STATUS):
+            old_status = application.status
             application.status = new_status
             application.notes = notes
-            application.save()
+            with transaction.atomic():
+                application.save()
+                emit([application_event(application, 'status', old_status, new_status)])
             messages.success(request, f'Application status updated to {application.get_status_display()}')
         else:
             messages.error(request, 'Invalid status selected.')
     
     return redirect('employee:student_application_detail', application_id=application_id)
 
-@login_required
-@employee_required
-def document_list(request):
-    """View all uploaded documents"""
-    profile = UserProfile.objects.get(user=request.user)
-    
-    # ALL employees see ALL documents
-    documents = Document.objects.all().order_by('-uploaded_at')
+def _filtered_documents(request):
+    """Documents matching the document list's doc_type and search filters"""
+    documents = Document.objects.select_related('student').order_by('-uploaded_at')
     
     # Filter by document type if provided
     doc_type_filter = request.GET.get('doc_type')
@@ -243,6 +305,19 @@ def document_list(request):
             Q(student__last_name__icontains=search_query) |
             Q(document_type__icontains=search_query)
         )
+    return documents
+
+@query_budget(6)
+@login_required
+@employee_required
+def document_list(request):
+    """View all uploaded documents"""
+    profile = UserProfile.objects.get(user=request.user)
+    
+    # ALL employees see ALL documents
+    documents = _filtered_documents(request)
+    doc_type_filter = request.GET.get('doc_type')
+    search_query = request.GET.get('search')
     
     context = {
         'documents': documents,
@@ -252,6 +327,47 @@ def document_list(request):
     }
     return render(request, 'employee/document_list.html', context)
 
+def _documents_zip_response(documents, filename, folder_per_student):
+    """Stream the documents as a ZIP, one entry per document"""
+    rows = documents.values_list(
+        'file', 'document_type', 'original_filename', 'student__username'
+    )
+    type_names = dict(Document.DOCUMENT_TYPES)
+
+    def entries():
+        used = set()
+        for name, document_type, original_filename, username in rows.iterator():
+            display = (original_filename or os.path.basename(name)).replace('/', '_').replace('\\', '_')
+            arcname = f'{type_names.get(document_type, document_type)} - {display}'
+            if folder_per_student:
+                arcname = f'{username.replace("/", "_")}/{arcname}'
+            yield unique_name(arcname, used), document_storage.path(name)
+
+    response = StreamingHttpResponse(stream_zip(entries()), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    # Let nginx pass the archive through as it is produced
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@query_budget(4)
+@login_required
+@employee_required
+def download_documents_zip(request):
+    """ZIP of the documents currently shown on the (filtered) document list"""
+    documents = _filtered_documents(request)
+    return _documents_zip_response(documents, f'documents-{timezone.now():%Y%m%d}.zip', folder_per_student=True)
+
+@query_budget(5)
+@login_required
+@employee_required
+def download_student_documents_zip(request, application_id):
+    """ZIP of every document uploaded by the application's student"""
+    application = get_object_or_404(Application.objects.select_related('student'), id=application_id)
+    documents = Document.objects.filter(student=application.student).order_by('document_type', 'uploaded_at')
+    filename = f'{application.student.username}-documents.zip'
+    return _documents_zip_response(documents, filename, folder_per_student=False)
+
+@query_budget(7)
 @login_required
 @employee_required
 def contact_messages(request):
@@ -292,6 +408,7 @@ def contact_messages(request):
     }
     return render(request, 'employee/contact_messages.html', context)
 
+@query_budget(11)
 @login_required
 @employee_required
 @csrf_protect
@@ -312,6 +429,21 @@ def update_message_status(request, message_id):
     
     return redirect('employee:contact_messages')
 
+
+@query_budget(8)
+@login_required
+@employee_required
+@require_POST
+@csrf_protect
+def bulk_mark_contact_messages(request):
+    """Mark the selected contact messages as handled, or back to unhandled with handled=0"""
+    fallback = 'employee:contact_messages'
+    ids, error = _selected_ids(request)
+    if error:
+        return _bulk_error(request, error, fallback)
+    handled = request.POST.get('handled', '1') != '0'
+    return _bulk_response(request, bulk_actions.mark_contact_messages(ids, handled), fallback)
+
 @login_required
 @employee_required
 def user_management(request):
@@ -414,25 +546,10 @@ def profile_settings(request):
 @admin_required
 def payment_management(request):
     """Payment management for admins"""
-    payments = Payment.objects.all().order_by('-payment_date')
-    
-    # Filter by status if provided
+    # Same filters as the export, so a download matches the page
+    payments = _filtered_payments(request).order_by('-payment_date')
     status_filter = request.GET.get('status')
-    if status_filter:
-        if status_filter == 'successful':
-            payments = payments.filter(is_successful=True)
-        elif status_filter == 'failed':
-            payments = payments.filter(is_successful=False)
-    
-    # Search functionality
     search_query = request.GET.get('search')
-    if search_query:
-        payments = payments.filter(
-            Q(transaction_id__icontains=search_query) |
-            Q(student__username__icontains=search_query) |
-            Q(student__first_name__icontains=search_query) |
-            Q(student__last_name__icontains=search_query)
-        )
     
     total_revenue = sum(payment.amount for payment in payments.filter(is_successful=True))
     
@@ -668,6 +785,7 @@ def export_application_pdf(request, application_id):
     
     return response
 
+@query_budget(9)
 @login_required
 @employee_required
 def export_all_applications_pdf(request):
@@ -682,7 +800,7 @@ def export_all_applications_pdf(request):
     from io import BytesIO
     from django.utils import timezone as tz
     
-    applications = Application.objects.all().order_by('-created_at')
+    applications = Application.objects.select_related('student').order_by('-created_at')
     
     # Create the HttpResponse object with PDF headers
     response = HttpResponse(content_type='application/pdf')
@@ -776,6 +894,7 @@ def export_all_applications_pdf(request):
     return response
 
 
+@query_budget(11)
 @login_required
 @employee_required
 def verify_payment(request, application_id):
@@ -784,6 +903,7 @@ def verify_payment(request, application_id):
     
     if request.method == 'POST':
         action = request.POST.get('action')
+        old_payment_status = application.payment_status
         
         if action == 'verify':
             # Verify payment
@@ -791,7 +911,9 @@ def verify_payment(request, application_id):
             application.is_paid = True
             application.payment_verified_at = timezone.now()
             application.payment_verified_by = request.user
-            application.save()
+            with transaction.atomic():
+                application.save()
+                emit([application_event(application, 'payment', old_payment_status, 'paid')])
             
             messages.success(request, f'Payment verified successfully for {application.student.get_full_name()}')
         
@@ -803,7 +925,9 @@ def verify_payment(request, application_id):
             application.payment_verified_at = timezone.now()
             application.payment_verified_by = request.user
             application.payment_notes = rejection_reason
-            application.save()
+            with transaction.atomic():
+                application.save()
+                emit([application_event(application, 'payment', old_payment_status, 'rejected', rejection_reason)])
             
             messages.warning(request, f'Payment rejected for {application.student.get_full_name()}. Reason: {rejection_reason}')
         
@@ -812,6 +936,89 @@ def verify_payment(request, application_id):
     return redirect('employee:student_application_detail', application_id=application_id)
 
 
+def _wants_json(request):
+    return 'application/json' in request.headers.get('Accept', '')
+
+
+def _bulk_error(request, message, fallback):
+    if _wants_json(request):
+        return JsonResponse({'status': 'error', 'message': message}, status=400)
+    messages.error(request, message)
+    return redirect(fallback)
+
+
+def _selected_ids(request):
+    """(distinct posted ``ids`` in order, error message)"""
+    ids = []
+    for value in request.POST.getlist('ids'):
+        try:
+            ids.append(int(value))
+        except ValueError:
+            return [], f'Invalid id: {value}'
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return [], 'Select at least one item.'
+    if len(ids) > bulk_actions.MAX_ITEMS:
+        return [], f'Select at most {bulk_actions.MAX_ITEMS} items at a time.'
+    return ids, None
+
+
+def _bulk_response(request, results, fallback):
+    """The per-item results as JSON, or summarised in a message on the page the form came from"""
+    counts = Counter(item['result'] for item in results)
+    if _wants_json(request):
+        return JsonResponse({'status': 'success', 'counts': counts, 'results': results})
+
+    summary = ', '.join(f'{counts[result]} {result.replace("_", " ")}'
+                        for result in ('updated', 'unchanged', 'not_found') if counts[result])
+    messages.success(request, f'{len(results)} selected: {summary}.')
+    if counts['not_found']:
+        missing = ', '.join(str(item['id']) for item in results if item['result'] == 'not_found')
+        messages.warning(request, f'Not found: {missing}')
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()},
+                                           require_https=request.is_secure()):
+        next_url = fallback
+    return redirect(next_url)
+
+
+@query_budget(10)
+@login_required
+@employee_required
+@require_POST
+@csrf_protect
+def bulk_update_application_status(request):
+    """Update the status of the selected student portal applications"""
+    fallback = 'employee:student_application_list'
+    ids, error = _selected_ids(request)
+    if error:
+        return _bulk_error(request, error, fallback)
+    new_status = request.POST.get('status')
+    if new_status not in dict(Application.APPLICATION_STATUS):
+        return _bulk_error(request, 'Invalid status selected.', fallback)
+    return _bulk_response(request, bulk_actions.update_application_status(ids, new_status), fallback)
+
+
+@query_budget(10)
+@login_required
+@employee_required
+@require_POST
+@csrf_protect
+def bulk_verify_payments(request):
+    """Verify or reject the M-PESA payments of the selected applications"""
+    fallback = 'employee:student_application_list'
+    ids, error = _selected_ids(request)
+    if error:
+        return _bulk_error(request, error, fallback)
+    action = request.POST.get('action')
+    if action not in ('verify', 'reject'):
+        return _bulk_error(request, 'Invalid action.', fallback)
+    rejection_reason = request.POST.get('rejection_reason') or 'Payment verification failed'
+    results = bulk_actions.verify_payments(ids, request.user, action == 'verify', rejection_reason)
+    return _bulk_response(request, results, fallback)
+
+
+@query_budget(9)
 @login_required
 @employee_required
 def export_single_application_pdf(request, application_id):
@@ -896,8 +1103,9 @@ def export_single_application_pdf(request, application_id):
     # Student Profile Picture (if available)
     if student_profile and student_profile.profile_picture:
         try:
-            # Add profile picture
-            img_path = student_profile.profile_picture.path
+            # Add profile picture (a 450px thumbnail, not the full upload)
+            img_path = (thumbnail_path(student_profile.profile_picture, 'pdf')
+                        or student_profile.profile_picture.path)
             img = Image(img_path, width=1.5*inch, height=1.5*inch)
             img.hAlign = 'LEFT'
             elements.append(img)
@@ -1171,4 +1379,152 @@ def export_single_application_pdf(request, application_id):
     buffer.close()
     response.write(pdf)
     
-    return response
\ No newline at end of file
+    return response
+
+@query_budget(4)
+@login_required
+@admin_required
+def performance_stats(request):
+    """Per-route request timings collected by PerformanceMiddleware"""
+    rows = perf.summarize(perf.collect()) if settings.PERF_INSTRUMENTATION_ENABLED else []
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'enabled': settings.PERF_INSTRUMENTATION_ENABLED, 'routes': rows})
+    return render(request, 'employee/perf.html', {
+        'enabled': settings.PERF_INSTRUMENTATION_ENABLED,
+        'rows': rows,
+        'sample_size': settings.PERF_SAMPLE_SIZE,
+    })
+
+@query_budget(20)
+@login_required
+@employee_required
+@csrf_exempt
+def import_students(request):
+    """Upload a CSV of students to validate (dry run) or create in bulk"""
+    # Set before anything reads the body; the default handler refuses .csv
+    request.upload_handlers = [StreamingUploadHandler(request, allowed_extensions=['.csv'])]
+    return _import_students(request)
+
+@csrf_protect
+def _import_students(request):
+    context = {
+        'columns': ['email', 'full_name', 'first_name', 'last_name', 'password'] + IMPORT_FIELDS,
+        'max_rows': settings.STUDENT_IMPORT_MAX_ROWS,
+    }
+    if request.method != 'POST':
+        return render(request, 'employee/import_students.html', context)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        messages.error(request, upload_errors(request).get('file', 'Please choose a CSV file.'))
+        return render(request, 'employee/import_students.html', context)
+
+    dry_run = bool(request.POST.get('dry_run'))
+    try:
+        text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+        # Larger intakes go through the import_students command: every row
+        # costs a password hash, which is hashed here in the request
+        if count_rows(text) > settings.STUDENT_IMPORT_MAX_ROWS:
+            messages.error(request, f'The file has more than {settings.STUDENT_IMPORT_MAX_ROWS} rows. '
+                                    'Split it or ask an administrator to run the import command.')
+            return render(request, 'employee/import_students.html', context)
+        text.seek(0)
+        report = run_student_import(text, dry_run=dry_run, workers=0)
+    except (ImportFileError, UnicodeDecodeError) as e:
+        messages.error(request, f'Could not read the file: {e}')
+        return render(request, 'employee/import_students.html', context)
+
+    if request.POST.get('download_report'):
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = content_disposition_header(True, 'student_import_report.csv')
+        report.write_csv(response)
+        return response
+
+    if dry_run:
+        messages.info(request, f'Dry run: {report.valid} row(s) valid, {len(report.errors)} error(s). Nothing was created.')
+    else:
+        messages.success(request, f'Created {report.created} student account(s), {len(report.errors)} error(s).')
+    context['report'] = report
+    return render(request, 'employee/import_students.html', context)
+
+def _export_response(name, header, rows, file_format):
+    """Stream ``rows`` as a CSV or XLSX download"""
+    if file_format == 'csv':
+        response = StreamingHttpResponse(stream_csv(header, rows), content_type=CSV_CONTENT_TYPE)
+    elif file_format == 'xlsx':
+        response = StreamingHttpResponse(stream_xlsx(header, rows, name.title()), content_type=XLSX_CONTENT_TYPE)
+    else:
+        raise Http404('Unknown export format')
+    response['Content-Disposition'] = content_disposition_header(True, f'{name}-{timezone.now():%Y%m%d}.{file_format}')
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@query_budget(4)
+@login_required
+@employee_required
+def export_applications(request, file_format):
+    """The (filtered) application list as CSV or XLSX"""
+    types = dict(Application.APPLICATION_TYPES)
+    statuses = dict(Application.APPLICATION_STATUS)
+    payment_statuses = dict(Application.PAYMENT_STATUS_CHOICES)
+    header = ['ID', 'First name', 'Last name', 'Email', 'Phone', 'Nationality', 'Type', 'University',
+              'Course', 'Country', 'Status', 'Payment status', 'Paid', 'Created']
+    fields = ('id', 'student__first_name', 'student__last_name', 'student__email',
+              'student__studentprofile__phone_number', 'student__studentprofile__nationality',
+              'application_type', 'university_name', 'course', 'country', 'status', 'payment_status',
+              'is_paid', 'created_at')
+
+    def rows():
+        for row in keyset_rows(_filtered_applications(request), fields):
+            (pk, first_name, last_name, email, phone, nationality, application_type, university,
+             course, country, status, payment_status, is_paid, created_at) = row
+            yield (pk, first_name, last_name, email, phone, nationality, types.get(application_type, application_type),
+                   university, course, country, statuses.get(status, status),
+                   payment_statuses.get(payment_status, payment_status), is_paid, created_at)
+
+    return _export_response('applications', header, rows(), file_format)
+
+@query_budget(4)
+@login_required
+@admin_required
+def export_payments(request, file_format):
+    """Payments as CSV or XLSX, filtered like payment management"""
+    statuses = dict(Payment.PAYMENT_STATUS)
+    methods = dict(Payment.PAYMENT_METHODS)
+    header = ['ID', 'Order reference', 'First name', 'Last name', 'Email', 'Application', 'Application type',
+              'Amount', 'Currency', 'Method', 'Status', 'Successful', 'Phone', 'Provider', 'Transaction ID',
+              'Payment reference', 'Date']
+    fields = ('id', 'order_reference', 'student__first_name', 'student__last_name', 'student__email',
+              'application_id', 'application__application_type', 'amount', 'currency', 'payment_method',
+              'status', 'is_successful', 'phone_number', 'mobile_provider', 'transaction_id',
+              'payment_reference', 'payment_date')
+
+    def rows():
+        for row in keyset_rows(_filtered_payments(request), fields):
+            row = list(row)
+            row[9] = methods.get(row[9], row[9])
+            row[10] = statuses.get(row[10], row[10])
+            yield row
+
+    return _export_response('payments', header, rows(), file_format)
+
+@query_budget(4)
+@login_required
+@employee_required
+def export_documents(request, file_format):
+    """The (filtered) document list as CSV or XLSX"""
+    types = dict(Document.DOCUMENT_TYPES)
+    header = ['ID', 'First name', 'Last name', 'Email', 'Phone', 'Type', 'File name', 'Description',
+              'Verified', 'Uploaded']
+    fields = ('id', 'student__first_name', 'student__last_name', 'student__email',
+              'student__studentprofile__phone_number', 'document_type', 'original_filename', 'file',
+              'description', 'is_verified', 'uploaded_at')
+
+    def rows():
+        for row in keyset_rows(_filtered_documents(request), fields):
+            (pk, first_name, last_name, email, phone, document_type, original_filename, name,
+             description, is_verified, uploaded_at) = row
+            yield (pk, first_name, last_name, email, phone, types.get(document_type, document_type),
+                   original_filename or os.path.basename(name), description, is_verified, uploaded_at)
+
+    return _export_response('documents', header, rows(), file_format)
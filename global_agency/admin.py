@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import ContactMessage, StudentApplication, Student, StudentProfile
+from .models import ContactMessage, OutboundEmail, StudentApplication, Student, StudentProfile
 
 # Student Profile Inline
 class StudentProfileInline(admin.StackedInline):
@@ -217,6 +217,14 @@ class StudentProfileAdmin(admin.ModelAdmin):
     list_filter = ('date_of_birth',)
     raw_id_fields = ('user',)
 
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'to')
+    ordering = ('-created_at',)
+    readonly_fields = ('created_at', 'sent_at', 'attempts', 'last_error')
+
 # Unregister default User admin and register with custom admin
 admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""
+Study-abroad destinations shown on the countries pages and listed in the sitemap
+"""
+
+COUNTRIES = {
+    'usa': {
+        'name': 'United States',
+        'flag': '🇺🇸',
+        'description': 'World-class universities with diverse programs',
+        'universities': [
+            {'name': 'Harvard University', 'slug': 'harvard'},
+            {'name': 'Stanford University', 'slug': 'stanford'},
+            {'name': 'MIT', 'slug': 'mit'},
+            {'name': 'California Institute of Technology', 'slug': 'caltech'},
+            {'name': 'University of Chicago', 'slug': 'chicago'},
+            {'name': 'Princeton University', 'slug': 'princeton'},
+            {'name': 'Yale University', 'slug': 'yale'},
+            {'name': 'Columbia University', 'slug': 'columbia'},
+        ]
+    },
+    'uk': {
+        'name': 'United Kingdom',
+        'flag': '🇬🇧',
+        'description': 'Historic universities with 3-year bachelor degrees',
+        'universities': [
+            {'name': 'University of Oxford', 'slug': 'oxford'},
+            {'name': 'University of Cambridge', 'slug': 'cambridge'},
+            {'name': 'Imperial College London', 'slug': 'imperial'},
+            {'name': 'London School of Economics', 'slug': 'lse'},
+            {'name': 'University College London', 'slug': 'ucl'},
+            {'name': 'University of Edinburgh', 'slug': 'edinburgh'},
+        ]
+    },
+    'canada': {
+        'name': 'Canada',
+        'flag': '🇨🇦',
+        'description': 'High-quality education with post-study work opportunities',
+        'universities': [
+            {'name': 'University of Toronto', 'slug': 'toronto'},
+            {'name': 'University of British Columbia', 'slug': 'ubc'},
+            {'name': 'McGill University', 'slug': 'mcgill'},
+            {'name': 'University of Alberta', 'slug': 'alberta'},
+            {'name': 'McMaster University', 'slug': 'mcmaster'},
+        ]
+    },
+}
@@ -0,0 +1,61 @@
+import re
+import timeit
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from globalagency_project.middleware.security import (
+    SUSPICIOUS_PATTERNS, SecurityLoggingMiddleware, SuspiciousRequestScanner,
+)
+
+URLS = {
+    'typical': ('/student-portal/applications/12/payment/', 'page=2&sort=-created_at'),
+    'typical (no query)': ('/universities/', ''),
+    'encoded payload': ('/search/', 'q=%3Cscript%3Ealert(1)%3C%2Fscript%3E'),
+    'adversarial': ('/' + 'scrip/' * 300, 'q=' + 'selec' * 400 + '&x=' + 'evalu' * 400),
+}
+
+
+def legacy_scan(path, query_string):
+    """The per-request loop the middleware used before the scanner existed"""
+    path = path.lower()
+    query_string = query_string.lower()
+    for pattern in SUSPICIOUS_PATTERNS:
+        if pattern in path or pattern in query_string:
+            return pattern
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request overhead of the suspicious request scanner'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        scanner = SuspiciousRequestScanner()
+        alternation = re.compile('|'.join(re.escape(p) for p in scanner.patterns), re.IGNORECASE)
+        response = HttpResponse()
+        middleware = SecurityLoggingMiddleware(lambda request: response)
+        # Scan but don't flood the security log with benchmark hits
+        middleware.log_suspicious_requests = lambda request: scanner.scan(
+            request.path, request.META.get('QUERY_STRING', '')
+        )
+        factory = RequestFactory()
+
+        def measure(func):
+            best = min(timeit.repeat(func, number=iterations, repeat=5))
+            return best / iterations * 1e6
+
+        self.stdout.write(f'{"URL":<20} {"legacy":>10} {"regex":>10} {"scanner":>10} {"middleware":>11}  (us/request)')
+        for label, (path, query_string) in URLS.items():
+            request = factory.get(path + ('?' + query_string if query_string else ''))
+            target = f'{path}\n{query_string}'
+            results = [
+                measure(lambda: legacy_scan(path, query_string)),
+                measure(lambda: alternation.search(target)),
+                measure(lambda: scanner.scan(path, query_string)),
+                measure(lambda: middleware(request)),
+            ]
+            self.stdout.write(f'{label:<20} ' + ' '.join(f'{value:>10.2f}' for value in results[:3])
+                              + f' {results[3]:>11.2f}')
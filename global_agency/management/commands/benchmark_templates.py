@@ -0,0 +1,68 @@
+import timeit
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+
+from global_agency import views
+from globalagency_project.utils.fragment_cache import invalidate_fragments
+
+SAMPLE_UNIVERSITY = {
+    'name': 'Sample University',
+    'location': 'Boston',
+    'country': 'USA',
+    'ranking': '#10 Global',
+    'tuition': '$50,000/year',
+    'deadline': 'January 15',
+    'faculties': [
+        {'name': 'Engineering', 'programs': [
+            {'name': 'Computer Science', 'degree': 'BSc', 'tuition': '$50,000', 'duration': '4 years',
+             'specializations': ['AI', 'Systems']},
+        ]},
+    ],
+}
+
+
+def render_abroad_university(request):
+    return render_to_string('global_agency/abroad_university_detail.html',
+                            {'university': SAMPLE_UNIVERSITY}, request)
+
+
+PAGES = {
+    'index.html': ('/', views.home),
+    'all_countries.html': ('/universities/countries/', views.all_countries),
+    'tcu_services.html': ('/tcu-services/', views.tcu_services),
+    'start_application.html': ('/start-application/', views.start_application),
+    'abroad_university_detail.html': ('/universities/abroad/sample/', render_abroad_university),
+    'vyuo_ndani.html': ('/vyuo-vya-ndani/', views.vyuo_ndani),
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure render time of the public pages with and without template fragment caching'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        factory = RequestFactory()
+
+        def measure(func):
+            best = min(timeit.repeat(func, number=iterations, repeat=3))
+            return best / iterations * 1e3
+
+        self.stdout.write(f'{"template":<32} {"uncached":>10} {"cached":>10} {"speedup":>8}  (ms/render)')
+        for label, (path, view) in PAGES.items():
+            request = factory.get(path)
+            request.user = AnonymousUser()
+
+            with override_settings(FRAGMENT_CACHE_ENABLED=False):
+                uncached = measure(lambda: view(request))
+            with override_settings(FRAGMENT_CACHE_ENABLED=True):
+                invalidate_fragments()
+                view(request)  # warm the fragments
+                cached = measure(lambda: view(request))
+
+            self.stdout.write(f'{label:<32} {uncached:>10.2f} {cached:>10.2f} {uncached / cached:>7.1f}x')
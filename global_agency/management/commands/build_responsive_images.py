@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from global_agency.responsive_images import build_responsive_images
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive WebP/AVIF/JPEG derivatives of the static photos (changed sources only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Reprocess every source image')
+        parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes')
+
+    def handle(self, *args, **options):
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        processed, unchanged, failed = build_responsive_images(
+            force=options['force'], jobs=options['jobs'], log=log,
+        )
+        self.stdout.write(f'Responsive images: {processed} processed, {unchanged} unchanged, {failed} failed')
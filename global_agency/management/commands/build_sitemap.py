@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from globalagency_project.sitemap import build_sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Pre-render sitemap.xml (only rewritten when page or university data changed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild even if no source changed')
+
+    def handle(self, *args, **options):
+        state = build_sitemaps(force=options['force'])
+        self.stdout.write(f"{len(state['urls'])} URLs in {len(state['files'])} sitemap file(s)")
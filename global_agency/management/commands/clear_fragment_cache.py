@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from globalagency_project.utils.fragment_cache import invalidate_fragments
+
+
+class Command(BaseCommand):
+    help = 'Make every cached template fragment stale (run after editing page content)'
+
+    def handle(self, *args, **options):
+        invalidate_fragments()
+        self.stdout.write('Template fragments invalidated')
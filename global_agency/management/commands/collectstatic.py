@@ -0,0 +1,20 @@
+from django.contrib.staticfiles.management.commands.collectstatic import Command as CollectStaticCommand
+from global_agency.responsive_images import build_responsive_images
+
+
+class Command(CollectStaticCommand):
+    """collectstatic that first brings the responsive image derivatives up to date"""
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--skip-responsive-images', action='store_true',
+                            help='Do not regenerate responsive image derivatives')
+
+    def handle(self, **options):
+        if not options['skip_responsive_images']:
+            processed, unchanged, failed = build_responsive_images()
+            if options['verbosity'] >= 1:
+                self.stdout.write(
+                    f'Responsive images: {processed} processed, {unchanged} unchanged, {failed} failed'
+                )
+        return super().handle(**options)
@@ -0,0 +1,30 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from globalagency_project.utils import perf
+
+
+class Command(BaseCommand):
+    help = 'Print the per-route request timings recorded by the workers as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+        parser.add_argument('--raw', action='store_true', help='Include the individual samples')
+
+    def handle(self, *args, **options):
+        if not settings.PERF_INSTRUMENTATION_ENABLED:
+            raise CommandError('PERF_INSTRUMENTATION_ENABLED is off, no timings are recorded')
+
+        routes = perf.collect()
+        data = {'fields': perf.SAMPLE_FIELDS, 'routes': perf.summarize(routes)}
+        if options['raw']:
+            data['samples'] = {route: entry['samples'] for route, entry in routes.items()}
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(data, f, indent=2)
+            self.stdout.write(f'Wrote timings for {len(data["routes"])} routes to {options["output"]}')
+        else:
+            self.stdout.write(json.dumps(data, indent=2))
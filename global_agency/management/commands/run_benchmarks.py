@@ -0,0 +1,105 @@
+import json
+import platform
+import subprocess
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from benchmarks import data, views
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure latency and query counts of the hot views on generated data, in a '
+        'throwaway test database (run with benchmarks.settings_sqlite for SQLite)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--case', action='append', dest='cases', choices=[case.name for case in views.CASES])
+        parser.add_argument('--gateway-latency', type=float, default=0, help='Fake ClickPesa delay in ms')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Earlier results file; fail on regressions')
+        parser.add_argument('--threshold', type=float, default=20, help='Allowed p50 slowdown in percent')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database between runs')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)['results']
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        media_root = tempfile.TemporaryDirectory()
+        # The manifest is only there after collectstatic; its lookups are not what is measured
+        overrides = override_settings(
+            MEDIA_ROOT=media_root.name,
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        )
+        overrides.enable()
+        try:
+            if options['keepdb']:
+                data.flush()
+            started = time.perf_counter()
+            counts = data.seed(options['students'])
+            self.stdout.write(f'Seeded {counts} in {time.perf_counter() - started:.1f}s')
+            results = views.run(options['iterations'], options['cases'], options['gateway_latency'] / 1e3)
+        finally:
+            overrides.disable()
+            media_root.cleanup()
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(f'{"case":<34} {"status":>6} {"queries":>8} {"p50 ms":>9} {"p90 ms":>9} {"max ms":>9}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<34} {result["status"]:>6} {result["queries"]:>8} '
+                f'{result["p50_ms"]:>9.2f} {result["p90_ms"]:>9.2f} {result["max_ms"]:>9.2f}'
+            )
+
+        if options['output']:
+            report = {
+                'meta': {
+                    'revision': git_revision(),
+                    'database': connection.vendor,
+                    'django': django.get_version(),
+                    'python': platform.python_version(),
+                    'students': options['students'],
+                    'iterations': options['iterations'],
+                    'gateway_latency_ms': options['gateway_latency'],
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                },
+                'seed': counts,
+                'results': results,
+            }
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'Wrote {options["output"]}')
+
+        failed = [name for name, result in results.items() if result['status'] != 200]
+        if failed:
+            raise CommandError(f'Non-200 responses: {", ".join(failed)}')
+        if baseline is not None:
+            regressions = views.compare(baseline, results, options['threshold'] / 100)
+            if regressions:
+                raise CommandError('Regressions against {}:\n  {}'.format(options['compare'], '\n  '.join(regressions)))
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}'))
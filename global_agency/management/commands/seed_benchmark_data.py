@@ -0,0 +1,28 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks import data
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with generated students, applications, payments, documents and messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, for identical data between runs')
+        parser.add_argument('--flush', action='store_true', help='Delete previously generated data first')
+        parser.add_argument('--accounts', help='Write the generated logins to this JSON file (for benchmarks.loadtest)')
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            self.stdout.write(f'Deleted {data.flush()} generated rows')
+        counts = data.seed(options['students'], options['seed'])
+        self.stdout.write(self.style.SUCCESS(
+            'Created ' + ', '.join(f'{count} {name}' for name, count in counts.items())
+        ))
+        self.stdout.write(f'Every generated user has the password {data.PASSWORD!r}')
+        if options['accounts']:
+            with open(options['accounts'], 'w') as f:
+                json.dump(data.accounts(), f, indent=2)
+            self.stdout.write(f'Wrote logins to {options["accounts"]}')
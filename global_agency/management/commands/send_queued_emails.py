@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from global_agency.outbox import send_queued
+
+
+class Command(BaseCommand):
+    help = 'Send emails waiting in the outbox (run from cron, or with --loop as a worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Emails claimed and sent per SMTP connection (default EMAIL_OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox until interrupted')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued(batch_size=options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(f'Sent {sent} email(s), {failed} failed')
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class StudentManager(models.Manager):
     def create_student_from_application(self, application):
@@ -195,4 +196,34 @@ class StudentApplication(models.Model):
                 'username': self.username,
                 'password': self.temporary_password
             }
-        return None
\ No newline at end of file
+        return None
+class OutboundEmail(models.Model):
+    """
+    An email waiting to be sent. Views queue rows (in their own transaction)
+    and the send_queued_emails worker delivers them; see global_agency.outbox.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When the worker may next pick the row up: the retry time while pending,
+    # the claim expiry while sending
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.subject} - {', '.join(self.to)} ({self.status})"
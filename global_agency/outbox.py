@@ -0,0 +1,145 @@
+"""
+Email outbox
+
+Requests never talk to the mail server. queue_email() stores an
+OutboundEmail row (inside the caller's transaction, so an email is only sent
+if the change that triggered it is committed) and the send_queued_emails
+worker delivers the queue:
+
+* due rows are claimed in batches with SELECT ... FOR UPDATE SKIP LOCKED, so
+  several workers never send the same email;
+* a batch goes out over one SMTP connection, opened once;
+* a failed email is retried after EMAIL_OUTBOX_RETRY_DELAY seconds, doubling
+  each attempt, and marked failed after EMAIL_OUTBOX_MAX_ATTEMPTS;
+* a claim expires after EMAIL_OUTBOX_CLAIM_SECONDS, so rows held by a worker
+  that died are picked up again.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY = 6 * 3600
+
+
+def queue_email(subject, body, to, from_email=None):
+    """Store an email for the worker to send; returns the OutboundEmail"""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+
+
+def queue_emails(emails):
+    """Store many (subject, body, to) emails with one INSERT"""
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(subject=subject, body=body, from_email=settings.DEFAULT_FROM_EMAIL, to=list(to))
+        for subject, body, to in emails
+    ])
+
+
+def retry_delay(attempts):
+    """Seconds to wait before attempt number ``attempts + 1``"""
+    return min(settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def claim_batch(batch_size):
+    """Mark up to ``batch_size`` due emails as sending and return them"""
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboundEmail.objects.filter(
+            status__in=['pending', 'sending'], next_attempt_at__lte=now,
+        ).order_by('next_attempt_at')
+        if db_connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due[:batch_size])
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            status='sending',
+            attempts=F('attempts') + 1,
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_SECONDS),
+        )
+    for email in batch:
+        email.attempts += 1
+    return batch
+
+
+def _failed(email, error):
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = 'failed'
+        logger.error('Giving up on email %s to %s after %d attempts: %s',
+                     email.pk, email.to, email.attempts, email.last_error)
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(email.attempts))
+        logger.warning('Email %s to %s failed (attempt %d), retrying: %s',
+                       email.pk, email.to, email.attempts, email.last_error)
+    email.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+
+
+def _send_batch(batch, mail_connection):
+    """Send claimed emails over one open connection; returns (sent, failed, still connected)"""
+    sent = failed = 0
+    for i, email in enumerate(batch):
+        message = EmailMessage(email.subject, email.body, email.from_email, email.to, connection=mail_connection)
+        try:
+            message.send()
+        except Exception as e:
+            failed += 1
+            _failed(email, e)
+            # The server may have dropped the connection; start a fresh one
+            mail_connection.close()
+            try:
+                mail_connection.open()
+            except Exception as e:
+                for rest in batch[i + 1:]:
+                    _failed(rest, e)
+                return sent, failed + len(batch) - i - 1, False
+            continue
+        sent += 1
+        email.status = 'sent'
+        email.sent_at = timezone.now()
+        email.last_error = ''
+        email.save(update_fields=['status', 'sent_at', 'last_error'])
+    return sent, failed, True
+
+
+def send_queued(batch_size=None, max_batches=None):
+    """Send due emails until the queue is empty; returns (sent, failed)"""
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    sent = failed = batches = 0
+    mail_connection = None
+    try:
+        while max_batches is None or batches < max_batches:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            batches += 1
+            if mail_connection is None:
+                mail_connection = get_connection()
+                try:
+                    mail_connection.open()
+                except Exception as e:
+                    # Server unreachable: the whole batch is retried later
+                    for email in batch:
+                        _failed(email, e)
+                    return sent, failed + len(batch)
+            batch_sent, batch_failed, connected = _send_batch(batch, mail_connection)
+            sent += batch_sent
+            failed += batch_failed
+            if not connected:
+                break
+    finally:
+        if mail_connection is not None:
+            mail_connection.close()
+    return sent, failed
@@ -0,0 +1,217 @@
+"""
+Responsive image derivatives for the static campus/banner photos
+
+Every JPEG/PNG/WebP under RESPONSIVE_IMAGE_SOURCES is resized into the width
+buckets in RESPONSIVE_IMAGE_WIDTHS (never upscaled) and encoded as AVIF and
+WebP when this Pillow build supports them, plus a JPEG fallback (PNG for images
+with transparency). EXIF is dropped after applying its orientation. Output
+file names carry a hash of their bytes, and manifest.json maps each source to
+its variants for the ``responsive_image`` template tag.
+
+Sources are only reprocessed when their content hash, or the width/quality
+settings, change.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageOps, features
+
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Encoder name, file extension, MIME type, save options
+FORMATS = {
+    'avif': ('AVIF', 'avif', 'image/avif', {'quality': 50, 'speed': 8}),
+    'webp': ('WEBP', 'webp', 'image/webp', {'quality': 75, 'method': 6}),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', 'png', 'image/png', {'optimize': True}),
+}
+
+
+def available_formats():
+    """Modern formats this Pillow build can encode, best first"""
+    return [name for name in ('avif', 'webp') if features.check(name)]
+
+
+def output_root():
+    return str(settings.RESPONSIVE_IMAGE_ROOT)
+
+
+def manifest_path():
+    return os.path.join(output_root(), MANIFEST_NAME)
+
+
+def _static_dir():
+    return str(settings.STATICFILES_DIRS[0])
+
+
+def static_prefix():
+    """Static path prefix of the derivatives, e.g. 'responsive/'"""
+    return os.path.relpath(output_root(), _static_dir()).replace(os.sep, '/') + '/'
+
+
+def _settings_fingerprint(formats):
+    options = {name: FORMATS[name][3] for name in formats + ['jpeg', 'png']}
+    payload = json.dumps([MANIFEST_VERSION, list(settings.RESPONSIVE_IMAGE_WIDTHS), options], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def find_sources():
+    """Yield (static-relative path, absolute path) for every source image"""
+    static_dir = _static_dir()
+    for source_dir in settings.RESPONSIVE_IMAGE_SOURCES:
+        for dirpath, _, filenames in os.walk(os.path.join(static_dir, source_dir)):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(SOURCE_EXTENSIONS):
+                    absolute = os.path.join(dirpath, filename)
+                    yield os.path.relpath(absolute, static_dir).replace(os.sep, '/'), absolute
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _bucket_widths(width, widths):
+    buckets = [w for w in widths if w < width]
+    buckets.append(min(width, max(widths)))
+    return sorted(set(buckets))
+
+
+def _write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def process_image(relative_path, absolute_path, source_hash, formats, widths, root):
+    """Generate every variant of one source image and return its manifest entry"""
+    with Image.open(absolute_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            # Many of the "PNG" photos have an alpha channel that is fully opaque
+            has_alpha = image.getchannel('A').getextrema()[0] < 255
+        else:
+            has_alpha = False
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    fallback = 'png' if has_alpha else 'jpeg'
+    stem = os.path.splitext(relative_path)[0]
+    variants = {name: [] for name in formats + [fallback]}
+
+    for width in _bucket_widths(image.width, widths):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for name in variants:
+            encoder, extension, _, options = FORMATS[name]
+            buffer = BytesIO()
+            # No exif= argument, so EXIF/GPS metadata is not carried over
+            resized.save(buffer, encoder, **options)
+            content = buffer.getvalue()
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            name_on_disk = f'{stem}-{width}w.{digest}.{extension}'
+            _write_atomic(os.path.join(root, name_on_disk), content)
+            variants[name].append({'width': width, 'path': name_on_disk, 'bytes': len(content)})
+
+    return {
+        'source_hash': source_hash,
+        'width': image.width,
+        'height': image.height,
+        'fallback': fallback,
+        'variants': variants,
+    }
+
+
+def load_manifest():
+    try:
+        with open(manifest_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _variant_files(entry):
+    return {variant['path'] for variants in entry['variants'].values() for variant in variants}
+
+
+def build_responsive_images(force=False, jobs=1, log=None):
+    """
+    Bring the derivatives and manifest up to date.
+
+    Returns (processed, unchanged, failed) source counts.
+    """
+    log = log or (lambda message: None)
+    root = output_root()
+    formats = available_formats()
+    fingerprint = _settings_fingerprint(formats)
+    widths = list(settings.RESPONSIVE_IMAGE_WIDTHS)
+
+    manifest = load_manifest()
+    previous = manifest.get('images', {}) if manifest.get('settings') == fingerprint and not force else {}
+    old_files = set()
+    for entry in manifest.get('images', {}).values():
+        old_files |= _variant_files(entry)
+
+    images = {}
+    pending = []
+    for relative_path, absolute_path in find_sources():
+        source_hash = _hash_file(absolute_path)
+        entry = previous.get(relative_path)
+        if entry and entry['source_hash'] == source_hash and all(
+            os.path.exists(os.path.join(root, path)) for path in _variant_files(entry)
+        ):
+            images[relative_path] = entry
+        else:
+            pending.append((relative_path, absolute_path, source_hash))
+
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = {
+                relative_path: executor.submit(process_image, relative_path, absolute_path,
+                                               source_hash, formats, widths, root)
+                for relative_path, absolute_path, source_hash in pending
+            }
+            results = {relative_path: future.result for relative_path, future in results.items()}
+    else:
+        results = {
+            relative_path: partial(process_image, relative_path, absolute_path,
+                                   source_hash, formats, widths, root)
+            for relative_path, absolute_path, source_hash in pending
+        }
+
+    failed = 0
+    for relative_path, result in results.items():
+        try:
+            images[relative_path] = result()
+            log(f'Processed {relative_path}')
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Templates fall back to the original file for this image
+            failed += 1
+            log(f'Skipped {relative_path}: {e}')
+
+    # Remove derivatives no longer referenced (changed or deleted sources)
+    current_files = set()
+    for entry in images.values():
+        current_files |= _variant_files(entry)
+    for path in old_files - current_files:
+        try:
+            os.remove(os.path.join(root, path))
+        except FileNotFoundError:
+            pass
+
+    manifest = {'settings': fingerprint, 'formats': formats, 'images': dict(sorted(images.items()))}
+    _write_atomic(manifest_path(), json.dumps(manifest, indent=1).encode('utf-8'))
+    return len(pending) - failed, len(images) - len(pending) + failed, failed
@@ -0,0 +1,41 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from globalagency_project.utils.fragment_cache import cached_fragment
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        vary_on = [str(value.resolve(context)) for value in self.vary_on]
+        return mark_safe(cached_fragment(name, vary_on, lambda: self.nodelist.render(context)))
+
+
+@register.tag
+def cachefragment(parser, token):
+    """
+    Cache a static section of a page under a versioned key:
+
+        {% cachefragment 'footer' %}...{% endcachefragment %}
+        {% cachefragment 'university' university.name %}...{% endcachefragment %}
+
+    The section must not contain per-request output (CSRF tokens, the user,
+    messages). Keys vary on the language and the extra arguments given.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name")
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
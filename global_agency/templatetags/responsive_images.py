@@ -0,0 +1,60 @@
+import os
+
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from global_agency.responsive_images import FORMATS, load_manifest, manifest_path, static_prefix
+
+register = template.Library()
+
+_manifest_cache = {'mtime': None, 'images': {}}
+
+
+def _manifest_images():
+    """manifest.json contents, re-read only when the file changes"""
+    try:
+        mtime = os.stat(manifest_path()).st_mtime_ns
+    except OSError:
+        return {}
+    if _manifest_cache['mtime'] != mtime:
+        _manifest_cache['images'] = load_manifest().get('images', {})
+        _manifest_cache['mtime'] = mtime
+    return _manifest_cache['images']
+
+
+def _srcset(variants):
+    prefix = static_prefix()
+    return ', '.join(f"{static(prefix + v['path'])} {v['width']}w" for v in variants)
+
+
+@register.simple_tag
+def responsive_image(path, alt='', sizes='100vw', **attrs):
+    """
+    Render a <picture> with AVIF/WebP sources and a JPEG/PNG fallback for a
+    static image, e.g. {% responsive_image 'global_agency/img/campus-2.jpg' alt='Campus' sizes='50vw' class='w-full' %}
+
+    Images missing from the manifest fall back to a plain <img> of the original.
+    """
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    entry = _manifest_images().get(path)
+    if entry is None:
+        extra = format_html_join('', ' {}="{}"', attrs.items())
+        return format_html('<img src="{}" alt="{}"{}>', static(path), alt, extra)
+
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((FORMATS[name][2], _srcset(entry['variants'][name]), sizes)
+         for name in entry['variants'] if name != entry['fallback']),
+    )
+    fallback = entry['variants'][entry['fallback']]
+    attrs.setdefault('width', entry['width'])
+    attrs.setdefault('height', entry['height'])
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+    img = format_html(
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}"{}>',
+        static(static_prefix() + fallback[-1]['path']), _srcset(fallback), sizes, alt, extra,
+    )
+    return mark_safe(f'<picture>{sources}{img}</picture>')
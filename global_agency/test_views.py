@@ -2,8 +2,10 @@
 from django.http import HttpResponse
 from django.utils.translation import get_language
 from django.conf import settings
+from globalagency_project.utils.query_budget import query_budget
 
 
+@query_budget(2)
 def test_language_view(request):
     """View to test which language is detected"""
     current_lang = get_language()
@@ -0,0 +1,743 @@
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.template import Context, Template
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone, translation
+
+from PIL import Image
+
+from benchmarks import data as benchmark_data, views as benchmark_views
+from employee.models import UserProfile
+from global_agency import responsive_images
+from global_agency.countries import COUNTRIES
+from global_agency import outbox
+from global_agency.models import ContactMessage, OutboundEmail, StudentApplication
+from globalagency_project import sitemap
+from globalagency_project.middleware.security import SuspiciousRequestScanner
+from globalagency_project.utils import ratelimit, shared_cache
+from globalagency_project.utils.fragment_cache import invalidate_fragments
+from globalagency_project.utils.log_queue import QueuedFileHandler
+from globalagency_project.utils.query_budget import query_budget
+from student_portal.models import Application, Document, Message, Payment, StudentProfile, UploadSession
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+# The manifest storage needs collectstatic; tests render with plain storage
+PLAIN_STATIC = override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+
+
+def count_writes(queries):
+    """Number of INSERT/UPDATE/DELETE statements in captured queries"""
+    return sum(1 for q in queries if q['sql'].lstrip().upper().startswith(WRITE_PREFIXES))
+
+
+@PLAIN_STATIC
+class SessionWriteAvoidanceTests(TestCase):
+    """Public pages must not create sessions and unchanged sessions must not be rewritten"""
+
+    def test_anonymous_get_creates_no_session(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertEqual(count_writes(ctx.captured_queries), 0)
+        self.assertFalse(any('django_session' in q['sql'] for q in ctx.captured_queries))
+
+    def test_authenticated_repeat_requests_do_not_rewrite_session(self):
+        user = User.objects.create_user(username='student@example.com', password='pass12345')
+        StudentProfile.objects.create(user=user)
+        self.client.force_login(user)
+
+        # First request stores the language once
+        self.client.get('/student-portal/applications/')
+
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(3):
+                response = self.client.get('/student-portal/applications/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(count_writes(ctx.captured_queries), 0)
+
+    def test_stale_session_cookie_is_not_resurrected(self):
+        self.client.cookies['sessionid'] = 'x' * 32
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(count_writes(ctx.captured_queries), 0)
+        # The unknown cookie is cleared rather than turned into a new session
+        self.assertEqual(response.cookies['sessionid'].value, '')
+
+    def test_session_expiry_is_refreshed_after_interval(self):
+        user = User.objects.create_user(username='student@example.com', password='pass12345')
+        StudentProfile.objects.create(user=user)
+        self.client.force_login(user)
+        self.client.get('/student-portal/applications/')
+
+        with override_settings(SESSION_REFRESH_INTERVAL=0):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get('/student-portal/applications/')
+
+        session_writes = [
+            q for q in ctx.captured_queries
+            if 'django_session' in q['sql'] and q['sql'].lstrip().upper().startswith(WRITE_PREFIXES)
+        ]
+        self.assertEqual(len(session_writes), 1)
+
+
+class SharedCacheTests(TestCase):
+    """NamespacedCache behaviour on the file backend shared by all workers"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        override = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self.cache_dir,
+            }
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+        shared_cache.reset_cache_stats()
+
+    def test_namespaces_do_not_collide(self):
+        first = shared_cache.namespace('first')
+        second = shared_cache.namespace('second')
+        first.set('key', 1)
+        second.set('key', 2)
+
+        self.assertEqual(first.get('key'), 1)
+        self.assertEqual(second.get('key'), 2)
+
+    def test_hit_and_miss_counters(self):
+        cache = shared_cache.namespace('stats')
+        cache.get('missing')
+        cache.set('present', 'value')
+        cache.get('present')
+        cache.get_many(['present', 'missing'])
+
+        self.assertEqual(shared_cache.cache_stats()['stats'], {'hits': 2, 'misses': 2})
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'stampede'}
+    })
+    def test_get_or_set_computes_once_under_concurrency(self):
+        # FileBasedCache.add() is check-then-set, so lock exclusivity is only
+        # guaranteed on backends with an atomic add (locmem, redis)
+        cache = shared_cache.namespace('stampede')
+        calls = []
+        release = threading.Event()
+
+        def expensive():
+            calls.append(1)
+            release.wait(1)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_set('key', expensive, wait=5)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+class RateLimitTests(TestCase):
+    """Atomic window counters, token buckets and route matching"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fixed_window_denies_after_limit_with_retry_after(self):
+        policy = ratelimit.RatePolicy('fixed', '/x/', limit=3, window=60, algorithm='fixed')
+        results = [ratelimit.hit(policy, '1.2.3.4', now=120.0) for _ in range(4)]
+
+        self.assertEqual([bool(r) for r in results], [True, True, True, False])
+        self.assertEqual(results[-1].retry_after, 60)
+        # A new window starts from zero instead of extending the old one
+        self.assertTrue(ratelimit.hit(policy, '1.2.3.4', now=180.0))
+
+    def test_fixed_window_counts_concurrent_hits_exactly(self):
+        policy = ratelimit.RatePolicy('race', '/x/', limit=50, window=60, algorithm='fixed')
+        allowed = []
+        threads = [
+            threading.Thread(target=lambda: allowed.append(bool(ratelimit.hit(policy, 'ip', now=0.0))))
+            for _ in range(80)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(allowed.count(True), 50)
+
+    def test_sliding_window_weights_previous_window(self):
+        policy = ratelimit.RatePolicy('sliding', '/x/', limit=4, window=60)
+        for _ in range(4):
+            ratelimit.hit(policy, 'ip', now=30.0)
+
+        # 15s into the next window, 75% of the previous 4 hits still count
+        self.assertTrue(ratelimit.hit(policy, 'ip', now=75.0))
+        result = ratelimit.hit(policy, 'ip', now=75.0)
+        self.assertFalse(result)
+        self.assertEqual(result.retry_after, 15)
+        # Near the end of the window the previous hits have mostly decayed
+        self.assertTrue(ratelimit.hit(policy, 'ip', now=118.0))
+
+    def test_token_bucket_refills_over_time(self):
+        policy = ratelimit.RatePolicy('bucket', '/x/', limit=2, window=10, algorithm='token_bucket')
+
+        self.assertTrue(ratelimit.hit(policy, 'ip', now=0.0))
+        self.assertTrue(ratelimit.hit(policy, 'ip', now=0.0))
+        denied = ratelimit.hit(policy, 'ip', now=0.0)
+        self.assertFalse(denied)
+        self.assertEqual(denied.retry_after, 5)
+        self.assertTrue(ratelimit.hit(policy, 'ip', now=5.0))
+
+    def test_token_bucket_falls_back_to_fixed_window_when_locked(self):
+        policy = ratelimit.RatePolicy('locked', '/x/', limit=2, window=10, algorithm='token_bucket')
+        ratelimit.ratelimit_cache.add('locked:ip:bucket:lock', 1, 60)
+
+        with mock.patch('time.sleep'):
+            results = [bool(ratelimit.hit(policy, 'ip', now=0.0)) for _ in range(3)]
+
+        self.assertEqual(results, [True, True, False])
+
+    def test_client_ip_trusts_only_our_proxies(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='6.6.6.6, 203.0.113.9')
+
+        with override_settings(NUM_PROXIES=0):
+            self.assertEqual(ratelimit.client_ip(request), '10.0.0.1')
+        with override_settings(NUM_PROXIES=1):
+            self.assertEqual(ratelimit.client_ip(request), '203.0.113.9')
+        with override_settings(NUM_PROXIES=5):
+            self.assertEqual(ratelimit.client_ip(request), '6.6.6.6')
+
+    def test_forged_forwarded_for_does_not_reset_the_limit(self):
+        for i in range(5):
+            self.client.post('/student-portal/login/', {'username': 'x', 'password': 'y'},
+                             HTTP_X_FORWARDED_FOR=f'198.51.100.{i}')
+
+        response = self.client.post('/student-portal/login/', {'username': 'x', 'password': 'y'},
+                                    HTTP_X_FORWARDED_FOR='198.51.100.99')
+        self.assertEqual(response.status_code, 429)
+
+    def test_route_trie_matches_most_specific_policy(self):
+        routes = ratelimit.compile_policies([
+            {'name': 'payment', 'prefix': '/student-portal/payment/', 'limit': 1, 'window': 1},
+            {'name': 'status', 'prefix': '/student-portal/payment/*/status/', 'limit': 1, 'window': 1,
+             'methods': ['GET', 'POST']},
+        ])
+
+        self.assertEqual(routes.match('POST', '/student-portal/payment/7/verify/').name, 'payment')
+        self.assertEqual(routes.match('POST', '/student-portal/payment/7/status/').name, 'status')
+        self.assertEqual(routes.match('GET', '/student-portal/payment/7/status/').name, 'status')
+        self.assertIsNone(routes.match('GET', '/student-portal/payment/7/verify/'))
+        self.assertIsNone(routes.match('POST', '/about/'))
+
+    def test_login_posts_get_429_with_retry_after(self):
+        for _ in range(5):
+            response = self.client.post('/student-portal/login/', {'username': 'x', 'password': 'y'})
+            self.assertNotEqual(response.status_code, 429)
+
+        response = self.client.post('/student-portal/login/', {'username': 'x', 'password': 'y'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+
+class SecurityScannerTests(TestCase):
+    """Suspicious request detection and queued security logging"""
+
+    def test_scanner_is_case_insensitive_and_decodes_query(self):
+        scanner = SuspiciousRequestScanner()
+
+        self.assertIsNone(scanner.scan('/student-portal/applications/', 'page=2'))
+        self.assertEqual(scanner.scan('/WP-Admin/setup.PHP'), '.php')
+        self.assertEqual(scanner.scan('/search/', 'q=1+UNION+SELECT+password'), 'union select')
+        self.assertEqual(scanner.scan('/search/', 'q=%3Cscript%3Ealert(1)'), '<script')
+
+    def test_queued_file_handler_writes_in_background(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir, ignore_errors=True)
+        handler = QueuedFileHandler(os.path.join(log_dir, 'security.log'))
+        handler.setFormatter(logging.Formatter('{levelname} {message}', style='{'))
+        test_logger = logging.getLogger('global_agency.tests.queued')
+        test_logger.addHandler(handler)
+        test_logger.propagate = False
+        self.addCleanup(test_logger.removeHandler, handler)
+
+        test_logger.warning('Slow request: %s took %.2f seconds', '/slow/', 6.5)
+        handler.close()
+
+        with open(os.path.join(log_dir, 'security.log')) as log_file:
+            self.assertEqual(log_file.read(), 'WARNING Slow request: /slow/ took 6.50 seconds\n')
+
+
+class SitemapTests(TestCase):
+    """Pre-rendered sitemap built from the universities catalog and country data"""
+
+    def setUp(self):
+        self.sitemap_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.sitemap_dir, ignore_errors=True)
+        override = override_settings(SITEMAP_ROOT=self.sitemap_dir, SITEMAP_BASE_URL='https://example.com')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_sitemap_lists_real_urls_and_supports_etag(self):
+        response = self.client.get('/sitemap.xml')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<loc>https://example.com/universities/country/uk/</loc>')
+        self.assertContains(response, '<loc>https://example.com/university/Aga%20Khan%20University%20(AKU)/</loc>')
+        self.assertNotContains(response, 'Example University')
+
+        cached = self.client.get('/sitemap.xml', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_unchanged_sources_are_not_rebuilt(self):
+        state = sitemap.build_sitemaps()
+        with mock.patch.object(sitemap, 'collect_entries') as collect:
+            self.assertEqual(sitemap.build_sitemaps(), state)
+        collect.assert_not_called()
+
+    def test_lastmod_only_moves_for_changed_data(self):
+        state = sitemap.build_sitemaps()
+        with mock.patch.dict(COUNTRIES['uk'], {'description': 'Updated'}), \
+                mock.patch.object(sitemap, '_isoformat', return_value='2030-01-01T00:00:00+00:00'):
+            rebuilt = sitemap.build_sitemaps(force=True)
+
+        changed = {url for url, info in rebuilt['urls'].items() if info != state['urls'][url]}
+        self.assertEqual(changed, {'/universities/country/uk/'})
+        self.assertEqual(rebuilt['urls']['/universities/country/uk/']['lastmod'], '2030-01-01T00:00:00+00:00')
+
+    def test_fresh_checkout_keeps_commit_time_as_lastmod(self):
+        countries_path = sitemap._countries_path()
+        committed = sitemap.source_time(countries_path)
+        # A deploy starts without state.json and with every mtime at checkout time
+        stat = os.stat(countries_path)
+        self.addCleanup(os.utime, countries_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.utime(countries_path, (2_000_000_000, 2_000_000_000))
+
+        state = sitemap.build_sitemaps()
+
+        self.assertNotEqual(committed, 2_000_000_000)
+        self.assertEqual(state['urls']['/universities/country/uk/']['lastmod'], sitemap._isoformat(committed))
+
+    @override_settings(SITEMAP_MAX_URLS=20)
+    def test_large_sitemap_is_split_behind_an_index(self):
+        state = sitemap.build_sitemaps()
+        sections = len(state['files']) - 1
+
+        self.assertEqual(sections, -(-len(state['urls']) // 20))
+        index = self.client.get('/sitemap.xml')
+        self.assertContains(index, '<sitemapindex')
+        self.assertContains(index, '<loc>https://example.com/sitemap-2.xml</loc>')
+        self.assertEqual(self.client.get('/sitemap-2.xml').status_code, 200)
+        self.assertEqual(self.client.get(f'/sitemap-{sections + 1}.xml').status_code, 404)
+
+
+class ResponsiveImageTests(TestCase):
+    """Width-bucketed derivatives, manifest and the responsive_image tag"""
+
+    def setUp(self):
+        self.static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_dir, ignore_errors=True)
+        os.makedirs(os.path.join(self.static_dir, 'img'))
+        self.source = os.path.join(self.static_dir, 'img', 'campus.jpg')
+        self.save_source('red')
+        override = override_settings(
+            STATICFILES_DIRS=[self.static_dir],
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+            RESPONSIVE_IMAGE_SOURCES=['img'],
+            RESPONSIVE_IMAGE_ROOT=os.path.join(self.static_dir, 'responsive'),
+            RESPONSIVE_IMAGE_WIDTHS=[100, 200],
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def save_source(self, color):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera Maker'
+        Image.new('RGB', (300, 150), color).save(self.source, 'JPEG', exif=exif)
+
+    def derivative_files(self):
+        root = os.path.join(self.static_dir, 'responsive', 'img')
+        return sorted(os.listdir(root))
+
+    def test_builds_bucketed_variants_without_exif(self):
+        processed, unchanged, failed = responsive_images.build_responsive_images()
+        entry = responsive_images.load_manifest()['images']['img/campus.jpg']
+
+        self.assertEqual((processed, unchanged, failed), (1, 0, 0))
+        self.assertEqual(entry['fallback'], 'jpeg')
+        self.assertEqual([v['width'] for v in entry['variants']['jpeg']], [100, 200])
+        for variant in entry['variants']['jpeg']:
+            self.assertRegex(variant['path'], r'^img/campus-\d+w\.[0-9a-f]{12}\.jpg$')
+            with Image.open(os.path.join(self.static_dir, 'responsive', variant['path'])) as image:
+                self.assertEqual(len(image.getexif()), 0)
+
+    def test_only_changed_sources_are_reprocessed(self):
+        responsive_images.build_responsive_images()
+        before = self.derivative_files()
+        self.assertEqual(responsive_images.build_responsive_images(), (0, 1, 0))
+
+        self.save_source('blue')
+        self.assertEqual(responsive_images.build_responsive_images(), (1, 0, 0))
+        after = self.derivative_files()
+        self.assertEqual(len(after), len(before))
+        self.assertFalse(set(before) & set(after))
+
+    def test_template_tag_emits_srcset(self):
+        responsive_images.build_responsive_images()
+        html = Template(
+            "{% load responsive_images %}"
+            "{% responsive_image 'img/campus.jpg' alt='Campus' sizes='50vw' class='w-full' %}"
+            "{% responsive_image 'img/missing.jpg' alt='Missing' %}"
+        ).render(Context())
+
+        self.assertIn('<source type="image/webp" srcset="/static/responsive/img/campus-100w.', html)
+        self.assertIn('200w" sizes="50vw">', html)
+        self.assertIn('width="300" height="150"', html)
+        self.assertIn('class="w-full"', html)
+        self.assertIn('<img src="/static/img/missing.jpg" alt="Missing" loading="lazy" decoding="async">', html)
+
+
+@PLAIN_STATIC
+class FragmentCacheTests(TestCase):
+    """{% cachefragment %} reuses rendered sections until their version changes"""
+
+    template = Template(
+        "{% load fragment_cache %}{% cachefragment 'greeting' page %}{{ name }}{% endcachefragment %}"
+    )
+
+    def setUp(self):
+        invalidate_fragments()
+
+    def render(self, name, page=1):
+        return self.template.render(Context({'name': name, 'page': page}))
+
+    def test_fragment_is_reused_until_invalidated(self):
+        self.assertEqual(self.render('first'), 'first')
+        self.assertEqual(self.render('second'), 'first')
+        self.assertEqual(self.render('second', page=2), 'second')
+
+        invalidate_fragments()
+
+        self.assertEqual(self.render('third'), 'third')
+
+    def test_keys_vary_on_language_and_deploy_version(self):
+        self.render('english')
+        with translation.override('sw'):
+            self.assertEqual(self.render('swahili'), 'swahili')
+        with override_settings(FRAGMENT_CACHE_VERSION='next-deploy'):
+            self.assertEqual(self.render('redeployed'), 'redeployed')
+
+    @override_settings(FRAGMENT_CACHE_ENABLED=False)
+    def test_disabled_cache_always_renders(self):
+        self.render('first')
+        self.assertEqual(self.render('second'), 'second')
+
+    def test_cached_pages_match_uncached_render(self):
+        def page(url):
+            # CSRF tokens are masked differently on every response
+            return re.sub(rb'name="csrfmiddlewaretoken" value="\w+"', b'', self.client.get(url).content)
+
+        for url in ('/', '/universities/countries/', '/tcu-services/', '/vyuo-vya-ndani/?page=2'):
+            with override_settings(FRAGMENT_CACHE_ENABLED=False):
+                expected = page(url)
+            page(url)
+            self.assertEqual(page(url), expected, url)
+
+
+@PLAIN_STATIC
+class BenchmarkSuiteTests(TestCase):
+    """The benchmark data generator and view runner work on a small data set"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_seed_and_run(self):
+        counts = benchmark_data.seed(students=30)
+
+        self.assertEqual(counts['students'], 30)
+        self.assertEqual(Document.objects.count(), 30 * benchmark_data.DOCUMENTS_PER_STUDENT)
+        self.assertTrue(any(account['pending_payments'] for account in benchmark_data.accounts()['students']))
+
+        results = benchmark_views.run(
+            iterations=1, cases={'employee_dashboard', 'student_dashboard', 'payment_status_poll'},
+        )
+        self.assertEqual({name: result['status'] for name, result in results.items()}, {
+            'employee_dashboard': 200, 'student_dashboard': 200, 'payment_status_poll': 200,
+        })
+        self.assertGreater(results['employee_dashboard']['queries'], 0)
+
+        self.assertGreater(benchmark_data.flush(), 0)
+        self.assertFalse(User.objects.filter(username__startswith=benchmark_data.PREFIX).exists())
+
+    def test_compare_flags_regressions(self):
+        baseline = {'list': {'queries': 5, 'p50_ms': 10.0}}
+        self.assertEqual(benchmark_views.compare(baseline, {'list': {'queries': 5, 'p50_ms': 11.0}}), [])
+        self.assertEqual(len(benchmark_views.compare(baseline, {'list': {'queries': 50, 'p50_ms': 30.0}})), 2)
+
+
+@PLAIN_STATIC
+class QueryBudgetTests(TestCase):
+    """
+    Every named URL runs the same number of queries with little and with a
+    lot of data, and stays within the @query_budget declared on its view
+    """
+
+    URL_MODULES = ('global_agency', 'employee', 'student_portal')
+    SMALL, LARGE = 10, 100
+    # Views that currently fail with a server error; fixing one means removing it here
+    KNOWN_BROKEN = {
+        'global_agency:set_language',  # settings.LANGUAGE_SESSION_KEY no longer exists
+        'global_agency:test_language',  # same
+        'employee:application_detail',  # template uses an unregistered get_attribute filter
+    }
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.staff = User.objects.create_user(username='budget-staff', password='pass12345')
+        UserProfile.objects.create(user=self.staff, role='employee', registration_method='admin')
+        self.student = User.objects.create_user(username='budget-student@example.com', password='pass12345')
+        UserProfile.objects.create(user=self.student, role='student', registration_method='self')
+        StudentProfile.objects.create(user=self.student)
+
+    def grow(self, size):
+        """Seed ``size`` other students, and give our student size / 5 of each row"""
+        benchmark_data.seed(students=size)
+        blob = Document.objects.values_list('file', flat=True).first()
+        for i in range(size // 5):
+            application = Application.objects.create(student=self.student, application_type='university')
+            Payment.objects.create(student=self.student, application=application, amount=5000,
+                                   order_reference=f'BUDGET{size}X{i}', status='success', is_successful=True)
+            Document.objects.create(student=self.student, document_type='passport', file=blob)
+            Message.objects.create(student=self.student, subject='Update', message='Hello')
+        UploadSession.objects.create(student=self.student, document_type='passport', filename='a.pdf', size=10)
+
+    def url_kwargs(self, namespace, name):
+        own = {'student': self.student}
+        values = {
+            'pk': lambda: StudentApplication.objects.values_list('id', flat=True).first(),
+            'application_id': lambda: Application.objects.filter(**own).values_list('id', flat=True).first(),
+            'payment_id': lambda: Payment.objects.filter(**own).values_list('id', flat=True).first(),
+            'document_id': lambda: Document.objects.filter(**own).values_list('id', flat=True).first(),
+            'session_id': lambda: UploadSession.objects.filter(**own).values_list('id', flat=True).first(),
+            'message_id': lambda: (
+                ContactMessage.objects.values_list('id', flat=True).first() if namespace == 'employee'
+                else Message.objects.filter(**own).values_list('id', flat=True).first()
+            ),
+            'uidb64': lambda: 'MQ',
+            'token': lambda: 'set-password',
+            'service_type': lambda: 'visa',
+            'provider': lambda: 'clickpesa',
+            'language': lambda: 'en',
+            'country': lambda: next(iter(COUNTRIES)),
+            'university_name': lambda: 'Unknown',
+            'university_slug': lambda: 'unknown',
+            'file_format': lambda: 'xlsx',
+            'section': lambda: 'personal_details',
+        }
+        return values[name]()
+
+    def walk(self):
+        """{url name: (queries, view, status code)} for every named URL, requested with a cold cache"""
+        results = {}
+        users = {'employee': self.staff, 'student_portal': self.student}
+        # Query counts matter here, not whether a GET is what the view expects
+        self.client.raise_request_exception = False
+        for namespace in self.URL_MODULES:
+            for pattern in import_module(f'{namespace}.urls').urlpatterns:
+                name = f'{namespace}:{pattern.name}'
+                url = reverse(name, kwargs={
+                    key: self.url_kwargs(namespace, key) for key in pattern.pattern.converters
+                })
+                if namespace in users:
+                    self.client.force_login(users[namespace])
+                else:
+                    self.client.logout()
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                    # Streamed responses query while they are consumed
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                results[name] = (len(queries), resolve(url).func, response.status_code)
+        return results
+
+    def measure(self, size):
+        with transaction.atomic():
+            self.grow(size)
+            results = self.walk()
+            transaction.set_rollback(True)
+        return results
+
+    def test_query_counts_are_bounded(self):
+        small, large = self.measure(self.SMALL), self.measure(self.LARGE)
+
+        problems = []
+        for name, (queries, view, status) in large.items():
+            if (status >= 500) != (name in self.KNOWN_BROKEN):
+                problems.append(f'{name}: status {status}')
+            budget = getattr(view, 'query_budget', None)
+            if budget is None:
+                problems.append(f'{name}: no @query_budget ({queries} queries)')
+            elif queries > budget:
+                problems.append(f'{name}: {queries} queries, budget {budget}')
+            if queries != small[name][0]:
+                problems.append(f'{name}: {small[name][0]} queries with {self.SMALL} students, '
+                                f'{queries} with {self.LARGE}')
+        self.assertEqual(problems, [], '\n' + '\n'.join(problems))
+
+    def test_over_budget_is_logged(self):
+        request = RequestFactory().get('/somewhere/')
+
+        @query_budget(1)
+        def view(request):
+            list(User.objects.all())
+            list(User.objects.all())
+            return HttpResponse()
+
+        with self.assertLogs('globalagency_project.utils.query_budget', 'WARNING') as logs:
+            view(request)
+        self.assertIn('2 queries (budget 1)', logs.output[0])
+        self.assertEqual(view.query_budget, 1)
+
+
+class FlakyBackend(locmem.EmailBackend):
+    """locmem backend that counts connections and fails the first ``failures`` sends"""
+    opened = 0
+    failures = 0
+
+    def open(self):
+        FlakyBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        if FlakyBackend.failures:
+            FlakyBackend.failures -= 1
+            raise ConnectionResetError('SMTP server went away')
+        return super().send_messages(messages)
+
+
+@PLAIN_STATIC
+@override_settings(EMAIL_BACKEND='global_agency.tests.FlakyBackend', EMAIL_OUTBOX_RETRY_DELAY=60)
+class EmailOutboxTests(TestCase):
+    """Requests queue emails; the worker sends them in batches with retries"""
+
+    def setUp(self):
+        FlakyBackend.opened = FlakyBackend.failures = 0
+
+    def test_password_reset_queues_instead_of_sending(self):
+        # Two accounts with one address used to raise MultipleObjectsReturned
+        User.objects.create_user(username='amina@example.com', email='amina@example.com', password='pass12345')
+        User.objects.create_user(username='amina-old', email='Amina@example.com', password='pass12345')
+        staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass12345')
+        UserProfile.objects.create(user=staff, role='employee', registration_method='admin')
+
+        response = self.client.post(reverse('student_portal:forgot_password'), {'email': 'amina@example.com'})
+        self.assertRedirects(response, reverse('student_portal:login'), fetch_redirect_response=False)
+        response = self.client.post(reverse('employee:forgot_password'), {'email': 'staff@example.com'})
+        self.assertRedirects(response, reverse('employee:employee_login'), fetch_redirect_response=False)
+
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboundEmail.objects.filter(status='pending').count(), 3)
+
+        call_command('send_queued_emails', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(FlakyBackend.opened, 1)
+        self.assertIn('/employee/reset-password/', mail.outbox[-1].body)
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+
+    def test_non_employee_addresses_are_refused(self):
+        User.objects.create_user(username='amina@example.com', email='amina@example.com', password='pass12345')
+        response = self.client.post(reverse('employee:forgot_password'), {'email': 'amina@example.com'})
+        self.assertContains(response, 'not associated with an employee account')
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_failures_are_retried_with_backoff(self):
+        first = outbox.queue_email('First', 'body', ['a@example.com'])
+        second = outbox.queue_email('Second', 'body', ['b@example.com'])
+        FlakyBackend.failures = 1
+
+        with self.assertLogs('global_agency.outbox', 'WARNING'):
+            self.assertEqual(outbox.send_queued(), (1, 1))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), ('pending', 1))
+        self.assertIn('SMTP server went away', first.last_error)
+        self.assertAlmostEqual((first.next_attempt_at - timezone.now()).total_seconds(), 60, delta=5)
+        # The connection was reset after the failure
+        self.assertEqual(FlakyBackend.opened, 2)
+        self.assertEqual(OutboundEmail.objects.get(pk=second.pk).status, 'sent')
+
+        # Not due yet
+        self.assertEqual(outbox.send_queued(), (0, 0))
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.send_queued(), (1, 0))
+        self.assertEqual([m.subject for m in mail.outbox], ['Second', 'First'])
+        self.assertEqual(outbox.retry_delay(3), 240)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_gives_up_after_max_attempts(self):
+        email = outbox.queue_email('Doomed', 'body', ['a@example.com'])
+        FlakyBackend.failures = 2
+
+        with self.assertLogs('global_agency.outbox', 'WARNING'):
+            outbox.send_queued()
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            outbox.send_queued()
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 2))
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.send_queued(), (0, 0))
+
+    def test_batches_share_one_connection_and_stale_claims_are_resumed(self):
+        for i in range(5):
+            outbox.queue_email(f'Email {i}', 'body', ['a@example.com'])
+        # Claimed by a worker that died
+        OutboundEmail.objects.filter(subject='Email 0').update(status='sending', next_attempt_at=timezone.now())
+
+        self.assertEqual(outbox.send_queued(batch_size=2), (5, 0))
+        self.assertEqual(FlakyBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 5)
@@ -4,14 +4,18 @@ from django.http import Http404
 from django.utils.translation import activate
 from django.conf import settings
 from .forms import StudentApplicationForm, ContactMessageForm, SimpleRegistrationForm
+from .countries import COUNTRIES
 import json
 import os
 from django.core.paginator import Paginator
 from pathlib import Path
+from globalagency_project.utils.query_budget import query_budget
 
+@query_budget(2)
 def home(request):
     return render(request, 'global_agency/index.html')
 
+@query_budget(4)
 def set_language_view(request, language):
     """Switch to a different language and redirect to the same page"""
     # Verify the language is in LANGUAGES
@@ -43,6 +47,7 @@ def set_language_view(request, language):
     # Fallback: redirect to home in the new language
     return redirect(f'/{language}/')
 
+@query_budget(8)
 def register(request):
     """Simple registration view - creates user account only"""
     if request.user.is_authenticated:
@@ -77,6 +82,7 @@ def register(request):
     
     return render(request, 'global_agency/register.html', {'form': form})
 
+@query_budget(4)
 def contact(request):
     if request.method == 'POST':
         form = ContactMessageForm(request.POST)
@@ -91,6 +97,7 @@ def contact(request):
 
     return render(request, 'global_agency/contact_page.html', {'form': form})
 
+@query_budget(8)
 def start_application(request):
     if request.method == 'POST':
         form = StudentApplicationForm(request.POST, request.FILES)
@@ -125,17 +132,19 @@ def start_application(request):
 
     return render(request, 'global_agency/start_application.html', {'form': form})
 
+@query_budget(2)
 def application_success(request):
     """Display success page after application submission"""
     return render(request, 'global_agency/application_success.html')
 
+UNIVERSITIES_JSON_PATH = os.path.join(
+    Path(__file__).resolve().parent.parent, 'static', 'global_agency', 'data', 'universities.json'
+)
+
 def load_universities_data():
     """Load universities data from JSON file"""
-    BASE_DIR = Path(__file__).resolve().parent.parent
-    json_path = os.path.join(BASE_DIR, 'static', 'global_agency', 'data', 'universities.json')
-    
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
+        with open(UNIVERSITIES_JSON_PATH, 'r', encoding='utf-8') as f:
             data = json.load(f)
             return data
     except (FileNotFoundError, KeyError, json.JSONDecodeError) as e:
@@ -148,6 +157,7 @@ def load_universities_data():
             }
         }
 
+@query_budget(2)
 def vyuo_ndani(request):
     """
     Render the Vyuo Vya Ndani page with server-side data and pagination
@@ -199,6 +209,7 @@ def vyuo_ndani(request):
     
     return render(request, 'global_agency/vyuo_ndani.html', context)
 
+@query_budget(2)
 def university_detail(request, university_name):
     """
     Render detailed view for a specific LOCAL university (Tanzanian)
@@ -226,52 +237,12 @@ def university_detail(request, university_name):
     
     return render(request, 'global_agency/university_detail.html', context)
 
+@query_budget(2)
 def country_universities(request, country):
     """
     Render universities for a specific country (Abroad universities)
     """
-    # Expanded countries data with more universities
-    countries_data = {
-        'usa': {
-            'name': 'United States',
-            'flag': '🇺🇸',
-            'universities': [
-                {'name': 'Harvard University', 'slug': 'harvard'},
-                {'name': 'Stanford University', 'slug': 'stanford'},
-                {'name': 'MIT', 'slug': 'mit'},
-                {'name': 'California Institute of Technology', 'slug': 'caltech'},
-                {'name': 'University of Chicago', 'slug': 'chicago'},
-                {'name': 'Princeton University', 'slug': 'princeton'},
-                {'name': 'Yale University', 'slug': 'yale'},
-                {'name': 'Columbia University', 'slug': 'columbia'},
-            ]
-        },
-        'uk': {
-            'name': 'United Kingdom',
-            'flag': '🇬🇧',
-            'universities': [
-                {'name': 'University of Oxford', 'slug': 'oxford'},
-                {'name': 'University of Cambridge', 'slug': 'cambridge'},
-                {'name': 'Imperial College London', 'slug': 'imperial'},
-                {'name': 'London School of Economics', 'slug': 'lse'},
-                {'name': 'University College London', 'slug': 'ucl'},
-                {'name': 'University of Edinburgh', 'slug': 'edinburgh'},
-            ]
-        },
-        'canada': {
-            'name': 'Canada',
-            'flag': '🇨🇦',
-            'universities': [
-                {'name': 'University of Toronto', 'slug': 'toronto'},
-                {'name': 'University of British Columbia', 'slug': 'ubc'},
-                {'name': 'McGill University', 'slug': 'mcgill'},
-                {'name': 'University of Alberta', 'slug': 'alberta'},
-                {'name': 'McMaster University', 'slug': 'mcmaster'},
-            ]
-        },
-    }
-    
-    country_data = countries_data.get(country.lower())
+    country_data = COUNTRIES.get(country.lower())
     if not country_data:
         # Handle invalid country - redirect to all countries page
         return redirect('global_agency:all_countries')
@@ -282,6 +253,7 @@ def country_universities(request, country):
     }
     return render(request, 'global_agency/country_universities.html', context)
 
+@query_budget(2)
 def abroad_university_detail(request, university_slug):
     """
     Render detailed view for a specific ABROAD university
@@ -299,19 +271,20 @@ def abroad_university_detail(request, university_slug):
     context = {'university': university}
     return render(request, 'global_agency/abroad_university_detail.html', context)
    
+@query_budget(2)
 def all_countries(request):
     """
     Render the page showing all available countries for study abroad
     """
     countries = [
-        {'code': 'usa', 'name': 'United States', 'flag': '🇺🇸', 'description': 'World-class universities with diverse programs'},
-        {'code': 'uk', 'name': 'United Kingdom', 'flag': '🇬🇧', 'description': 'Historic universities with 3-year bachelor degrees'},
-        {'code': 'canada', 'name': 'Canada', 'flag': '🇨🇦', 'description': 'High-quality education with post-study work opportunities'},
+        {'code': code, 'name': data['name'], 'flag': data['flag'], 'description': data['description']}
+        for code, data in COUNTRIES.items()
     ]
     
     context = {'countries': countries}
     return render(request, 'global_agency/all_countries.html', context)
 
+@query_budget(2)
 def tcu_services(request):
     """
     Render TCU services page showing how AWEDUCOL helps students with TCU processes
@@ -7,6 +7,9 @@ from django.utils.translation import activate, get_language
 from django.utils.deprecation import MiddlewareMixin
 
 
+LANGUAGE_SESSION_KEY = 'django_language'
+
+
 class LanguageSwitcherMiddleware(MiddlewareMixin):
     """
     Middleware to handle language switching from URL prefixes and GET parameters
@@ -18,8 +21,16 @@ class LanguageSwitcherMiddleware(MiddlewareMixin):
         # Do not check URL prefixes, GET params, or browser language
         language = settings.LANGUAGE_CODE  # Always 'en'
         
-        # Set language in session
-        request.session['django_language'] = language
+        # Only store the language in sessions that already exist, and only
+        # when it differs, so anonymous visitors never get a session row
+        session = getattr(request, 'session', None)
+        if session is not None and session.session_key is not None:
+            current = session.get(LANGUAGE_SESSION_KEY)
+            # get() loads the session, which clears the key when the cookie
+            # is stale; re-read it so a deleted session isn't resurrected
+            still_exists = session.session_key is not None
+            if still_exists and current != language:
+                session[LANGUAGE_SESSION_KEY] = language
         
         # Activate English for this request
         activate(language)
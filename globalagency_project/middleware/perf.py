@@ -0,0 +1,54 @@
+"""
+Opt-in request timing (see globalagency_project.utils.perf)
+"""
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from globalagency_project.utils import perf
+from globalagency_project.utils.shared_cache import observe_cache
+
+
+class PerformanceMiddleware:
+    """
+    Record wall, database, template and cache figures for every request and
+    send them back in a Server-Timing header.
+
+    Goes first in MIDDLEWARE so the other middleware is included in the total.
+    With PERF_INSTRUMENTATION_ENABLED off Django drops it at startup.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_INSTRUMENTATION_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        perf.install_template_hook()
+
+    def __call__(self, request):
+        timings = perf.RequestTimings()
+        token = perf.activate(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.execute_wrapper))
+                cache_counters = stack.enter_context(observe_cache())
+                response = self.get_response(request)
+        finally:
+            perf.deactivate(token)
+        # Streaming bodies are produced after this point and are not included
+        total = time.perf_counter() - start
+
+        response['Server-Timing'] = perf.server_timing(total, timings, cache_counters)
+        perf.recorder.record(self.route(request), total, timings, cache_counters)
+        perf.recorder.maybe_flush()
+        return response
+
+    def route(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return f'{request.method} <unresolved>'
+        return f'{request.method} {match.view_name}'
@@ -3,9 +3,10 @@ Custom Security Middleware for Africa Western Education Application
 """
 import logging
 import time
-from django.http import HttpResponseForbidden
-from django.core.cache import cache
+from urllib.parse import unquote_plus
+from django.http import HttpResponse
 from django.conf import settings
+from globalagency_project.utils import ratelimit
 
 logger = logging.getLogger('django.security')
 
@@ -31,93 +32,111 @@ class SecurityHeadersMiddleware:
         return response
 
 class RateLimitMiddleware:
-    """Simple rate limiting middleware"""
+    """
+    Per-route rate limiting on the shared cache
+
+    Policies come from settings.RATE_LIMIT_POLICIES and are compiled once into
+    a prefix trie; requests to paths without a policy skip the cache entirely.
+    """
     
     def __init__(self, get_response):
         self.get_response = get_response
+        self.routes = ratelimit.compile_policies(getattr(settings, 'RATE_LIMIT_POLICIES', ()))
         
     def __call__(self, request):
-        # Get client IP
-        ip = self.get_client_ip(request)
-        
-        # Rate limiting for login attempts
-        if request.path.startswith('/student-portal/login/') and request.method == 'POST':
-            key = f'login_attempts_{ip}'
-            attempts = cache.get(key, 0)
-            
-            if attempts >= 5:  # Max 5 attempts per hour
-                logger.warning(f'Rate limit exceeded for IP {ip} on login')
-                return HttpResponseForbidden('Too many login attempts. Please try again later.')
-            
-            cache.set(key, attempts + 1, 3600)  # 1 hour timeout
-        
-        # Rate limiting for payment attempts
-        if '/payment/' in request.path and request.method == 'POST':
-            key = f'payment_attempts_{ip}'
-            attempts = cache.get(key, 0)
-            
-            if attempts >= 10:  # Max 10 payment attempts per hour
-                logger.warning(f'Rate limit exceeded for IP {ip} on payment')
-                return HttpResponseForbidden('Too many payment attempts. Please try again later.')
-            
-            cache.set(key, attempts + 1, 3600)  # 1 hour timeout
+        policy = self.routes.match(request.method, request.path_info)
+        if policy is not None:
+            ip = self.get_client_ip(request)
+            result = ratelimit.hit(policy, ip)
+            if not result:
+                logger.warning(f'Rate limit exceeded for IP {ip} on {policy.name}')
+                response = HttpResponse(
+                    'Too many requests. Please try again later.',
+                    status=429,
+                    content_type='text/plain',
+                )
+                response['Retry-After'] = str(result.retry_after)
+                return response
         
         response = self.get_response(request)
         return response
     
     def get_client_ip(self, request):
         """Get client IP address"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
+        return ratelimit.client_ip(request)
+
+# Matched case-insensitively against the path and the decoded query string
+SUSPICIOUS_PATTERNS = [
+    'admin', 'wp-admin', 'phpmyadmin', '.php', '.asp', '.jsp',
+    'eval(', 'script>', 'javascript:', 'vbscript:', 'onload=',
+    '<script', 'SELECT * FROM', 'UNION SELECT', 'DROP TABLE'
+]
+
+
+class SuspiciousRequestScanner:
+    """
+    Single-pass matcher for SUSPICIOUS_PATTERNS
+
+    Patterns are lowercased and de-duplicated once at startup (patterns that
+    contain another pattern, e.g. 'wp-admin', are redundant), and each request
+    is lowercased once into one string holding the path and decoded query.
+
+    CPython's substring search runs in C and beats a combined regex
+    alternation here; see ``manage.py benchmark_security_scanner``.
+    """
+    
+    def __init__(self, patterns=SUSPICIOUS_PATTERNS):
+        lowered = {pattern.lower() for pattern in patterns}
+        self.patterns = tuple(sorted(
+            pattern for pattern in lowered
+            if not any(other != pattern and other in pattern for other in lowered)
+        ))
+        
+    def scan(self, path, query_string=''):
+        """Return the first pattern found in path or query string, or None"""
+        if query_string:
+            if '%' in query_string or '+' in query_string:
+                query_string = unquote_plus(query_string)
+            target = f'{path}\n{query_string}'.lower()
         else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+            target = path.lower()
+        for pattern in self.patterns:
+            if pattern in target:
+                return pattern
+        return None
+
 
 class SecurityLoggingMiddleware:
     """Log security-related events"""
     
     def __init__(self, get_response):
         self.get_response = get_response
+        self.scanner = SuspiciousRequestScanner()
+        self.slow_request_seconds = getattr(settings, 'SLOW_REQUEST_SECONDS', 5)
         
     def __call__(self, request):
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         # Log suspicious requests
         self.log_suspicious_requests(request)
         
         response = self.get_response(request)
         
-        # Log slow requests (potential DoS)
-        duration = time.time() - start_time
-        if duration > 5:  # Requests taking more than 5 seconds
-            logger.warning(f'Slow request: {request.path} took {duration:.2f} seconds')
+        # Log slow requests (potential DoS); the security handler is queued
+        # so the write never blocks the response
+        duration = time.perf_counter() - start_time
+        if duration > self.slow_request_seconds:
+            logger.warning('Slow request: %s took %.2f seconds', request.path, duration)
         
         return response
     
     def log_suspicious_requests(self, request):
         """Log potentially suspicious requests"""
-        # Log requests with suspicious patterns
-        suspicious_patterns = [
-            'admin', 'wp-admin', 'phpmyadmin', '.php', '.asp', '.jsp',
-            'eval(', 'script>', 'javascript:', 'vbscript:', 'onload=',
-            '<script', 'SELECT * FROM', 'UNION SELECT', 'DROP TABLE'
-        ]
-        
-        path = request.path.lower()
-        query_string = request.META.get('QUERY_STRING', '').lower()
-        
-        for pattern in suspicious_patterns:
-            if pattern in path or pattern in query_string:
-                ip = self.get_client_ip(request)
-                logger.warning(f'Suspicious request from {ip}: {request.path}?{request.META.get("QUERY_STRING", "")}')
-                break
+        query_string = request.META.get('QUERY_STRING', '')
+        if self.scanner.scan(request.path, query_string):
+            ip = self.get_client_ip(request)
+            logger.warning('Suspicious request from %s: %s?%s', ip, request.path, query_string)
     
     def get_client_ip(self, request):
         """Get client IP address"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+        return ratelimit.client_ip(request)
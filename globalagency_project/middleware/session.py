@@ -0,0 +1,34 @@
+"""
+Session middleware that avoids rewriting unchanged sessions on every request
+"""
+import time
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+
+
+SESSION_REFRESHED_AT_KEY = '_refreshed_at'
+
+
+class ThrottledSessionMiddleware(SessionMiddleware):
+    """
+    Drop-in replacement for Django's SessionMiddleware.
+
+    Sessions are only saved when their data changed, or when an existing
+    session has not been saved for SESSION_REFRESH_INTERVAL seconds (so
+    active users keep a sliding expiry without a write per request).
+    Empty anonymous sessions are never created.
+    """
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is not None and not session.is_empty():
+            now = int(time.time())
+            if session.modified:
+                session[SESSION_REFRESHED_AT_KEY] = now
+            else:
+                # Loading may discover a stale cookie, which resets the key
+                refreshed_at = session.get(SESSION_REFRESHED_AT_KEY, 0)
+                interval = getattr(settings, 'SESSION_REFRESH_INTERVAL', 900)
+                if session.session_key is not None and now - refreshed_at >= interval:
+                    session[SESSION_REFRESHED_AT_KEY] = now
+        return super().process_response(request, response)
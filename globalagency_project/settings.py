@@ -41,10 +41,12 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    # Before staticfiles so its collectstatic command (which also builds
+    # responsive images) takes precedence
+    'global_agency',
     'django.contrib.staticfiles',
     'django.contrib.sitemaps',
     'crispy_forms',
-    'global_agency',
     'employee',
     'student_portal',
 ]
@@ -54,14 +56,18 @@ INSTALLED_APPS = [
 # =============================================================================
 
 MIDDLEWARE = [
+    'globalagency_project.middleware.perf.PerformanceMiddleware',
+    'globalagency_project.middleware.security.SecurityLoggingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'globalagency_project.middleware.security.RateLimitMiddleware',
+    'globalagency_project.middleware.session.ThrottledSessionMiddleware',
     'django.middleware.gzip.GZipMiddleware',
     'django.middleware.http.ConditionalGetMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'student_portal.middleware.StudentProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'globalagency_project.middleware.i18n.LanguageSwitcherMiddleware',
@@ -161,11 +167,27 @@ STATICFILES_DIRS = [
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Width-bucketed AVIF/WebP/JPEG copies of the photos, built by collectstatic
+# (or manage.py build_responsive_images) and used by {% responsive_image %}
+RESPONSIVE_IMAGE_SOURCES = ['global_agency/img', 'global_agency/image']
+RESPONSIVE_IMAGE_ROOT = BASE_DIR / 'static' / 'responsive'
+RESPONSIVE_IMAGE_WIDTHS = [320, 640, 960, 1280, 1920]
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@africawesternedu.com')
+
+# Emails are queued as OutboundEmail rows and sent by manage.py send_queued_emails
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60  # seconds before the first retry, doubled after each failure
+EMAIL_OUTBOX_CLAIM_SECONDS = 600  # a worker that died releases its batch after this
+# Application changes reach students through manage.py send_notifications; changes
+# to one application within this many seconds are sent as one notification
+NOTIFICATION_COALESCE_SECONDS = 60
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 # =============================================================================
@@ -179,12 +201,16 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SECURE = False if DEBUG else True
 SESSION_COOKIE_SAMESITE = 'Lax'
-SESSION_SAVE_EVERY_REQUEST = True
+# Sessions are written only when they change; active sessions get their
+# expiry refreshed at most once per SESSION_REFRESH_INTERVAL seconds
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_INTERVAL = 900
 
 CSRF_COOKIE_HTTPONLY = True
 CSRF_COOKIE_SECURE = False if DEBUG else True
 CSRF_COOKIE_SAMESITE = 'Lax'
-CSRF_USE_SESSIONS = True
+# Cookie-based CSRF tokens so anonymous form pages don't create sessions
+CSRF_USE_SESSIONS = False
 
 # =============================================================================
 # SECURITY HEADERS
@@ -228,24 +254,70 @@ AUTH_PASSWORD_VALIDATORS = [
 # FILE UPLOAD SECURITY
 # =============================================================================
 
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760
+# Uploads are validated and hashed chunk by chunk; each file is kept in memory
+# only up to 256KB before spilling to a temp file
+FILE_UPLOAD_HANDLERS = ['globalagency_project.utils.upload_handlers.StreamingUploadHandler']
+FILE_UPLOAD_MAX_MEMORY_SIZE = 262144
+FILE_UPLOAD_MAX_SIZE = 5242880
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760
 FILE_UPLOAD_PERMISSIONS = 0o644
-ALLOWED_UPLOAD_EXTENSIONS = ['.pdf', '.doc', '.docx', '.jpg', '.jpeg', '.png', '.gif', '.txt']
+# Documents, plus every image type profile pictures were accepted in before
+ALLOWED_UPLOAD_EXTENSIONS = ['.pdf', '.doc', '.docx', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.txt']
+
+# Resumable uploads: partial files live outside MEDIA_ROOT until finalized
+UPLOAD_SESSION_ROOT = BASE_DIR / 'upload_sessions'
+UPLOAD_CHUNK_SIZE = 1048576
+UPLOAD_SESSION_EXPIRY_HOURS = 24
+
+# Student documents are only served through the access-checked download view.
+# The bytes are sent by the proxy: 'x-accel-redirect' (nginx, with an internal
+# location at PROTECTED_MEDIA_INTERNAL_URL aliasing MEDIA_ROOT), 'x-sendfile'
+# (Apache/lighttpd), or '' to stream them from Django when testing locally
+PROTECTED_MEDIA_SERVER = config('PROTECTED_MEDIA_SERVER', default='')
+PROTECTED_MEDIA_INTERNAL_URL = '/protected-media/'
 
 # =============================================================================
 # CACHING CONFIGURATION
 # =============================================================================
 
-CACHES = {
-    'default': {
+# CACHE_BACKEND selects where the cache lives:
+#   locmem - per-process memory (development only, not shared between workers)
+#   file   - directory shared by all workers on one host (CACHE_LOCATION)
+#   redis  - local or remote Redis server (CACHE_LOCATION, needs `pip install redis`)
+# Subsystems namespace their keys via globalagency_project.utils.shared_cache.
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+CACHE_LOCATION = config('CACHE_LOCATION', default='')
+
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'africa-western-education',
-        'TIMEOUT': 300,
         'OPTIONS': {
             'MAX_ENTRIES': 10000,
             'CULL_FREQUENCY': 4,
         },
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_LOCATION or str(BASE_DIR / 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_LOCATION or 'redis://127.0.0.1:6379/1',
+    },
+}
+
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ValueError(f"Unknown CACHE_BACKEND '{CACHE_BACKEND}', expected one of {sorted(CACHE_BACKENDS)}")
+
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'TIMEOUT': 300,
         'KEY_PREFIX': 'aweducol',
         'VERSION': 1,
     }
@@ -256,6 +328,63 @@ CACHE_MIDDLEWARE_SECONDS = 600
 CACHE_MIDDLEWARE_KEY_PREFIX = 'aweducol'
 DEFAULT_CACHE_TIMEOUT = 300
 
+# Static sections of the public templates ({% cachefragment %}). Keys change
+# with FRAGMENT_CACHE_VERSION, or when any template or watched file changes
+FRAGMENT_CACHE_ENABLED = config('FRAGMENT_CACHE_ENABLED', default=True, cast=bool)
+FRAGMENT_CACHE_VERSION = config('FRAGMENT_CACHE_VERSION', default='')
+FRAGMENT_CACHE_TIMEOUT = 86400
+FRAGMENT_CACHE_WATCH = [
+    BASE_DIR / 'global_agency' / 'countries.py',
+    BASE_DIR / 'static' / 'global_agency' / 'data' / 'universities.json',
+    STATIC_ROOT / 'staticfiles.json',
+    RESPONSIVE_IMAGE_ROOT / 'manifest.json',
+]
+
+# Requests slower than this are logged to the security log
+SLOW_REQUEST_SECONDS = 5
+
+# Per-route timing (Server-Timing headers, /employee/perf/, dump_perf_stats).
+# Off by default; the middleware removes itself when disabled
+PERF_INSTRUMENTATION_ENABLED = config('PERF_INSTRUMENTATION_ENABLED', default=False, cast=bool)
+PERF_SAMPLE_SIZE = 500  # most recent requests kept per route and worker
+PERF_FLUSH_SECONDS = 30
+PERF_STATS_DIR = BASE_DIR / 'perf_stats'
+PERF_STATS_MAX_AGE = 3600  # ignore workers that have not written for this long
+
+# Count queries in views decorated with @query_budget and log any over budget
+QUERY_BUDGET_CHECKS = config('QUERY_BUDGET_CHECKS', default=True, cast=bool)
+
+# Bulk student import from the employee portal, hashed in the request; bigger
+# files go through the import_students management command
+STUDENT_IMPORT_MAX_ROWS = 50
+
+# =============================================================================
+# RATE LIMITING
+# =============================================================================
+
+# Reverse proxies in front of Django that append to X-Forwarded-For; clients are
+# identified by the address the outermost of them saw (0: use REMOTE_ADDR)
+NUM_PROXIES = config('NUM_PROXIES', default=0, cast=int)
+
+# Matched by path prefix ('*' matches one segment); the most specific wins.
+# algorithm: 'fixed', 'sliding' or 'token_bucket' (limit tokens per window)
+RATE_LIMIT_POLICIES = [
+    {'name': 'student_login', 'prefix': '/student-portal/login/',
+     'limit': 5, 'window': 3600, 'methods': ['POST'], 'algorithm': 'sliding'},
+    {'name': 'employee_login', 'prefix': '/employee/login/',
+     'limit': 5, 'window': 3600, 'methods': ['POST'], 'algorithm': 'sliding'},
+    {'name': 'payment', 'prefix': '/student-portal/applications/*/payment/',
+     'limit': 10, 'window': 3600, 'methods': ['POST'], 'algorithm': 'fixed'},
+    {'name': 'payment', 'prefix': '/student-portal/applications/*/make-payment/',
+     'limit': 10, 'window': 3600, 'methods': ['POST'], 'algorithm': 'fixed'},
+    {'name': 'payment', 'prefix': '/student-portal/payment/',
+     'limit': 10, 'window': 3600, 'methods': ['POST'], 'algorithm': 'fixed'},
+    {'name': 'payment_status', 'prefix': '/student-portal/payment/*/status/',
+     'limit': 20, 'window': 60, 'methods': ['GET'], 'algorithm': 'token_bucket'},
+    {'name': 'webhook', 'prefix': '/student-portal/webhook/',
+     'limit': 120, 'window': 60, 'methods': ['POST'], 'algorithm': 'token_bucket'},
+]
+
 # =============================================================================
 # TEMPLATE CACHING (Production only)
 # =============================================================================
@@ -305,7 +434,7 @@ LOGGING = {
         },
         'security_file': {
             'level': 'WARNING',
-            'class': 'logging.FileHandler',
+            'class': 'globalagency_project.utils.log_queue.QueuedFileHandler',
             'filename': 'logs/security.log',
             'formatter': 'verbose',
         },
@@ -341,6 +470,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'globalagency_project': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }
 
@@ -366,6 +500,12 @@ ROBOTS_RULES = [
 SITEMAP_CHANGEFREQ_DEFAULT = 'weekly'
 SITEMAP_PRIORITY_DEFAULT = 0.5
 
+# Pre-rendered sitemap files (rebuilt when the page/university data changes)
+SITEMAP_BASE_URL = config('SITEMAP_BASE_URL', default='https://africawesterneducation.com')
+SITEMAP_ROOT = BASE_DIR / 'sitemaps'
+# The sitemap protocol allows at most 50,000 URLs per file
+SITEMAP_MAX_URLS = 50000
+
 GA4_MEASUREMENT_ID = config('GA4_MEASUREMENT_ID', default='')
 GOOGLE_SITE_VERIFICATION = config('GOOGLE_SITE_VERIFICATION', default='')
 BING_SITE_VERIFICATION = config('BING_SITE_VERIFICATION', default='')
@@ -1,105 +1,247 @@
 """
-Sitemap configuration for SEO optimization
-Supports multilingual sitemap generation
+Sitemap generation for SEO optimization
+
+URLs are enumerated from the real data sources: the public page templates,
+the universities catalog (universities.json) and the study-abroad countries.
+Every URL carries a fingerprint of the data it is rendered from, and its
+lastmod only moves when that fingerprint changes - to the time of the last
+commit touching the source file that changed - so crawlers re-fetch only
+what changed. Commit times survive deploys from a fresh checkout, where the
+previous build's state and every file's mtime are gone; files with
+uncommitted changes (or outside git) fall back to their mtime.
+
+The XML is pre-rendered into SITEMAP_ROOT and rebuilt only when one of the
+source files changes on disk. Once there are more than SITEMAP_MAX_URLS URLs,
+sitemap.xml becomes a sitemap index pointing at sitemap-1.xml, sitemap-2.xml...
 """
-from django.contrib.sitemaps import Sitemap
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.template.loader import get_template
 from django.urls import reverse
-from django.utils.translation import activate, get_language
-
-
-class StaticPagesSitemap(Sitemap):
-    """Sitemap for static pages"""
-    changefreq = 'weekly'
-    priority = 0.8
-
-    def items(self):
-        """Return list of static pages"""
-        return ['home', 'about', 'services', 'contact', 'courses']
-
-    def location(self, item):
-        """Generate URL for each item"""
-        return reverse(item)
-
-    def lastmod(self, item):
-        """Return last modified date - can be extended with actual dates"""
-        from datetime import datetime
-        return datetime.now()
-
-
-class UniversitiesSitemap(Sitemap):
-    """Sitemap for university listings"""
-    changefreq = 'monthly'
-    priority = 0.7
-
-    def items(self):
-        """Return list of universities - extend with actual model"""
-        # This would query your University model if you have one
-        # For now returning example items
-        return [
-            {'id': 1, 'name': 'Example University 1'},
-            {'id': 2, 'name': 'Example University 2'},
-        ]
-
-    def location(self, item):
-        """Generate URL for each university"""
-        return f'/universities/{item["id"]}/'
-
-    def lastmod(self, item):
-        """Return last modified date"""
-        from datetime import datetime
-        return datetime.now()
-
-
-class CoursesSitemap(Sitemap):
-    """Sitemap for course listings"""
-    changefreq = 'monthly'
-    priority = 0.7
-
-    def items(self):
-        """Return list of courses"""
-        courses = [
-            {'id': 1, 'slug': 'computer-science'},
-            {'id': 2, 'slug': 'business-management'},
-            {'id': 3, 'slug': 'healthcare-medical'},
-            {'id': 4, 'slug': 'engineering'},
-            {'id': 5, 'slug': 'data-science'},
-            {'id': 6, 'slug': 'law'},
-        ]
-        return courses
-
-    def location(self, item):
-        """Generate URL for each course"""
-        return f'/courses/{item["slug"]}/'
-
-    def lastmod(self, item):
-        """Return last modified date"""
-        from datetime import datetime
-        return datetime.now()
-
-
-class BlogSitemap(Sitemap):
-    """Sitemap for blog posts"""
-    changefreq = 'weekly'
-    priority = 0.6
-
-    def items(self):
-        """Return list of blog posts"""
-        # This would query your BlogPost model if you have one
-        return []
-
-    def location(self, item):
-        """Generate URL for each blog post"""
-        return f'/blog/{item.slug}/'
-
-    def lastmod(self, item):
-        """Return last modified date"""
-        return item.updated_at if hasattr(item, 'updated_at') else item.created_at
-
-
-# Sitemap configuration dictionary
-sitemaps = {
-    'static': StaticPagesSitemap,
-    'universities': UniversitiesSitemap,
-    'courses': CoursesSitemap,
-    'blog': BlogSitemap,
-}
+from django.utils.http import http_date
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+STATE_FILE = 'state.json'
+
+SitemapEntry = namedtuple('SitemapEntry', 'location fingerprint source changefreq priority')
+
+# (url name, template, changefreq, priority)
+STATIC_PAGES = [
+    ('global_agency:home', 'global_agency/index.html', 'weekly', 1.0),
+    ('global_agency:vyuo_ndani', 'global_agency/vyuo_ndani.html', 'weekly', 0.9),
+    ('global_agency:all_countries', 'global_agency/all_countries.html', 'monthly', 0.8),
+    ('global_agency:tcu_services', 'global_agency/tcu_services.html', 'monthly', 0.7),
+    ('global_agency:start_application', 'global_agency/start_application.html', 'monthly', 0.7),
+    ('global_agency:register', 'global_agency/register.html', 'monthly', 0.6),
+    ('global_agency:contact', 'global_agency/contact_page.html', 'monthly', 0.6),
+]
+
+
+def _fingerprint(data):
+    if not isinstance(data, bytes):
+        data = json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def _template_path(template_name):
+    return get_template(template_name).origin.name
+
+
+def _countries_path():
+    from global_agency import countries
+    return countries.__file__
+
+
+def source_files():
+    """Every file whose content ends up in the sitemap"""
+    from global_agency.views import UNIVERSITIES_JSON_PATH
+    paths = [_template_path(template) for _, template, _, _ in STATIC_PAGES]
+    return paths + [UNIVERSITIES_JSON_PATH, _countries_path()]
+
+
+def source_signature():
+    """Cheap change detector: (path, mtime, size) of every source file"""
+    signature = []
+    for path in source_files():
+        try:
+            stat = os.stat(path)
+            signature.append([path, stat.st_mtime_ns, stat.st_size])
+        except OSError:
+            signature.append([path, None, None])
+    return signature
+
+
+def collect_entries():
+    """Enumerate every public URL with a fingerprint of the data behind it"""
+    from global_agency.countries import COUNTRIES
+    from global_agency.views import UNIVERSITIES_JSON_PATH, load_universities_data
+
+    entries = []
+    for url_name, template, changefreq, priority in STATIC_PAGES:
+        path = _template_path(template)
+        with open(path, 'rb') as f:
+            entries.append(SitemapEntry(reverse(url_name), _fingerprint(f.read()), path, changefreq, priority))
+
+    universities = load_universities_data()['admission_guidebook']['higher_education_institutions']
+    for university in universities:
+        entries.append(SitemapEntry(
+            reverse('global_agency:university_detail', args=[university['name']]),
+            _fingerprint(university), UNIVERSITIES_JSON_PATH, 'monthly', 0.7,
+        ))
+
+    countries_path = _countries_path()
+    for code, country in COUNTRIES.items():
+        entries.append(SitemapEntry(
+            reverse('global_agency:country_universities', args=[code]),
+            _fingerprint(country), countries_path, 'monthly', 0.7,
+        ))
+    return entries
+
+
+def _git(path, *args):
+    result = subprocess.run(
+        ['git', *args, '--', os.path.basename(path)], cwd=os.path.dirname(path),
+        capture_output=True, text=True, timeout=10, check=True,
+    )
+    return result.stdout.strip()
+
+
+def source_time(path):
+    """When ``path`` last changed: its last commit, or its mtime if it has uncommitted changes"""
+    try:
+        if not _git(path, 'status', '--porcelain'):
+            committed = _git(path, 'log', '-1', '--format=%ct')
+            if committed:
+                return int(committed)
+    except (OSError, subprocess.SubprocessError, ValueError):
+        pass
+    return os.stat(path).st_mtime
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(microsecond=0).isoformat()
+
+
+def _render_urlset(urls, base_url):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', f'<urlset xmlns="{SITEMAP_NS}">']
+    for entry, lastmod in urls:
+        lines.append(
+            f'<url><loc>{escape(base_url + entry.location)}</loc><lastmod>{lastmod}</lastmod>'
+            f'<changefreq>{entry.changefreq}</changefreq><priority>{entry.priority:.1f}</priority></url>'
+        )
+    lines.append('</urlset>')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def _render_index(sections, base_url):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', f'<sitemapindex xmlns="{SITEMAP_NS}">']
+    for number, lastmod in sections:
+        location = escape(base_url + reverse('sitemap_section', args=[number]))
+        lines.append(f'<sitemap><loc>{location}</loc><lastmod>{lastmod}</lastmod></sitemap>')
+    lines.append('</sitemapindex>')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def _write_atomic(path, content):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _load_state(root):
+    try:
+        with open(os.path.join(root, STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def build_sitemaps(force=False):
+    """
+    Regenerate the sitemap files if any source changed.
+
+    Returns the state dict: source signature, per-URL fingerprint/lastmod and
+    an ETag per output file.
+    """
+    root = str(settings.SITEMAP_ROOT)
+    os.makedirs(root, exist_ok=True)
+    state = _load_state(root)
+    signature = source_signature()
+    if not force and state.get('signature') == signature and all(
+        os.path.exists(os.path.join(root, name)) for name in state.get('files', {})
+    ):
+        return state
+
+    previous = state.get('urls', {})
+    source_times = {}
+    urls = {}
+    rendered = []
+    for entry in collect_entries():
+        known = previous.get(entry.location)
+        if known and known['fingerprint'] == entry.fingerprint:
+            lastmod = known['lastmod']
+        else:
+            if entry.source not in source_times:
+                source_times[entry.source] = source_time(entry.source)
+            lastmod = _isoformat(source_times[entry.source])
+        urls[entry.location] = {'fingerprint': entry.fingerprint, 'lastmod': lastmod}
+        rendered.append((entry, lastmod))
+
+    base_url = settings.SITEMAP_BASE_URL.rstrip('/')
+    max_urls = settings.SITEMAP_MAX_URLS
+    outputs = {}
+    if len(rendered) <= max_urls:
+        outputs['sitemap.xml'] = _render_urlset(rendered, base_url)
+    else:
+        sections = []
+        for number, start in enumerate(range(0, len(rendered), max_urls), start=1):
+            chunk = rendered[start:start + max_urls]
+            outputs[f'sitemap-{number}.xml'] = _render_urlset(chunk, base_url)
+            sections.append((number, max(lastmod for _, lastmod in chunk)))
+        outputs['sitemap.xml'] = _render_index(sections, base_url)
+
+    files = {}
+    for name, content in outputs.items():
+        etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+        path = os.path.join(root, name)
+        if state.get('files', {}).get(name) != etag or not os.path.exists(path):
+            _write_atomic(path, content)
+        files[name] = etag
+
+    # Sections left over from a larger sitemap
+    for name in set(state.get('files', {})) - set(files):
+        try:
+            os.remove(os.path.join(root, name))
+        except FileNotFoundError:
+            pass
+
+    state = {'signature': signature, 'urls': urls, 'files': files}
+    _write_atomic(os.path.join(root, STATE_FILE), json.dumps(state).encode('utf-8'))
+    return state
+
+
+def sitemap_view(request, section=None):
+    """Serve a pre-rendered sitemap file; ConditionalGetMiddleware answers 304s"""
+    name = 'sitemap.xml' if section is None else f'sitemap-{section}.xml'
+    state = build_sitemaps()
+    etag = state['files'].get(name)
+    if etag is None:
+        raise Http404('No such sitemap section')
+
+    path = os.path.join(str(settings.SITEMAP_ROOT), name)
+    with open(path, 'rb') as f:
+        response = HttpResponse(f.read(), content_type='application/xml')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(os.stat(path).st_mtime)
+    return response
@@ -1,23 +1,138 @@
-"""Simple caching utilities"""
-from django.core.cache import cache
+"""
+Query-result caching utilities
+
+Cached results are keyed deterministically (a SHA-1 of the function name and
+its arguments, never Python's per-process ``hash``) so every worker and every
+restart agrees on the key. Each cached function declares tags such as
+``user:{user_id}:applications``; the current version of every tag is part of
+the key, so bumping a tag with ``invalidate_tags`` makes all dependent entries
+unreachable at once. Results are materialized to plain dicts/tuples before
+caching - caching a lazy QuerySet would just re-run the query.
+"""
+import hashlib
+import inspect
+import json
+import time
 from functools import wraps
+from globalagency_project.utils.shared_cache import namespace
 
-def cache_for_minutes(minutes=5):
-    """Simple cache decorator"""
+query_cache = namespace('queries')
+tag_cache = namespace('tags')
+
+# Tags are formatted with the cached function's arguments
+USER_APPLICATIONS_TAG = 'user:{user_id}:applications'
+USER_DOCUMENTS_TAG = 'user:{user_id}:documents'
+USER_MESSAGES_TAG = 'user:{user_id}:messages'
+
+
+def make_cache_key(name, args=(), kwargs=None):
+    """Build a stable cache key from a name and call arguments"""
+    payload = json.dumps([args, sorted((kwargs or {}).items())], default=str, sort_keys=True)
+    digest = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    return f'{name}:{digest}'
+
+
+def _new_tag_version():
+    # Time-based so a tag evicted from the cache never reuses an old version
+    return time.time_ns()
+
+
+def get_tag_versions(tags):
+    """Return the current version of each tag, creating missing ones"""
+    versions = tag_cache.get_many(tags)
+    for tag in tags:
+        if tag not in versions:
+            version = _new_tag_version()
+            if not tag_cache.add(tag, version, None):
+                version = tag_cache.get(tag, version)
+            versions[tag] = version
+    return versions
+
+
+def invalidate_tags(*tags):
+    """Bump the given tags so every entry cached under them is discarded"""
+    version = _new_tag_version()
+    tag_cache.set_many({tag: version for tag in tags}, None)
+
+
+def cached_query(tags=(), timeout=600, version=1):
+    """
+    Cache a function's (materialized) return value.
+
+    ``tags`` are format strings filled from the function's bound arguments,
+    e.g. ``'user:{user_id}:applications'``. ``version`` should be bumped when
+    the shape of the returned data changes.
+    """
     def decorator(func):
+        signature = inspect.signature(func)
+        name = f'{func.__module__}.{func.__qualname__}:v{version}'
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            cache_key = f"{func.__name__}_{hash(str(args) + str(kwargs))}"
-            result = cache.get(cache_key)
-            if result is None:
-                result = func(*args, **kwargs)
-                cache.set(cache_key, result, minutes * 60)
-            return result
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            resolved_tags = [tag.format(**bound.arguments) for tag in tags]
+            versions = get_tag_versions(resolved_tags) if resolved_tags else {}
+            key = make_cache_key(
+                name,
+                bound.args,
+                {**bound.kwargs, '_tags': [versions[tag] for tag in resolved_tags]},
+            )
+            return query_cache.get_or_set(key, lambda: func(*args, **kwargs), timeout)
+
         return wrapper
     return decorator
 
-@cache_for_minutes(10)
+
+def cache_for_minutes(minutes=5):
+    """Simple cache decorator"""
+    return cached_query(timeout=minutes * 60)
+
+
+@cached_query(tags=[USER_APPLICATIONS_TAG], timeout=600)
 def get_user_applications(user_id):
-    """Cache user applications"""
+    """Cache user applications as a list of dicts, newest first"""
     from student_portal.models import Application
-    return Application.objects.filter(student_id=user_id).select_related('student')
+    type_labels = dict(Application.APPLICATION_TYPES)
+    status_labels = dict(Application.APPLICATION_STATUS)
+    payment_labels = dict(Application.PAYMENT_STATUS_CHOICES)
+
+    rows = Application.objects.filter(student_id=user_id).order_by('-created_at').values(
+        'id', 'application_type', 'university_name', 'course', 'country', 'status',
+        'payment_status', 'payment_amount', 'is_paid', 'created_at', 'submission_date',
+    )
+    applications = []
+    for row in rows:
+        row['application_type_display'] = type_labels.get(row['application_type'], row['application_type'])
+        row['status_display'] = status_labels.get(row['status'], row['status'])
+        row['payment_status_display'] = payment_labels.get(row['payment_status'], row['payment_status'])
+        applications.append(row)
+    return applications
+
+
+@cached_query(tags=[USER_APPLICATIONS_TAG], timeout=600)
+def get_user_application_stats(user_id):
+    """Cache per-status application counts for a user (one GROUP BY query)"""
+    from django.db.models import Count
+    from student_portal.models import Application
+
+    counts = dict(
+        Application.objects.filter(student_id=user_id)
+        .order_by()
+        .values_list('status')
+        .annotate(total=Count('id'))
+    )
+    stats = {'total': sum(counts.values())}
+    for status in ('submitted', 'pending_payment', 'under_review', 'approved', 'rejected'):
+        stats[status] = counts.get(status, 0)
+    return stats
+
+
+@cached_query(tags=[USER_DOCUMENTS_TAG, USER_MESSAGES_TAG], timeout=600)
+def get_user_dashboard_counts(user_id):
+    """Cache document and unread message counts shown on the student dashboard"""
+    from student_portal.models import Document, Message
+    return {
+        'documents_count': Document.objects.filter(student_id=user_id).count(),
+        'unread_messages_count': Message.objects.filter(student_id=user_id, is_read=False).count(),
+    }
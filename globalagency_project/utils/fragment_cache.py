@@ -0,0 +1,81 @@
+"""
+Versioned template fragment caching
+
+The public pages are mostly static markup with many {% trans %}, {% url %} and
+{% static %} tags, so sections such as the hero, country cards and footer are
+rendered once and reused (see the ``cachefragment`` template tag). Keys are
+built from:
+
+- the fragment name and its vary-on values,
+- the active language,
+- a deploy fingerprint: FRAGMENT_CACHE_VERSION if set, otherwise a hash of the
+  template files and FRAGMENT_CACHE_WATCH (data files, static manifests)
+  taken once per process, so a deploy that changes any of them switches every
+  worker to new keys, and
+- the version of the FRAGMENTS_TAG tag, bumped by invalidate_fragments()
+  (``manage.py clear_fragment_cache``) when data changes without a deploy.
+
+Old entries are never deleted, they just stop being read and expire.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.utils.translation import get_language
+
+from globalagency_project.utils.cache_utils import get_tag_versions, invalidate_tags, make_cache_key
+from globalagency_project.utils.shared_cache import namespace
+
+fragment_cache = namespace('fragments')
+
+FRAGMENTS_TAG = 'templates:fragments'
+
+_fingerprint = None
+
+
+def _watched_files():
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                yield os.path.join(dirpath, filename)
+    for path in settings.FRAGMENT_CACHE_WATCH:
+        yield str(path)
+
+
+def deploy_fingerprint():
+    """Identifies the templates and data this process renders fragments from"""
+    global _fingerprint
+    if settings.FRAGMENT_CACHE_VERSION:
+        return settings.FRAGMENT_CACHE_VERSION
+    if _fingerprint is None:
+        digest = hashlib.sha1()
+        for path in sorted(_watched_files()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            digest.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size}\n'.encode('utf-8'))
+        _fingerprint = digest.hexdigest()[:12]
+    return _fingerprint
+
+
+def fragment_key(name, vary_on=()):
+    version = get_tag_versions([FRAGMENTS_TAG])[FRAGMENTS_TAG]
+    return make_cache_key(f'{name}:{deploy_fingerprint()}:{version}', [get_language(), *vary_on])
+
+
+def cached_fragment(name, vary_on, render):
+    """Return the cached markup for the fragment, rendering it on a miss"""
+    if not settings.FRAGMENT_CACHE_ENABLED:
+        return render()
+    key = fragment_key(name, vary_on)
+    content = fragment_cache.get(key)
+    if content is None:
+        content = render()
+        fragment_cache.set(key, content, settings.FRAGMENT_CACHE_TIMEOUT)
+    return content
+
+
+def invalidate_fragments():
+    """Make every cached fragment stale, e.g. after editing the content data"""
+    invalidate_tags(FRAGMENTS_TAG)
@@ -0,0 +1,33 @@
+"""
+Non-blocking log handlers
+
+Request threads only put records on an in-memory queue; a background
+QueueListener thread does the (possibly slow) file I/O.
+"""
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+class QueuedFileHandler(QueueHandler):
+    """Drop-in replacement for logging.FileHandler that writes on a background thread"""
+
+    def __init__(self, filename, mode='a', encoding=None, delay=True):
+        super().__init__(queue.SimpleQueue())
+        self.target = logging.FileHandler(filename, mode, encoding, delay)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        # Format on the listener thread; QueueHandler.prepare() then only
+        # merges the message arguments in the calling thread
+        self.target.setFormatter(fmt)
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            self.target.close()
+        super().close()
@@ -0,0 +1,221 @@
+"""
+Request instrumentation
+
+PerformanceMiddleware (opt-in with PERF_INSTRUMENTATION_ENABLED) times every
+request and splits it into database, template and remaining Python time:
+
+- queries go through a ``connection.execute_wrapper`` installed per request,
+- template time is measured around the outermost ``Template.render`` call,
+  minus the queries run while rendering (lazy querysets in templates), and
+- cache hits/misses come from the shared cache's per-request counters.
+
+Samples are kept per route (view name) in a bounded in-memory buffer. Each
+worker process periodically writes its buffer to PERF_STATS_DIR so the staff
+page and ``manage.py dump_perf_stats`` can merge all workers on the host.
+When the setting is off the middleware removes itself and the template hook
+is never installed, so there is no per-request cost.
+"""
+import contextvars
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.template.base import Template
+
+_current = contextvars.ContextVar('perf_timings', default=None)
+
+# total, db, template and python time in ms, query count, cache hits, cache misses
+SAMPLE_FIELDS = ('total', 'db', 'template', 'python', 'queries', 'cache_hits', 'cache_misses')
+
+
+class RequestTimings:
+    """Counters for the request being handled"""
+
+    __slots__ = ('queries', 'db', 'template', 'in_template')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.in_template = False
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+
+def activate(timings):
+    return _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+_original_render = None
+
+
+def install_template_hook():
+    """Time Template.render for instrumented requests (installed once)"""
+    global _original_render
+    if _original_render is not None:
+        return
+    _original_render = original = Template.render
+
+    def render(self, context):
+        timings = _current.get()
+        if timings is None or timings.in_template:
+            # Includes are already inside the outer render's timing
+            return original(self, context)
+        timings.in_template = True
+        start, db_before = time.perf_counter(), timings.db
+        try:
+            return original(self, context)
+        finally:
+            timings.template += time.perf_counter() - start - (timings.db - db_before)
+            timings.in_template = False
+
+    Template.render = render
+
+
+def server_timing(total, timings, cache_counters):
+    """Server-Timing header value (durations in ms)"""
+    return ', '.join([
+        f'db;dur={timings.db * 1e3:.1f};desc="{timings.queries} queries"',
+        f'tpl;dur={timings.template * 1e3:.1f}',
+        f'cache;desc="{cache_counters["hits"]} hits, {cache_counters["misses"]} misses"',
+        f'total;dur={total * 1e3:.1f}',
+    ])
+
+
+class PerfRecorder:
+    """Bounded per-route sample buffers for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, route, total, timings, cache_counters):
+        sample = (
+            round(total * 1e3, 2),
+            round(timings.db * 1e3, 2),
+            round(timings.template * 1e3, 2),
+            round(max(total - timings.db - timings.template, 0) * 1e3, 2),
+            timings.queries,
+            cache_counters['hits'],
+            cache_counters['misses'],
+        )
+        with self._lock:
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = self._routes[route] = {'count': 0, 'samples': deque(maxlen=settings.PERF_SAMPLE_SIZE)}
+            entry['count'] += 1
+            entry['samples'].append(sample)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                route: {'count': entry['count'], 'samples': list(entry['samples'])}
+                for route, entry in self._routes.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def maybe_flush(self):
+        """Write the buffers to PERF_STATS_DIR at most every PERF_FLUSH_SECONDS"""
+        now = time.monotonic()
+        if now - self._last_flush < settings.PERF_FLUSH_SECONDS:
+            return
+        self._last_flush = now
+        self.flush()
+
+    def flush(self):
+        directory = settings.PERF_STATS_DIR
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'pid': os.getpid(), 'routes': self.snapshot()}, f)
+            os.replace(tmp_path, os.path.join(directory, f'{os.getpid()}.json'))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+recorder = PerfRecorder()
+
+
+def collect():
+    """
+    Samples of every worker that wrote to PERF_STATS_DIR within
+    PERF_STATS_MAX_AGE seconds, merged per route. This process's buffers are
+    flushed first so they are always current.
+    """
+    recorder.flush()
+    directory = settings.PERF_STATS_DIR
+    cutoff = time.time() - settings.PERF_STATS_MAX_AGE
+    routes = {}
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                continue
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for route, entry in data['routes'].items():
+            merged = routes.setdefault(route, {'count': 0, 'samples': []})
+            merged['count'] += entry['count']
+            merged['samples'].extend(entry['samples'])
+    return routes
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+
+def summarize(routes):
+    """Per-route percentiles and averages, most total time first"""
+    rows = []
+    for route, entry in routes.items():
+        samples = entry['samples']
+        if not samples:
+            continue
+        n = len(samples)
+        columns = dict(zip(SAMPLE_FIELDS, zip(*samples)))
+        totals = sorted(columns['total'])
+        hits, misses = sum(columns['cache_hits']), sum(columns['cache_misses'])
+        rows.append({
+            'route': route,
+            'count': entry['count'],
+            'p50': percentile(totals, 0.50),
+            'p90': percentile(totals, 0.90),
+            'p99': percentile(totals, 0.99),
+            'max': totals[-1],
+            'db': round(sum(columns['db']) / n, 2),
+            'queries': round(sum(columns['queries']) / n, 1),
+            'template': round(sum(columns['template']) / n, 2),
+            'python': round(sum(columns['python']) / n, 2),
+            'cache_hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+            'mean': round(sum(totals) / n, 2),
+        })
+    rows.sort(key=lambda row: row['mean'] * row['count'], reverse=True)
+    return rows
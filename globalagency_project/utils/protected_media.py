@@ -0,0 +1,135 @@
+"""
+Hand access-controlled files to the front proxy
+
+Views check permissions, then call serve_protected_file(). Depending on
+PROTECTED_MEDIA_SERVER the bytes are sent by:
+
+- 'x-accel-redirect': nginx, from an ``internal`` location mapped to
+  PROTECTED_MEDIA_INTERNAL_URL, e.g.
+
+      location /protected-media/ {
+          internal;
+          alias /srv/globalagency/media/;
+      }
+
+- 'x-sendfile': Apache mod_xsendfile / lighttpd, from the absolute path.
+- '' (local testing): Django's FileResponse, which uses the server's
+  wsgi.file_wrapper (sendfile under gunicorn). Single byte ranges and ETag
+  revalidation are handled here; the proxies do both themselves.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _RangeReader:
+    """File wrapper that stops after ``length`` bytes"""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _requested_range(request, size, etag):
+    """(start, end) of a satisfiable single range, 'invalid', or None for the whole file"""
+    header = request.headers.get('Range')
+    if not header:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        # The client's partial copy is stale; send the whole file
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Multiple ranges are rare for documents; answer with the full file
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last or int(last) == 0:
+            return 'invalid'
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'invalid'
+    return start, end
+
+
+def serve_protected_file(request, name, filename, etag=None, as_attachment=False):
+    """
+    Response for the file stored as ``name`` under MEDIA_ROOT, presented to
+    the browser as ``filename``. ``etag`` should be a quoted, strong ETag
+    when the content for this URL never changes (content-addressed files).
+    """
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    server = settings.PROTECTED_MEDIA_SERVER
+
+    if server == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(settings.PROTECTED_MEDIA_INTERNAL_URL + name)
+    elif server == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        response = _file_response(request, path, content_type, etag)
+
+    if response.status_code in (200, 206):
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+def _file_response(request, path, content_type, etag):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('File not found')
+    etag = etag or f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        byte_range = _requested_range(request, stat.st_size, etag)
+        if byte_range == 'invalid':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        else:
+            file = open(path, 'rb')
+            if byte_range is None:
+                response = FileResponse(file, content_type=content_type)
+            else:
+                start, end = byte_range
+                file.seek(start)
+                if end == stat.st_size - 1:
+                    # Still a real file at an offset, so sendfile can be used
+                    response = FileResponse(file, content_type=content_type, status=206)
+                else:
+                    response = FileResponse(_RangeReader(file, end - start + 1),
+                                            content_type=content_type, status=206)
+                    response['Content-Length'] = end - start + 1
+                response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
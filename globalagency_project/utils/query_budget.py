@@ -0,0 +1,59 @@
+"""
+Per-view query budgets
+
+Every view declares how many queries a request may run:
+
+    @query_budget(6)
+    @login_required
+    @employee_required
+    def document_list(request):
+        ...
+
+Place it first so the queries of the other decorators (session, user,
+profile lookups) count too. The budget is a constant: it must not depend on
+how many rows the view shows, which global_agency.tests.QueryBudgetTests
+checks for every named URL at two data sizes. In production each request's
+queries are counted by a ``connection.execute_wrapper`` (one extra function
+call per query) and going over budget is logged, not raised.
+QUERY_BUDGET_CHECKS turns the counting off entirely.
+"""
+import logging
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class _QueryCounter:
+    __slots__ = ('count',)
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def query_budget(budget):
+    """Declare the most queries the view may run per request"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if not settings.QUERY_BUDGET_CHECKS:
+                return view_func(request, *args, **kwargs)
+            counter = _QueryCounter()
+            with connection.execute_wrapper(counter):
+                response = view_func(request, *args, **kwargs)
+            if counter.count > budget:
+                logger.warning(
+                    'Query budget exceeded: %s.%s ran %d queries (budget %d) for %s',
+                    view_func.__module__, view_func.__name__, counter.count, budget, request.path,
+                )
+            return response
+
+        _wrapped_view.query_budget = budget
+        return _wrapped_view
+    return decorator
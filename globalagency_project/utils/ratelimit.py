@@ -0,0 +1,192 @@
+"""
+Rate limiting on the shared cache
+
+Three algorithms are available per policy:
+
+* ``fixed``   - one counter per window, incremented atomically with cache.incr
+* ``sliding`` - fixed counters for the current and previous window, with the
+                previous one weighted by how much of it still overlaps
+* ``token_bucket`` - ``limit`` tokens refilled evenly over ``window`` seconds,
+                good for bursty endpoints such as payment status polling; if its
+                lock can't be taken the hit is counted by ``fixed`` instead
+
+Policies are matched against request paths with a segment trie compiled once
+at startup, so paths that match no policy cost a single dict lookup.
+
+Clients are identified by client_ip(), which only trusts X-Forwarded-For
+entries added by our own NUM_PROXIES reverse proxies.
+"""
+import math
+import time
+
+from django.conf import settings
+from globalagency_project.utils.shared_cache import namespace
+
+ratelimit_cache = namespace('ratelimit')
+
+WILDCARD = '*'
+
+
+class RatePolicy:
+    """A limit applied to every path under ``prefix`` for the given methods"""
+
+    ALGORITHMS = ('fixed', 'sliding', 'token_bucket')
+
+    def __init__(self, name, prefix, limit, window, methods=('POST',), algorithm='sliding'):
+        if algorithm not in self.ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm '{algorithm}'")
+        self.name = name
+        self.prefix = prefix
+        self.limit = int(limit)
+        self.window = int(window)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.algorithm = algorithm
+
+    def __repr__(self):
+        return f'<RatePolicy {self.name}: {self.limit}/{self.window}s {self.algorithm}>'
+
+
+class RateLimitResult:
+    def __init__(self, allowed, retry_after=0):
+        self.allowed = allowed
+        self.retry_after = retry_after
+
+    def __bool__(self):
+        return self.allowed
+
+
+def _split(path):
+    return [segment for segment in path.split('/') if segment]
+
+
+class RouteTrie:
+    """
+    Prefix trie over path segments. A ``*`` segment in a policy prefix
+    matches any single segment, e.g. ``/student-portal/payment/*/status/``.
+    """
+
+    def __init__(self, policies=()):
+        self.root = {}
+        for policy in policies:
+            self.add(policy)
+
+    def add(self, policy):
+        node = self.root
+        for segment in _split(policy.prefix):
+            node = node.setdefault(segment, {})
+        node.setdefault(None, []).append(policy)
+
+    def match(self, method, path):
+        """Return the most specific policy for method + path, or None"""
+        segments = _split(path)
+        # Fast path: nearly all requests fail on the first segment
+        if not segments or (segments[0] not in self.root and WILDCARD not in self.root):
+            return None
+
+        best = None
+        frontier = [(self.root, 0)]
+        while frontier:
+            node, depth = frontier.pop()
+            for policy in node.get(None, ()):
+                if method in policy.methods and (best is None or depth > best[0]):
+                    best = (depth, policy)
+            if depth < len(segments):
+                for key in (segments[depth], WILDCARD):
+                    child = node.get(key)
+                    if child is not None:
+                        frontier.append((child, depth + 1))
+        return best[1] if best else None
+
+
+def _incr(key, timeout):
+    """Atomically increment a counter, creating it for ``timeout`` seconds"""
+    ratelimit_cache.add(key, 0, timeout)
+    try:
+        return ratelimit_cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr()
+        ratelimit_cache.add(key, 1, timeout)
+        return 1
+
+
+def _fixed_window(policy, identity, now):
+    window_start = int(now // policy.window) * policy.window
+    count = _incr(f'{policy.name}:{identity}:{window_start}', policy.window)
+    if count > policy.limit:
+        return RateLimitResult(False, math.ceil(window_start + policy.window - now))
+    return RateLimitResult(True)
+
+
+def _sliding_window(policy, identity, now):
+    window_start = int(now // policy.window) * policy.window
+    previous_key = f'{policy.name}:{identity}:{window_start - policy.window}'
+    current = _incr(f'{policy.name}:{identity}:{window_start}', policy.window * 2)
+    previous = ratelimit_cache.get(previous_key, 0)
+
+    elapsed = now - window_start
+    weight = 1 - elapsed / policy.window
+    if previous * weight + current <= policy.limit:
+        return RateLimitResult(True)
+
+    if current > policy.limit or not previous:
+        retry_after = window_start + policy.window - now
+    else:
+        # Time until the previous window's share decays below the limit
+        retry_after = policy.window * (1 - (policy.limit - current) / previous) - elapsed
+    return RateLimitResult(False, max(1, math.ceil(retry_after)))
+
+
+def _token_bucket(policy, identity, now):
+    key = f'{policy.name}:{identity}:bucket'
+    lock_key = f'{key}:lock'
+    refill_rate = policy.limit / policy.window
+
+    # The bucket state is read-modify-write, so serialise it with a short lock
+    for _ in range(20):
+        if ratelimit_cache.add(lock_key, 1, 2):
+            break
+        time.sleep(0.005)
+    else:
+        # Cache contention must not turn into 429s: count this hit in a fixed window instead
+        return _fixed_window(policy, identity, now)
+
+    try:
+        tokens, updated = ratelimit_cache.get(key, (float(policy.limit), now))
+        tokens = min(float(policy.limit), tokens + (now - updated) * refill_rate)
+        if tokens >= 1:
+            ratelimit_cache.set(key, (tokens - 1, now), policy.window)
+            return RateLimitResult(True)
+        ratelimit_cache.set(key, (tokens, now), policy.window)
+        return RateLimitResult(False, max(1, math.ceil((1 - tokens) / refill_rate)))
+    finally:
+        ratelimit_cache.delete(lock_key)
+
+
+_ALGORITHMS = {
+    'fixed': _fixed_window,
+    'sliding': _sliding_window,
+    'token_bucket': _token_bucket,
+}
+
+
+def client_ip(request):
+    """
+    The address that connected to the first of our NUM_PROXIES proxies. Entries
+    further left in X-Forwarded-For are client-supplied and can't be trusted.
+    """
+    num_proxies = getattr(settings, 'NUM_PROXIES', 0)
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if num_proxies and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(',')]
+        return addresses[-min(num_proxies, len(addresses))]
+    return request.META.get('REMOTE_ADDR')
+
+
+def hit(policy, identity, now=None):
+    """Record one request for ``identity`` under ``policy`` and decide on it"""
+    return _ALGORITHMS[policy.algorithm](policy, identity, time.time() if now is None else now)
+
+
+def compile_policies(config):
+    """Build a RouteTrie from a list of policy dicts (settings.RATE_LIMIT_POLICIES)"""
+    return RouteTrie(RatePolicy(**options) for options in config)
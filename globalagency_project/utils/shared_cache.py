@@ -0,0 +1,143 @@
+"""
+Shared cache helpers
+
+All subsystems (rate limiting, query caching, template fragments...) go through
+a NamespacedCache so their keys never collide and their hit/miss rates can be
+reported separately. The backend itself is chosen in settings via the
+CACHE_BACKEND environment variable (locmem, file or redis).
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+_MISSING = object()
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+# Counters of the current request, see observe_cache()
+_observed = contextvars.ContextVar('observed_cache_counters', default=None)
+
+
+def _record(namespace, hits=0, misses=0):
+    with _stats_lock:
+        counters = _stats.setdefault(namespace, {'hits': 0, 'misses': 0})
+        counters['hits'] += hits
+        counters['misses'] += misses
+    observed = _observed.get()
+    if observed is not None:
+        observed['hits'] += hits
+        observed['misses'] += misses
+
+
+@contextmanager
+def observe_cache():
+    """Count the hits/misses of the code run inside the block (all namespaces)"""
+    counters = {'hits': 0, 'misses': 0}
+    token = _observed.set(counters)
+    try:
+        yield counters
+    finally:
+        _observed.reset(token)
+
+
+def cache_stats():
+    """Return a copy of the per-namespace hit/miss counters for this process"""
+    with _stats_lock:
+        return {name: dict(counters) for name, counters in _stats.items()}
+
+
+def reset_cache_stats():
+    """Clear the hit/miss counters (mainly for tests and benchmarks)"""
+    with _stats_lock:
+        _stats.clear()
+
+
+class NamespacedCache:
+    """Thin wrapper around a Django cache alias that prefixes every key"""
+
+    def __init__(self, namespace, alias='default'):
+        self.namespace = namespace
+        self.alias = alias
+
+    @property
+    def backend(self):
+        # Looked up on every call so override_settings(CACHES=...) is honoured
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return f'{self.namespace}:{key}'
+
+    def get(self, key, default=None):
+        value = self.backend.get(self.make_key(key), _MISSING)
+        if value is _MISSING:
+            _record(self.namespace, misses=1)
+        else:
+            _record(self.namespace, hits=1)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.backend.set(self.make_key(key), value, timeout)
+
+    def set_many(self, mapping, timeout=DEFAULT_TIMEOUT):
+        self.backend.set_many({self.make_key(key): value for key, value in mapping.items()}, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        return self.backend.add(self.make_key(key), value, timeout)
+
+    def delete(self, key):
+        return self.backend.delete(self.make_key(key))
+
+    def incr(self, key, delta=1):
+        return self.backend.incr(self.make_key(key), delta)
+
+    def get_many(self, keys):
+        prefixed = {self.make_key(key): key for key in keys}
+        found = self.backend.get_many(prefixed.keys())
+        _record(self.namespace, hits=len(found), misses=len(prefixed) - len(found))
+        return {prefixed[key]: value for key, value in found.items()}
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, lock_timeout=10, wait=2.0):
+        """
+        Return the cached value, computing it with ``default()`` on a miss.
+
+        Only one process recomputes a missing key at a time: the first caller
+        takes a short-lived lock with ``cache.add``, the others poll for the
+        value for up to ``wait`` seconds before giving up and computing it
+        themselves. The lock is exclusive on backends with an atomic ``add``
+        (locmem, redis); on the file backend it only narrows the window.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        lock_key = f'{key}:lock'
+        if self.add(lock_key, 1, lock_timeout):
+            try:
+                # Another process may have filled the key just before we locked
+                value = self.backend.get(self.make_key(key), _MISSING)
+                if value is _MISSING:
+                    value = default() if callable(default) else default
+                    self.set(key, value, timeout)
+            finally:
+                self.delete(lock_key)
+            return value
+
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = self.backend.get(self.make_key(key), _MISSING)
+            if value is not _MISSING:
+                return value
+
+        value = default() if callable(default) else default
+        self.set(key, value, timeout)
+        return value
+
+
+def namespace(name, alias='default'):
+    """Return a NamespacedCache for the given subsystem"""
+    return NamespacedCache(name, alias)
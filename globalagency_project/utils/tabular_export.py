@@ -0,0 +1,174 @@
+"""
+CSV and XLSX files generated while they are being downloaded
+
+Rows come from keyset_rows(), which reads the queryset one page at a time
+ordered by primary key (MySQL client libraries buffer a whole result set,
+so ``.iterator()`` alone would still hold every row in memory). The header
+goes out before the first query runs, and memory stays at one page of rows
+however large the export is.
+
+The XLSX writer streams the worksheet XML into a ZIP (see zip_stream) with
+inline strings, so unlike a shared-strings workbook it never has to keep
+every distinct value until the end.
+"""
+import csv
+import datetime
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .zip_stream import stream_members
+
+PAGE_SIZE = 2000
+# Rows are written out in batches of about this many bytes
+FLUSH_SIZE = 64 * 1024
+
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Spreadsheet apps run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Characters XML 1.0 does not allow, even escaped
+ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def keyset_rows(queryset, fields, page_size=PAGE_SIZE):
+    """
+    Yield ``values_list(*fields)`` tuples for ``queryset`` newest first,
+    one query per ``page_size`` rows. The first field must be the primary key.
+    """
+    queryset = queryset.order_by('-pk').values_list(*fields)
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__lt=last)
+        rows = list(page[:page_size])
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1][0]
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M')
+    return str(value)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    text = _cell_text(value)
+    if isinstance(value, str) and text.startswith(FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+
+def stream_csv(header, rows):
+    """Yield a UTF-8 CSV (with BOM, for Excel) of ``header`` and ``rows``"""
+    writer = csv.writer(_Echo())
+    yield ('\ufeff' + writer.writerow(header)).encode()
+    buffer, size = [], 0
+    for row in rows:
+        line = writer.writerow([_csv_value(value) for value in row])
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def _xlsx_cell(value):
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    text = escape(ILLEGAL_XML_CHARS.sub('', _cell_text(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def _worksheet(header, rows):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" state="frozen"/></sheetView></sheetViews>'
+        '<sheetData>' + _xlsx_row(header)
+    ).encode()
+    buffer, size = [], 0
+    for row in rows:
+        xml = _xlsx_row(row)
+        buffer.append(xml)
+        size += len(xml)
+        if size >= FLUSH_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    yield (''.join(buffer) + '</sheetData></worksheet>').encode()
+
+
+def _xlsx_parts(sheet_name):
+    sheet_name = escape(ILLEGAL_XML_CHARS.sub('', sheet_name)[:31], {'"': '&quot;'})
+    return {
+        '[Content_Types].xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'
+        ),
+        '_rels/.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="xl/workbook.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'
+        ),
+        'xl/workbook.xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+            '</Relationships>'
+        ),
+    }
+
+
+def stream_xlsx(header, rows, sheet_name='Sheet1'):
+    """Yield a single-sheet XLSX workbook of ``header`` and ``rows``"""
+    now = datetime.datetime.now().timetuple()[:6]
+
+    def members():
+        for name, xml in _xlsx_parts(sheet_name).items():
+            info = zipfile.ZipInfo(name, now)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            yield info, [xml.encode()]
+        info = zipfile.ZipInfo('xl/worksheets/sheet1.xml', now)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        yield info, _worksheet(header, rows)
+
+    return stream_members(members())
@@ -0,0 +1,153 @@
+"""
+Streaming upload handler that validates files while they arrive
+
+Django's default handlers buffer every file of a request under
+FILE_UPLOAD_MAX_MEMORY_SIZE in RAM, and the form only sees the size and type
+once the whole body has been received. StreamingUploadHandler instead:
+
+- checks the extension as soon as the part headers are parsed,
+- checks the first chunk against the magic bytes of that file type,
+- stops storing a file the moment it grows past FILE_UPLOAD_MAX_SIZE,
+- keeps at most FILE_UPLOAD_MAX_MEMORY_SIZE per file in memory before
+  spilling to a temporary file, and
+- hashes the bytes on the way through, so ContentAddressedStorage does not
+  have to read the file again (``uploaded_file.sha256``).
+
+A rejected file is dropped (SkipFile) and the reason is kept in
+``request.upload_errors`` for the form to show; see upload_errors().
+"""
+import hashlib
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.utils.translation import gettext as _
+
+logger = logging.getLogger('django.security')
+
+IMAGE_SIGNATURES = (
+    b'\xff\xd8\xff',            # JPEG
+    b'\x89PNG\r\n\x1a\n',       # PNG
+    b'GIF87a',
+    b'GIF89a',
+    b'BM',                      # BMP
+)
+
+# Images are accepted with any image signature, as photos renamed from .png
+# to .jpg are common and Pillow reads them by content anyway
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')
+
+# Leading bytes each other allowed extension must start with
+SIGNATURES = {
+    '.pdf': (b'%PDF-',),
+    '.doc': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),  # OLE2 compound file
+    '.docx': (b'PK\x03\x04',),                      # ZIP container
+}
+
+# PDF readers accept up to 1KB of junk before the header
+PDF_HEADER_WINDOW = 1024
+# check_signature never looks further into the file than this
+SIGNATURE_WINDOW = PDF_HEADER_WINDOW
+
+
+def _is_image(head):
+    # WebP is a RIFF container: 'RIFF', the 4-byte size, then 'WEBP'
+    return head.startswith(IMAGE_SIGNATURES) or (head[:4] == b'RIFF' and head[8:12] == b'WEBP')
+
+
+def check_signature(extension, head):
+    """Return an error message if ``head`` does not look like an ``extension`` file"""
+    if extension in ('.txt', '.csv'):
+        return _('File content does not match its type') if b'\x00' in head else None
+    if extension == '.pdf':
+        return None if b'%PDF-' in head[:PDF_HEADER_WINDOW] else _('File content does not match its type')
+    if extension in IMAGE_EXTENSIONS:
+        return None if _is_image(head) else _('File content does not match its type')
+    signatures = SIGNATURES.get(extension)
+    if signatures is None or not head.startswith(signatures):
+        return _('File content does not match its type')
+    return None
+
+
+def upload_errors(request):
+    """{field name: message} for files StreamingUploadHandler rejected"""
+    return getattr(request, 'upload_errors', {})
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """Validate, hash and spool each uploaded file chunk by chunk"""
+
+    def __init__(self, request=None, allowed_extensions=None):
+        super().__init__(request)
+        self.max_size = settings.FILE_UPLOAD_MAX_SIZE
+        self.memory_size = settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        self.allowed_extensions = allowed_extensions or settings.ALLOWED_UPLOAD_EXTENSIONS
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.file = BytesIO()
+        self.hasher = hashlib.sha256()
+        self.received = 0
+        self.extension = os.path.splitext(file_name)[1].lower()
+        if self.extension not in self.allowed_extensions:
+            self.reject(_('File type not allowed'))
+        if self.content_length and self.content_length > self.max_size:
+            self.reject(self.size_message())
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            message = check_signature(self.extension, raw_data)
+            if message:
+                self.reject(message)
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.reject(self.size_message())
+        self.hasher.update(raw_data)
+        if isinstance(self.file, BytesIO) and self.received > self.memory_size:
+            self.spill()
+        self.file.write(raw_data)
+        # This handler stores the data itself; nothing for later handlers
+        return None
+
+    def spill(self):
+        buffered = self.file.getvalue()
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+        self.file.write(buffered)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        if isinstance(self.file, BytesIO):
+            uploaded = InMemoryUploadedFile(
+                file=self.file,
+                field_name=self.field_name,
+                name=self.file_name,
+                content_type=self.content_type,
+                size=file_size,
+                charset=self.charset,
+                content_type_extra=self.content_type_extra,
+            )
+        else:
+            uploaded = self.file
+            uploaded.size = file_size
+        uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+    def size_message(self):
+        return _('File size must be less than %(size)dMB') % {'size': self.max_size // (1024 * 1024)}
+
+    def reject(self, message):
+        logger.warning('Rejected upload %r for field %s: %s', self.file_name, self.field_name, message)
+        if self.request is not None:
+            self.request.__dict__.setdefault('upload_errors', {})[self.field_name] = message
+        # The parser closes self.file (removing any temp file) and discards
+        # the rest of this part without storing it
+        raise SkipFile()
@@ -0,0 +1,59 @@
+"""
+Access-controlled downloads of student documents
+
+Documents are never linked by their MEDIA_URL; the permission check runs
+here and the bytes are sent by the front proxy (see
+globalagency_project/utils/protected_media.py).
+"""
+import os
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Exists, Q
+from django.http import Http404
+from django.views.decorators.http import require_safe
+
+from employee.models import UserProfile
+from globalagency_project.utils.protected_media import serve_protected_file
+from globalagency_project.utils.query_budget import query_budget
+from .models import Document
+from .thumbnails import get_thumbnail, thumbnail_sizes
+
+
+def _readable_document(user, document_id):
+    """(file, content_hash, original_filename) if ``user`` may read it - one query"""
+    documents = Document.objects.filter(pk=document_id)
+    if not user.is_superuser:
+        staff = UserProfile.objects.filter(user=user, role__in=['employee', 'admin'], registration_method='admin')
+        documents = documents.filter(Q(student=user) | Q(Exists(staff)))
+    return documents.values_list('file', 'content_hash', 'original_filename').first()
+
+
+@query_budget(4)
+@login_required
+@require_safe
+def download_document(request, document_id):
+    """
+    The document (or with ?size=small|medium|pdf, its thumbnail) for its
+    owner and for staff. Others get a 404 so ids cannot be probed.
+    """
+    row = _readable_document(request.user, document_id)
+    if row is None:
+        raise Http404('Document not found')
+    name, content_hash, original_filename = row
+    filename = original_filename or os.path.basename(name)
+
+    size = request.GET.get('size')
+    if size:
+        if size not in thumbnail_sizes():
+            raise Http404('Unknown thumbnail size')
+        name = get_thumbnail(Document(file=name).file, size)
+        if name is None:
+            raise Http404('No thumbnail for this document')
+        filename = f'{os.path.splitext(filename)[0]}.{size}.jpg'
+
+    etag = None
+    if content_hash:
+        etag = f'"{content_hash}-{size}"' if size else f'"{content_hash}"'
+    return serve_protected_file(
+        request, name, filename, etag=etag, as_attachment=request.GET.get('download') == '1',
+    )
@@ -1,7 +1,25 @@
 from django import forms
 from .models import StudentProfile, Application, Document
 
-class StudentProfileForm(forms.ModelForm):
+
+class UploadErrorsMixin:
+    """Show files rejected by the streaming upload handler as field errors"""
+
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field, message in self.upload_errors.items():
+            if field in self.fields:
+                # Replaces "This field is required." for the dropped file
+                self._errors.pop(field, None)
+                self.add_error(field, message)
+        return cleaned_data
+
+
+class StudentProfileForm(UploadErrorsMixin, forms.ModelForm):
     class Meta:
         model = StudentProfile
         fields = ['phone_number', 'address', 'date_of_birth', 'nationality', 'emergency_contact', 'profile_picture']
@@ -11,7 +29,7 @@ class StudentProfileForm(forms.ModelForm):
         }
 
 # Profile Section Forms
-class PersonalDetailsForm(forms.ModelForm):
+class PersonalDetailsForm(UploadErrorsMixin, forms.ModelForm):
     class Meta:
         model = StudentProfile
         fields = [
@@ -172,7 +190,7 @@ class ApplicationForm(forms.ModelForm):
             'country': forms.TextInput(attrs={'placeholder': 'Enter country'}),
         }
 
-class DocumentForm(forms.ModelForm):
+class DocumentForm(UploadErrorsMixin, forms.ModelForm):
     class Meta:
         model = Document
         fields = ['document_type', 'file', 'description']
\ No newline at end of file
@@ -0,0 +1,295 @@
+"""
+Bulk student import from CSV
+
+Partner schools send intakes of thousands of students. Creating them one by
+one through register or create_student_account costs several queries and a
+full password hash per student, so the importer works in batches instead:
+
+* rows are read one at a time from the CSV stream, never all at once;
+* each batch of BATCH_SIZE rows is validated together, with a single query
+  for e-mail addresses that already have an account;
+* passwords are hashed in a process pool (PBKDF2 is CPU bound, so threads
+  would not help);
+* User, UserProfile and StudentProfile rows are inserted with bulk_create,
+  one transaction per batch, so a failure loses at most one batch.
+
+Every row ends up in the report: created, valid (dry run) or an error with
+the reason. Rows without a password get a generated one, which is only in
+the report.
+
+Required column: email. Optional: full_name or first_name/last_name,
+password, and any of IMPORT_FIELDS.
+"""
+import csv
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from employee.models import UserProfile
+from .models import StudentProfile
+
+BATCH_SIZE = 500
+
+# StudentProfile columns a CSV may fill in
+IMPORT_FIELDS = [
+    'phone_number', 'address', 'date_of_birth', 'nationality', 'gender',
+    'father_name', 'father_phone', 'father_email', 'father_occupation',
+    'mother_name', 'mother_phone', 'mother_email', 'mother_occupation',
+    'olevel_school', 'olevel_country', 'olevel_address', 'olevel_region', 'olevel_year',
+    'olevel_candidate_no', 'olevel_gpa',
+    'alevel_school', 'alevel_country', 'alevel_address', 'alevel_region', 'alevel_year',
+    'alevel_candidate_no', 'alevel_gpa',
+    'preferred_country_1', 'preferred_country_2', 'preferred_country_3', 'preferred_country_4',
+    'preferred_program_1', 'preferred_program_2', 'preferred_program_3', 'preferred_program_4',
+    'emergency_contact', 'emergency_address', 'emergency_occupation', 'emergency_gender', 'emergency_relation',
+]
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+REPORT_COLUMNS = ['line', 'email', 'status', 'message', 'password']
+
+
+class ImportFileError(Exception):
+    """The file as a whole cannot be imported (wrong columns, not a CSV)"""
+
+
+@dataclass
+class RowResult:
+    line: int
+    email: str
+    status: str  # 'created', 'valid' or 'error'
+    message: str = ''
+    password: str = ''
+
+
+@dataclass
+class ImportReport:
+    dry_run: bool
+    rows: list = field(default_factory=list)
+
+    def count(self, status):
+        return sum(1 for row in self.rows if row.status == status)
+
+    @property
+    def created(self):
+        return self.count('created')
+
+    @property
+    def valid(self):
+        return self.count('valid')
+
+    @property
+    def errors(self):
+        return [row for row in self.rows if row.status == 'error']
+
+    def write_csv(self, stream):
+        writer = csv.writer(stream)
+        writer.writerow(REPORT_COLUMNS)
+        for row in self.rows:
+            writer.writerow([row.line, row.email, row.status, row.message, row.password])
+
+
+@dataclass
+class _Candidate:
+    line: int
+    email: str
+    first_name: str
+    last_name: str
+    password: str
+    generated_password: bool
+    profile: dict
+
+
+def read_rows(stream):
+    """Yield (line number, row) from a text CSV stream with normalised headers"""
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None:
+        raise ImportFileError('The file is empty.')
+    headers = [(name or '').strip().lower() for name in reader.fieldnames]
+    if 'email' not in headers:
+        raise ImportFileError('The file has no "email" column.')
+    reader.fieldnames = headers
+    try:
+        for row in reader:
+            yield reader.line_num, {key: (value or '').strip() for key, value in row.items() if key}
+    except csv.Error as e:
+        raise ImportFileError(f'Line {reader.line_num}: {e}')
+
+
+def count_rows(stream):
+    """Number of data rows in a text CSV stream; quoted newlines stay in their row"""
+    try:
+        return sum(1 for row in csv.reader(stream) if row) - 1
+    except csv.Error as e:
+        raise ImportFileError(str(e))
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    raise ValidationError(f'Invalid date_of_birth "{value}" (use YYYY-MM-DD).')
+
+
+def _clean(line, row):
+    """A _Candidate for the row, or raise ValidationError"""
+    email = row.get('email', '').lower()
+    if not email:
+        raise ValidationError('Email is required.')
+    validate_email(email)
+    if len(email) > User._meta.get_field('username').max_length:
+        raise ValidationError('Email is too long.')
+
+    first_name, last_name = row.get('first_name', ''), row.get('last_name', '')
+    if not (first_name or last_name) and row.get('full_name'):
+        first_name, _, last_name = row['full_name'].partition(' ')
+        last_name = last_name.strip()
+
+    profile = {}
+    for name in IMPORT_FIELDS:
+        value = row.get(name, '')
+        if not value:
+            continue
+        model_field = StudentProfile._meta.get_field(name)
+        if name == 'date_of_birth':
+            value = _parse_date(value)
+        elif model_field.choices and value.lower() not in dict(model_field.choices):
+            raise ValidationError(f'Invalid {name} "{value}".')
+        elif model_field.choices:
+            value = value.lower()
+        elif model_field.max_length and len(value) > model_field.max_length:
+            raise ValidationError(f'{name} is longer than {model_field.max_length} characters.')
+        profile[name] = value
+
+    password = row.get('password', '')
+    if password:
+        validate_password(password, User(username=email, email=email, first_name=first_name, last_name=last_name))
+    return _Candidate(
+        line=line,
+        email=email,
+        first_name=first_name[:150],
+        last_name=last_name[:150],
+        password=password or secrets.token_urlsafe(9),
+        generated_password=not password,
+        profile=profile,
+    )
+
+
+def _validate(batch, seen, report):
+    """Clean a batch of rows; rows that fail go to the report"""
+    candidates = []
+    for line, row in batch:
+        try:
+            candidate = _clean(line, row)
+        except ValidationError as e:
+            report.rows.append(RowResult(line, row.get('email', ''), 'error', ' '.join(e.messages)))
+            continue
+        if candidate.email in seen:
+            report.rows.append(RowResult(line, candidate.email, 'error', f'Duplicate of line {seen[candidate.email]}.'))
+            continue
+        seen[candidate.email] = line
+        candidates.append(candidate)
+    return candidates
+
+
+def _without_existing(candidates, report):
+    emails = [candidate.email for candidate in candidates]
+    existing = set(User.objects.filter(username__in=emails).values_list('username', flat=True))
+    existing |= {email.lower() for email in User.objects.filter(email__in=emails).values_list('email', flat=True)}
+    kept = []
+    for candidate in candidates:
+        if candidate.email in existing:
+            report.rows.append(RowResult(candidate.line, candidate.email, 'error', 'An account with this email already exists.'))
+        else:
+            kept.append(candidate)
+    return kept
+
+
+def _insert(candidates, hashes):
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(username=c.email, email=c.email, password=hashed, first_name=c.first_name, last_name=c.last_name)
+            for c, hashed in zip(candidates, hashes)
+        ])
+        # MySQL's bulk_create does not return primary keys, so read them back
+        users = dict(User.objects.filter(username__in=[c.email for c in candidates]).values_list('username', 'id'))
+        UserProfile.objects.bulk_create([
+            UserProfile(user_id=users[c.email], role='student', registration_method='self') for c in candidates
+        ])
+        profiles = []
+        for c in candidates:
+            profile = StudentProfile(user_id=users[c.email], **c.profile)
+            profile.update_completion()
+            profiles.append(profile)
+        StudentProfile.objects.bulk_create(profiles)
+
+
+def _hash_all(passwords, pool):
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 32)))
+
+
+def _init_worker():
+    # Spawned (not forked) workers start without Django configured
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def import_students(stream, dry_run=False, workers=None, batch_size=BATCH_SIZE):
+    """Import students from a text CSV stream; returns an ImportReport
+
+    ``workers`` is the size of the hashing process pool (default: one per
+    CPU); 0 hashes in this process.
+    """
+    report = ImportReport(dry_run=dry_run)
+    seen = {}
+    pool = None if dry_run or workers == 0 else ProcessPoolExecutor(workers, initializer=_init_worker)
+    try:
+        for batch in _batches(read_rows(stream), batch_size):
+            candidates = _without_existing(_validate(batch, seen, report), report)
+            if not candidates:
+                continue
+            if dry_run:
+                report.rows.extend(RowResult(c.line, c.email, 'valid') for c in candidates)
+                continue
+
+            hashes = _hash_all([c.password for c in candidates], pool)
+            try:
+                _insert(candidates, hashes)
+            except IntegrityError:
+                # Someone registered one of these addresses since the check
+                kept = {id(c) for c in _without_existing(candidates, report)}
+                hashes = [hashed for c, hashed in zip(candidates, hashes) if id(c) in kept]
+                candidates = [c for c in candidates if id(c) in kept]
+                _insert(candidates, hashes)
+            report.rows.extend(
+                RowResult(c.line, c.email, 'created', password=c.password if c.generated_password else '')
+                for c in candidates
+            )
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    report.rows.sort(key=lambda row: row.line)
+    return report
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from student_portal.models import StudentProfile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored completion flags and percentage of every student profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Profiles read and updated per query')
+        parser.add_argument('--dry-run', action='store_true', help='Count the profiles that would change')
+
+    def handle(self, *args, **options):
+        fields = ['id', 'completion_flags', 'completion_percentage', *StudentProfile.COMPLETION_FIELDS]
+        profiles = StudentProfile.objects.order_by('pk').only(*fields)
+        checked = changed = 0
+        last = 0
+        while True:
+            # Keyset pages: MySQL would buffer the whole table for .iterator()
+            batch = list(profiles.filter(pk__gt=last)[:options['batch_size']])
+            if not batch:
+                break
+            last = batch[-1].pk
+            stale = [profile for profile in batch if profile.update_completion()]
+            if stale and not options['dry_run']:
+                with transaction.atomic():
+                    StudentProfile.objects.bulk_update(stale, ['completion_flags', 'completion_percentage'])
+            checked += len(batch)
+            changed += len(stale)
+
+        verb = 'would change' if options['dry_run'] else 'updated'
+        self.stdout.write(f'Checked {checked} profile(s), {changed} {verb}')
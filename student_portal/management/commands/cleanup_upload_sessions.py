@@ -0,0 +1,43 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from student_portal.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Delete resumable uploads that have not received data for a while, with their partial files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=settings.UPLOAD_SESSION_EXPIRY_HOURS,
+                            help='Expire uploads idle for longer than this')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        expired = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+        # Rows go first, so a chunk arriving meanwhile gets a 404 instead of
+        # writing into a file that is about to disappear
+        UploadSession.objects.filter(pk__in=[session.pk for session in expired]).delete()
+        for session in expired:
+            try:
+                os.remove(session.partial_path)
+            except FileNotFoundError:
+                pass
+        removed = len(expired)
+
+        # Partial files whose session is gone (e.g. the student was deleted)
+        orphans = 0
+        root = str(settings.UPLOAD_SESSION_ROOT)
+        if os.path.isdir(root):
+            live = {f'{pk}.part' for pk in UploadSession.objects.values_list('pk', flat=True)}
+            oldest = time.time() - options['hours'] * 3600
+            for entry in os.scandir(root):
+                if entry.name not in live and entry.stat().st_mtime < oldest:
+                    os.remove(entry.path)
+                    orphans += 1
+
+        self.stdout.write(f'Removed {removed} expired upload(s) and {orphans} orphaned partial file(s)')
@@ -0,0 +1,85 @@
+import os
+import time
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from student_portal.models import Document
+from student_portal.storage import content_hash_from_name, document_storage
+from student_portal.thumbnails import delete_thumbnails
+
+PREFIX = 'documents'
+
+
+class Command(BaseCommand):
+    help = 'Delete document blobs no Document row references (and optionally move legacy uploads into the content store)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Keep unreferenced blobs younger than this (uploads still in flight)')
+        parser.add_argument('--migrate-legacy', action='store_true',
+                            help='Re-store documents uploaded before content addressing, deduplicating them')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if options['migrate_legacy']:
+            self.migrate_legacy(dry_run)
+
+        cutoff = time.time() - options['grace_hours'] * 3600
+        referenced = set(Document.objects.values_list('file', flat=True).iterator())
+        deleted = freed = 0
+        for name in document_storage.iter_blobs(PREFIX):
+            if name in referenced:
+                continue
+            path = document_storage.path(name)
+            stat = os.stat(path)
+            if stat.st_mtime > cutoff:
+                continue
+            # An upload may have reused the blob since the snapshot above
+            if Document.objects.filter(file=name).exists():
+                continue
+            deleted += 1
+            freed += stat.st_size
+            if not dry_run:
+                document_storage.delete(name)
+                delete_thumbnails(document_storage, name)
+
+        # Temp files left behind by interrupted uploads
+        for dirpath, _, filenames in os.walk(document_storage.path(PREFIX)):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.startswith('.upload-') and os.stat(path).st_mtime <= cutoff and not dry_run:
+                    os.remove(path)
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(f'{verb} {deleted} unreferenced blob(s), {freed / 1024 / 1024:.1f} MB')
+
+    def migrate_legacy(self, dry_run):
+        legacy = Document.objects.filter(content_hash='').exclude(file='')
+        moved = 0
+        old_names = set()
+        for document in legacy.iterator():
+            old_name = document.file.name
+            if not document_storage.exists(old_name):
+                self.stderr.write(f'Missing file for document {document.id}: {old_name}')
+                continue
+            moved += 1
+            if dry_run:
+                continue
+            with document_storage.open(old_name) as f:
+                new_name = document_storage.save(f'{PREFIX}/{os.path.basename(old_name)}', File(f))
+            Document.objects.filter(pk=document.pk).update(
+                file=new_name,
+                content_hash=content_hash_from_name(new_name),
+                original_filename=document.original_filename or os.path.basename(old_name),
+            )
+            old_names.add(old_name)
+
+        # Legacy files are removed once no row points at them any more
+        still_used = set(Document.objects.filter(file__in=old_names).values_list('file', flat=True))
+        for name in old_names - still_used:
+            document_storage.delete(name)
+            delete_thumbnails(document_storage, name)
+        verb = 'Would move' if dry_run else 'Moved'
+        self.stdout.write(f'{verb} {moved} legacy document(s) into the content store')
@@ -0,0 +1,51 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from student_portal.importer import BATCH_SIZE, ImportFileError, import_students
+
+
+class Command(BaseCommand):
+    help = 'Create student accounts in bulk from a CSV file (see student_portal.importer for the columns)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='CSV file to import, or - for standard input')
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row without creating anything')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Password hashing processes (default: one per CPU, 0 for none)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--report', help='Write the per-row report (including generated passwords) to this CSV')
+
+    def handle(self, *args, **options):
+        try:
+            if options['csv_file'] == '-':
+                report = self.run(sys.stdin, options)
+            else:
+                with open(options['csv_file'], newline='', encoding='utf-8-sig') as f:
+                    report = self.run(f, options)
+        except (OSError, UnicodeDecodeError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for row in report.errors:
+            self.stderr.write(f'Line {row.line} ({row.email or "no email"}): {row.message}')
+        if options['report']:
+            with open(options['report'], 'w', newline='') as f:
+                report.write_csv(f)
+        else:
+            # Generated passwords exist nowhere else
+            for row in report.rows:
+                if row.password:
+                    self.stdout.write(f'{row.email}\t{row.password}')
+
+        if report.dry_run:
+            self.stdout.write(f'{report.valid} row(s) valid, {len(report.errors)} error(s); nothing was created')
+        else:
+            self.stdout.write(f'Created {report.created} student(s), {len(report.errors)} error(s)')
+
+    def run(self, stream, options):
+        return import_students(
+            stream,
+            dry_run=options['dry_run'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+        )
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from student_portal.notifications import process_all
+
+
+class Command(BaseCommand):
+    help = 'Notify students of application changes (run from cron, or with --loop as a worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=float, default=None,
+                            help='Seconds an application must be unchanged before notifying '
+                                 '(default NOTIFICATION_COALESCE_SECONDS)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for events until interrupted')
+        parser.add_argument('--interval', type=float, default=10, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            events, notifications = process_all(window=options['window'])
+            if events or not options['loop']:
+                self.stdout.write(f'Processed {events} event(s) into {notifications} notification(s)')
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,35 @@
+"""
+request.student_profile: the logged-in student's profile, loaded on first use
+
+Profiles are created when the account is (registration, bulk import) and
+checked at login, so views no longer get_or_create one on every request.
+The profile is only queried when a view or template touches it, at most
+once per request: it is read through ``user.studentprofile``, so templates
+using ``user.studentprofile`` share the same cached instance.
+"""
+from django.utils.functional import SimpleLazyObject
+
+from .models import StudentProfile
+
+
+def get_student_profile(user):
+    """The user's StudentProfile, created for accounts that have none (e.g. made in the admin)"""
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.studentprofile
+    except StudentProfile.DoesNotExist:
+        profile, created = StudentProfile.objects.get_or_create(user=user)
+        user.studentprofile = profile
+        return profile
+
+
+class StudentProfileMiddleware:
+    """Set request.student_profile; must come after AuthenticationMiddleware"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.student_profile = SimpleLazyObject(lambda: get_student_profile(request.user))
+        return self.get_response(request)
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-19 13:46
+
+from django.db import migrations, models
+import student_portal.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_portal', '0011_alter_document_document_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='original_filename',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=student_portal.storage.get_document_storage, upload_to='documents/'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-19 13:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('student_portal', '0012_document_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('document_type', models.CharField(choices=[('passport', 'Passport'), ('ordinary_level', 'Ordinary Level Certificate'), ('advanced_level', 'Advanced Level Certificate'), ('academic_transcript', 'Academic Transcript'), ('degree_certificate', 'Degree Certificate'), ('recommendation_letter', 'Recommendation Letter'), ('sop', 'Statement of Purpose'), ('cv', 'CV'), ('language_test', 'Language Test Results'), ('financial_documents', 'Financial Documents')], max_length=50)),
+                ('description', models.TextField(blank=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('offset', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-19 14:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_portal', '0013_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('status', 'Application status'), ('payment', 'Payment verification')], max_length=10)),
+                ('old_value', models.CharField(blank=True, max_length=30)),
+                ('new_value', models.CharField(max_length=30)),
+                ('note', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='student_portal.application')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='applicationevent',
+            index=models.Index(fields=['processed_at', 'created_at'], name='student_por_process_53efd3_idx'),
+        ),
+    ]
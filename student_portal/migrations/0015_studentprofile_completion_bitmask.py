@@ -0,0 +1,72 @@
+# Generated by Django 4.2 on 2026-10-19 14:29
+
+from django.db import migrations, models
+
+# Bit of each section in completion_flags, see StudentProfile.COMPLETION_SECTIONS
+SECTION_BITS = [
+    ('personal_details_complete', 1),
+    ('parents_details_complete', 2),
+    ('academic_qualifications_complete', 4),
+    ('study_preferences_complete', 8),
+    ('emergency_contact_complete', 16),
+]
+
+
+def flags_from_booleans(apps, schema_editor):
+    """Carry the section booleans over; manage.py backfill_profile_completion re-checks them"""
+    StudentProfile = apps.get_model('student_portal', 'StudentProfile')
+    for completed in range(1, 2 ** len(SECTION_BITS)):
+        sections = {name: bool(completed & bit) for name, bit in SECTION_BITS}
+        StudentProfile.objects.filter(**sections).update(
+            completion_flags=completed,
+            completion_percentage=100 * bin(completed).count('1') // len(SECTION_BITS),
+        )
+
+
+def booleans_from_flags(apps, schema_editor):
+    StudentProfile = apps.get_model('student_portal', 'StudentProfile')
+    for completed in range(1, 2 ** len(SECTION_BITS)):
+        StudentProfile.objects.filter(completion_flags=completed).update(
+            **{name: True for name, bit in SECTION_BITS if completed & bit}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_portal', '0014_applicationevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentprofile',
+            name='completion_flags',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentprofile',
+            name='completion_percentage',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(flags_from_booleans, booleans_from_flags),
+        migrations.RemoveField(
+            model_name='studentprofile',
+            name='academic_qualifications_complete',
+        ),
+        migrations.RemoveField(
+            model_name='studentprofile',
+            name='emergency_contact_complete',
+        ),
+        migrations.RemoveField(
+            model_name='studentprofile',
+            name='parents_details_complete',
+        ),
+        migrations.RemoveField(
+            model_name='studentprofile',
+            name='personal_details_complete',
+        ),
+        migrations.RemoveField(
+            model_name='studentprofile',
+            name='study_preferences_complete',
+        ),
+    ]
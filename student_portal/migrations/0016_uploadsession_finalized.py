@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-19 15:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_portal', '0015_studentprofile_completion_bitmask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='student_portal.document'),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='finalized',
+            field=models.BooleanField(default=False),
+        ),
+    ]
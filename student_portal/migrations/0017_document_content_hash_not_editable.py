@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_portal', '0016_uploadsession_finalized'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+    ]
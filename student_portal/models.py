@@ -1,8 +1,24 @@
+import os
+import uuid
+from django.conf import settings
 from django.db import models
+from django.urls import reverse
 from django.contrib.auth.models import User
 from django.utils import timezone
+from .storage import content_hash_from_name, get_document_storage
+
+
+def _section_flag(bit):
+    return property(lambda profile: bool(profile.completion_flags & bit))
+
 
 class StudentProfile(models.Model):
+    """
+    A student's profile, filled in section by section. Which sections are
+    complete is stored as a bitmask (one COMPLETION_SECTIONS bit each) with the
+    matching percentage next to it, so staff can filter on completion in SQL;
+    save() keeps both up to date, see update_completion().
+    """
     GENDER_CHOICES = [
         ('male', 'Male'),
         ('female', 'Female'),
@@ -67,64 +83,70 @@ class StudentProfile(models.Model):
     heard_about_other = models.CharField(max_length=255, blank=True)
     
     # Profile Completion Tracking
-    personal_details_complete = models.BooleanField(default=False)
-    parents_details_complete = models.BooleanField(default=False)
-    academic_qualifications_complete = models.BooleanField(default=False)
-    study_preferences_complete = models.BooleanField(default=False)
-    emergency_contact_complete = models.BooleanField(default=False)
+    completion_flags = models.PositiveSmallIntegerField(default=0)
+    completion_percentage = models.PositiveSmallIntegerField(default=0, db_index=True)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # (section, bit, fields the section needs, whether it needs all of them or any)
+    COMPLETION_SECTIONS = [
+        ('personal_details', 1, ('phone_number', 'address', 'date_of_birth', 'nationality', 'gender'), all),
+        # At least one parent
+        ('parents_details', 2, ('father_name', 'mother_name'), any),
+        # At least O-Level
+        ('academic_qualifications', 4, ('olevel_school', 'olevel_year', 'olevel_gpa'), all),
+        # At least one preference
+        ('study_preferences', 8, ('preferred_country_1', 'preferred_program_1'), all),
+        ('emergency_contact', 16, ('emergency_contact', 'emergency_address', 'emergency_relation'), all),
+    ]
+    # Sections needed before the student can apply
+    REQUIRED_SECTIONS = 1 | 4 | 16
+    COMPLETION_FIELDS = {field for _, _, fields, _ in COMPLETION_SECTIONS for field in fields}
+
+    personal_details_complete = _section_flag(1)
+    parents_details_complete = _section_flag(2)
+    academic_qualifications_complete = _section_flag(4)
+    study_preferences_complete = _section_flag(8)
+    emergency_contact_complete = _section_flag(16)
+
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name}"
     
     def is_complete(self):
         """Check if all required profile sections are complete"""
-        return all([
-            self.personal_details_complete,
-            self.academic_qualifications_complete,
-            self.emergency_contact_complete
-        ])
+        return self.completion_flags & self.REQUIRED_SECTIONS == self.REQUIRED_SECTIONS
     
     def get_completion_percentage(self):
-        """Calculate profile completion percentage"""
-        sections = [
-            self.personal_details_complete,
-            self.parents_details_complete,
-            self.academic_qualifications_complete,
-            self.study_preferences_complete,
-            self.emergency_contact_complete,
-        ]
-        completed = sum(1 for section in sections if section)
-        return int((completed / len(sections)) * 100)
+        """Profile completion percentage"""
+        return self.completion_percentage
     
     def save(self, *args, **kwargs):
-        # Auto-check completion status for each section
-        
-        # Personal details: phone, address, date_of_birth, nationality, gender
-        if all([self.phone_number, self.address, self.date_of_birth, self.nationality, self.gender]):
-            self.personal_details_complete = True
-        
-        # Parents details: at least one parent's info
-        if self.father_name or self.mother_name:
-            self.parents_details_complete = True
-        
-        # Academic qualifications: at least O-Level completed
-        if all([self.olevel_school, self.olevel_year, self.olevel_gpa]):
-            self.academic_qualifications_complete = True
-        
-        # Study preferences: at least one preference
-        if self.preferred_country_1 and self.preferred_program_1:
-            self.study_preferences_complete = True
-        
-        # Emergency contact: name, address, relation
-        if all([self.emergency_contact, self.emergency_address, self.emergency_relation]):
-            self.emergency_contact_complete = True
-        
+        update_fields = kwargs.get('update_fields')
+        if self.update_completion(update_fields) and update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'completion_flags', 'completion_percentage'}
         super().save(*args, **kwargs)
 
+    def update_completion(self, changed_fields=None):
+        """
+        Re-check the sections that read any of ``changed_fields`` (all of them
+        by default); returns whether completion changed
+        """
+        changed_fields = None if changed_fields is None else set(changed_fields)
+        flags = self.completion_flags
+        for _, bit, fields, rule in self.COMPLETION_SECTIONS:
+            if changed_fields is not None and changed_fields.isdisjoint(fields):
+                continue
+            if rule(getattr(self, field) for field in fields):
+                flags |= bit
+            else:
+                flags &= ~bit
+        percentage = 100 * bin(flags).count('1') // len(self.COMPLETION_SECTIONS)
+        changed = (flags, percentage) != (self.completion_flags, self.completion_percentage)
+        self.completion_flags, self.completion_percentage = flags, percentage
+        return changed
+
 class Application(models.Model):
     APPLICATION_STATUS = [
         ('pending_payment', 'Pending Payment'),
@@ -187,7 +209,10 @@ class Document(models.Model):
     
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     document_type = models.CharField(max_length=50, choices=DOCUMENT_TYPES)
-    file = models.FileField(upload_to='documents/')
+    # Stored once per distinct content under documents/<sha256 shards>/
+    file = models.FileField(upload_to='documents/', storage=get_document_storage)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    original_filename = models.CharField(max_length=255, blank=True)
     description = models.TextField(blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     is_verified = models.BooleanField(default=False)
@@ -195,6 +220,55 @@ class Document(models.Model):
     def __str__(self):
         return f"{self.get_document_type_display()} - {self.student.username}"
 
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            # Store the blob first so its content hash is known for this row
+            self.original_filename = os.path.basename(self.file.name)[:255]
+            self.file.save(self.file.name, self.file.file, save=False)
+        # Follows the stored name, so replacing the file replaces the hash
+        # (and the download ETag built from it)
+        self.content_hash = content_hash_from_name(self.file.name)
+        super().save(*args, **kwargs)
+
+    @property
+    def display_name(self):
+        return self.original_filename or os.path.basename(self.file.name)
+
+    def get_absolute_url(self):
+        return reverse('student_portal:download_document', args=[self.pk])
+
+
+class UploadSession(models.Model):
+    """
+    A resumable document upload in progress. Chunks are written straight into
+    a partial file at their offset; finalizing turns it into a Document. The
+    row is kept after that, pointing at the Document, so a repeated finalize
+    returns it instead of creating another; cleanup_upload_sessions removes it.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    document_type = models.CharField(max_length=50, choices=Document.DOCUMENT_TYPES)
+    description = models.TextField(blank=True)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # Claimed by the one finalize request that creates the Document
+    finalized = models.BooleanField(default=False)
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size}) - {self.student.username}"
+
+    @property
+    def partial_path(self):
+        return os.path.join(settings.UPLOAD_SESSION_ROOT, f'{self.id}.part')
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
 class Message(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     subject = models.CharField(max_length=255)
@@ -205,6 +279,31 @@ class Message(models.Model):
     def __str__(self):
         return f"{self.subject} - {self.student.username}"
 
+class ApplicationEvent(models.Model):
+    """
+    A status or payment change staff made to an application. The
+    send_notifications worker turns events into Messages and emails, see
+    student_portal.notifications.
+    """
+    KIND_CHOICES = [
+        ('status', 'Application status'),
+        ('payment', 'Payment verification'),
+    ]
+
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    old_value = models.CharField(max_length=30, blank=True)
+    new_value = models.CharField(max_length=30)
+    note = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['processed_at', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.old_value} -> {self.new_value} ({self.application_id})"
+
 # Payment Model with ClickPesa Integration
 class Payment(models.Model):
     PAYMENT_STATUS = [
@@ -0,0 +1,132 @@
+"""
+Student notifications for staff changes to their applications
+
+Staff views record an ApplicationEvent for every status change or payment
+verification, in the same transaction as the change. The send_notifications
+worker turns them into a portal Message and a queued email per student:
+
+* events are coalesced per application and kind: an application whose latest
+  event is younger than NOTIFICATION_COALESCE_SECONDS waits, so a status
+  changed three times in a minute gives one notification with the final
+  value, and a change that was reverted gives none;
+* a batch of events becomes Messages and OutboundEmails with one
+  bulk_create each and one UPDATE marks the events processed, so 500
+  changed applications take a handful of queries.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from global_agency.outbox import queue_emails
+from globalagency_project.utils.cache_utils import USER_MESSAGES_TAG, invalidate_tags
+from .models import Application, ApplicationEvent, Message
+
+BATCH_SIZE = 1000
+
+SIGNATURE = """
+
+Log in to the student portal for details.
+
+Best regards,
+Africa Western Education Team"""
+
+
+def application_event(application, kind, old_value, new_value, note=''):
+    """An unsaved event for ``emit``"""
+    return ApplicationEvent(application=application, kind=kind, old_value=old_value or '',
+                            new_value=new_value, note=note)
+
+
+def emit(events):
+    """Record the events that actually change something, in one INSERT"""
+    events = [event for event in events if event.old_value != event.new_value]
+    if events:
+        ApplicationEvent.objects.bulk_create(events)
+    return events
+
+
+def _describe(application):
+    description = application.get_application_type_display().lower()
+    if application.university_name:
+        description += f' to {application.university_name}'
+    return description
+
+
+def _notification(application, kind, new_value, note):
+    """(subject, text) telling the student about the change"""
+    what = _describe(application)
+    if kind == 'payment' and new_value == 'paid':
+        return 'Payment verified', f'Your payment for your {what} has been verified.'
+    if kind == 'payment':
+        label = dict(Application.PAYMENT_STATUS_CHOICES).get(new_value, new_value)
+        text = f'The payment status of your {what} is now: {label}.'
+        return f'Payment {label.lower()}', text + (f'\nReason: {note}' if note else '')
+    label = dict(Application.APPLICATION_STATUS).get(new_value, new_value)
+    return f'Application {label.lower()}', f'Your {what} is now: {label}.'
+
+
+def _due_events(now, window, limit):
+    still_changing = ApplicationEvent.objects.filter(
+        application_id=OuterRef('application_id'), processed_at__isnull=True, created_at__gt=now - window,
+    )
+    due = ApplicationEvent.objects.filter(
+        processed_at__isnull=True, created_at__lte=now - window,
+    ).exclude(Exists(still_changing)).order_by('application_id', 'kind', 'created_at', 'pk')
+    features = connection.features
+    if features.has_select_for_update_skip_locked and features.has_select_for_update_of:
+        # Two workers never notify the same events
+        due = due.select_for_update(skip_locked=True, of=('self',))
+    events = list(due.select_related('application__student')[:limit])
+    if len(events) == limit and events[0].application_id != events[-1].application_id:
+        # The last application may have more events past the limit; next batch
+        last = events[-1].application_id
+        events = [event for event in events if event.application_id != last]
+    return events
+
+
+def process_events(window=None, limit=BATCH_SIZE):
+    """Notify students about one batch of settled events; returns (events, notifications)"""
+    window = timedelta(seconds=settings.NOTIFICATION_COALESCE_SECONDS if window is None else window)
+    now = timezone.now()
+    with transaction.atomic():
+        events = _due_events(now, window, limit)
+        if not events:
+            return 0, 0
+
+        messages, emails = [], []
+        for (_, kind), group in groupby(events, key=lambda event: (event.application_id, event.kind)):
+            group = list(group)
+            first, last = group[0], group[-1]
+            if first.old_value == last.new_value:
+                continue  # Changed and changed back
+            application = last.application
+            student = application.student
+            subject, text = _notification(application, kind, last.new_value, last.note)
+            messages.append(Message(student=student, subject=subject, message=text))
+            if student.email:
+                emails.append((f'{subject} - Africa Western Education',
+                               f'Hello {student.first_name},\n\n{text}{SIGNATURE}', [student.email]))
+
+        Message.objects.bulk_create(messages)
+        queue_emails(emails)
+        ApplicationEvent.objects.filter(pk__in=[event.pk for event in events]).update(processed_at=now)
+
+        # bulk_create sends no post_save, so the message caches are bumped here
+        tags = {USER_MESSAGES_TAG.format(user_id=message.student_id) for message in messages}
+        transaction.on_commit(lambda: invalidate_tags(*tags))
+    return len(events), len(messages)
+
+
+def process_all(window=None):
+    """Process batches until no settled events are left; returns (events, notifications)"""
+    total_events = total_notifications = 0
+    while True:
+        events, notifications = process_events(window)
+        if not events:
+            return total_events, total_notifications
+        total_events += events
+        total_notifications += notifications
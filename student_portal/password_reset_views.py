@@ -4,33 +4,35 @@ Password Reset Views for Student Portal
 from django.shortcuts import render, redirect
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.urls import reverse
-from django.conf import settings
+from global_agency.outbox import queue_email
+from globalagency_project.utils.query_budget import query_budget
 
+@query_budget(5)
 def student_forgot_password(request):
     """Student forgot password - request reset"""
     if request.method == 'POST':
-        email = request.POST.get('email')
+        email = request.POST.get('email', '').strip()
+        # Several accounts can share an address; each gets its own link
+        users = list(User.objects.filter(email__iexact=email, is_active=True)) if email else []
         
-        try:
-            user = User.objects.get(email=email)
-            
-            # Generate token
-            token = default_token_generator.make_token(user)
-            uid = urlsafe_base64_encode(force_bytes(user.pk))
-            
-            # Create reset link
-            reset_link = request.build_absolute_uri(
-                reverse('student_portal:password_reset_confirm', kwargs={'uidb64': uid, 'token': token})
-            )
-            
-            # Send email
-            subject = 'Password Reset Request - Africa Western Education'
-            message = f"""
+        if users:
+            for user in users:
+                # Generate token
+                token = default_token_generator.make_token(user)
+                uid = urlsafe_base64_encode(force_bytes(user.pk))
+                
+                # Create reset link
+                reset_link = request.build_absolute_uri(
+                    reverse('student_portal:password_reset_confirm', kwargs={'uidb64': uid, 'token': token})
+                )
+                
+                # Queue email; the send_queued_emails worker delivers it
+                subject = 'Password Reset Request - Africa Western Education'
+                message = f"""
 Hello {user.first_name},
 
 You have requested to reset your password for your student portal account.
@@ -45,30 +47,17 @@ If you did not request this reset, please ignore this email.
 Best regards,
 Africa Western Education Team
             """
+                queue_email(subject, message, [user.email])
             
-            try:
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@africawesternedu.com',
-                    [email],
-                    fail_silently=False,
-                )
-                messages.success(request, 'Password reset link has been sent to your email.')
-            except Exception as e:
-                # If email fails, show console message and still provide success feedback
-                print(f"Email sending failed: {e}")
-                print(f"Reset link: {reset_link}")
-                messages.success(request, 'Password reset instructions have been generated. Check the console for the reset link.')
-            
+            messages.success(request, 'Password reset link has been sent to your email.')
             return redirect('student_portal:login')
-            
-        except User.DoesNotExist:
-            messages.error(request, 'No account found with this email address.')
+        
+        messages.error(request, 'No account found with this email address.')
     
     return render(request, 'student_portal/forgot_password.html')
 
 
+@query_budget(6)
 def student_password_reset_confirm(request, uidb64, token):
     """Student password reset confirmation"""
     try:
@@ -0,0 +1,71 @@
+"""
+Profile sections and partial profile updates
+
+The student profile is filled in five sections, each edited by its own
+ModelForm. update_section() saves only the columns the student actually
+changed, with ``save(update_fields=...)``: one UPDATE touching those columns
+(plus the completion columns when a section becomes complete or incomplete,
+see StudentProfile.update_completion), and no query at all when nothing
+changed. The same code backs the section form pages and the JSON PATCH
+endpoint used for autosave, where a client sends only the fields it changed.
+"""
+from collections import namedtuple
+
+from .forms import (
+    AcademicQualificationsForm, EmergencyContactForm, ParentsDetailsForm,
+    PersonalDetailsForm, StudyPreferencesForm,
+)
+
+Section = namedtuple('Section', 'form_class template next_url success_message')
+
+SECTIONS = {
+    'personal_details': Section(
+        PersonalDetailsForm, 'student_portal/personal_details.html', 'student_portal:parents_details',
+        'Personal details saved successfully!',
+    ),
+    'parents_details': Section(
+        ParentsDetailsForm, 'student_portal/parents_details.html', 'student_portal:academic_qualifications',
+        'Parents details saved successfully!',
+    ),
+    'academic_qualifications': Section(
+        AcademicQualificationsForm, 'student_portal/academic_qualifications.html', 'student_portal:study_preferences',
+        'Academic qualifications saved successfully!',
+    ),
+    'study_preferences': Section(
+        StudyPreferencesForm, 'student_portal/study_preferences.html', 'student_portal:emergency_contact',
+        'Study preferences saved successfully!',
+    ),
+    'emergency_contact': Section(
+        EmergencyContactForm, 'student_portal/emergency_contact.html', 'student_portal:dashboard',
+        'Emergency contact information saved successfully! Your profile is now complete.',
+    ),
+}
+
+
+def partial_form(form_class, profile, data):
+    """A section form bound to ``data`` that validates and saves only the fields present in it"""
+    form = form_class(data, instance=profile)
+    for name in list(form.fields):
+        if name not in data:
+            del form.fields[name]
+    return form
+
+
+def update_section(form):
+    """
+    Save a valid section form's changes to its profile; returns the names of
+    the changed fields
+    """
+    changed = [name for name in form.changed_data if name in form.fields]
+    if changed:
+        # Validation already copied the cleaned values onto the instance
+        form.instance.save(update_fields=[*changed, 'updated_at'])
+    return changed
+
+
+def section_state(profile):
+    """Completion of every section, for JSON clients"""
+    return {
+        'completion_percentage': profile.completion_percentage,
+        'sections': {name: getattr(profile, f'{name}_complete') for name in SECTIONS},
+    }
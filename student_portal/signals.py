@@ -0,0 +1,39 @@
+"""
+Signal handlers that keep cached per-student query results fresh and create
+thumbnails for uploaded images
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from globalagency_project.utils.cache_utils import (
+    USER_APPLICATIONS_TAG, USER_DOCUMENTS_TAG, USER_MESSAGES_TAG, invalidate_tags,
+)
+from .models import Application, Document, Message, Payment, StudentProfile
+from .thumbnails import generate_thumbnails
+
+
+@receiver([post_save, post_delete], sender=Application)
+@receiver([post_save, post_delete], sender=Payment)
+def invalidate_student_applications(sender, instance, **kwargs):
+    invalidate_tags(USER_APPLICATIONS_TAG.format(user_id=instance.student_id))
+
+
+@receiver([post_save, post_delete], sender=Document)
+def invalidate_student_documents(sender, instance, **kwargs):
+    invalidate_tags(USER_DOCUMENTS_TAG.format(user_id=instance.student_id))
+
+
+@receiver([post_save, post_delete], sender=Message)
+def invalidate_student_messages(sender, instance, **kwargs):
+    invalidate_tags(USER_MESSAGES_TAG.format(user_id=instance.student_id))
+
+
+@receiver(post_save, sender=Document)
+def create_document_thumbnails(sender, instance, **kwargs):
+    transaction.on_commit(lambda: generate_thumbnails(instance.file))
+
+
+@receiver(post_save, sender=StudentProfile)
+def create_profile_picture_thumbnails(sender, instance, update_fields=None, **kwargs):
+    if instance.profile_picture and (update_fields is None or 'profile_picture' in update_fields):
+        transaction.on_commit(lambda: generate_thumbnails(instance.profile_picture))
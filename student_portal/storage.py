@@ -0,0 +1,148 @@
+"""
+Content-addressed storage for uploaded documents
+
+Every blob is stored once, under the SHA-256 of its bytes:
+
+    documents/3f/a1/3fa1...e9.pdf
+
+so a student uploading the same passport scan for several applications (or
+two students uploading the same file) reuses the existing blob. Document rows
+are the reference counts: a blob is only removed by ``manage.py gc_documents``
+once no Document points at it any more. Reusing a blob refreshes its mtime, so
+the collector's grace period also covers a row that is about to reference it.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+CHUNK_SIZE = 64 * 1024
+DERIVED_DIR = 'thumbs'
+
+BLOB_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(?:\.[\w]+)?$')
+
+
+def blob_name(prefix, digest, extension):
+    return f'{prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def content_hash_from_name(name):
+    """SHA-256 encoded in a content-addressed name, or '' for legacy names"""
+    match = BLOB_NAME_RE.search(name or '')
+    return match.group('digest') if match else ''
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files after the SHA-256 of their content"""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is the content hash, so there is nothing to de-clash
+        return name
+
+    def _save(self, name, content):
+        prefix = os.path.dirname(name) or 'blobs'
+        if DERIVED_DIR in prefix.split('/'):
+            # Thumbnails are derived from a blob and keep their given name
+            self._commit_temp(self._write_temp(prefix, content.chunks(CHUNK_SIZE)), name)
+            return name
+        extension = os.path.splitext(name)[1].lower()[:10]
+        digest = getattr(content, 'sha256', None)
+
+        if digest is None and (
+            hasattr(content, 'temporary_file_path') or isinstance(getattr(content, 'file', None), BytesIO)
+        ):
+            # Already in memory or spooled to disk by the upload handler: hash
+            # it in place first, so a duplicate costs no write at all and a
+            # new blob on disk is just renamed into place
+            digest = self._hash_chunks(content.chunks(CHUNK_SIZE))
+
+        if digest is not None:
+            final_name = blob_name(prefix, digest, extension)
+            if not self._touch(final_name):
+                self._place(content, final_name)
+            return final_name
+
+        # Anything else is streamed to a temp file while it is being hashed
+        hasher = hashlib.sha256()
+
+        def hashed_chunks():
+            for chunk in content.chunks(CHUNK_SIZE):
+                hasher.update(chunk)
+                yield chunk
+
+        tmp_path = self._write_temp(prefix, hashed_chunks())
+        final_name = blob_name(prefix, hasher.hexdigest(), extension)
+        if self._touch(final_name):
+            os.remove(tmp_path)
+        else:
+            self._commit_temp(tmp_path, final_name)
+        return final_name
+
+    def _touch(self, name):
+        """Refresh an existing blob's mtime; False if there is no such blob"""
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _place(self, content, name):
+        if hasattr(content, 'temporary_file_path'):
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file_move_safe(content.temporary_file_path(), path, allow_overwrite=True)
+            self._chmod(path)
+        else:
+            tmp_path = self._write_temp(os.path.dirname(name), content.chunks(CHUNK_SIZE))
+            self._commit_temp(tmp_path, name)
+
+    def _write_temp(self, directory, chunks):
+        os.makedirs(self.path(directory), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path(directory), prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in chunks:
+                    tmp.write(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _commit_temp(self, tmp_path, name):
+        # os.replace is atomic, so concurrent uploads of the same blob are safe
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        self._chmod(path)
+
+    def _chmod(self, path):
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+
+    @staticmethod
+    def _hash_chunks(chunks):
+        hasher = hashlib.sha256()
+        for chunk in chunks:
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def iter_blobs(self, prefix):
+        """Yield the storage name of every content-addressed blob under prefix"""
+        root = self.path(prefix)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d != DERIVED_DIR]
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(dirpath, filename), self.location).replace(os.sep, '/')
+                if content_hash_from_name(name):
+                    yield name
+
+
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage():
+    return document_storage
@@ -0,0 +1,18 @@
+from django import template
+from student_portal.thumbnails import get_thumbnail, thumbnail_url as _thumbnail_url
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail_url(fieldfile, size='small'):
+    """{{ doc.file|thumbnail_url:'small' }} - empty string for non-image files"""
+    return _thumbnail_url(fieldfile, size) or ''
+
+
+@register.filter
+def document_thumbnail_url(document, size='small'):
+    """{{ doc|document_thumbnail_url:'small' }} - through the access-checked download view"""
+    if not get_thumbnail(document.file, size):
+        return ''
+    return f'{document.get_absolute_url()}?size={size}'
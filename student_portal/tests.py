@@ -1,3 +1,879 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from employee.models import UserProfile
+
+from global_agency.models import OutboundEmail
+from globalagency_project.utils.upload_handlers import StreamingUploadHandler
+from globalagency_project.utils.cache_utils import (
+    get_user_application_stats, get_user_applications, get_user_dashboard_counts, make_cache_key,
+)
+from . import notifications, thumbnails, upload_views
+from .download_views import _readable_document
+from .storage import document_storage
+from .models import Application, ApplicationEvent, Document, Message, Payment, StudentProfile, UploadSession
+
+# The manifest storage needs collectstatic; tests render with plain storage
+PLAIN_STATIC = override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+
+
+class QueryCacheTests(TestCase):
+    """Cached per-student query results and their signal-driven invalidation"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='student@example.com', password='pass12345')
+        StudentProfile.objects.create(user=self.user)
+        Application.objects.create(student=self.user, application_type='university', status='submitted')
+
+    def test_cache_keys_are_deterministic(self):
+        self.assertEqual(
+            make_cache_key('func', (1, 'a'), {'b': 2}),
+            'func:' + hashlib.sha1(b'[[1, "a"], [["b", 2]]]').hexdigest(),
+        )
+
+    def test_results_are_materialized_and_cached(self):
+        applications = get_user_applications(self.user.id)
+        self.assertIsInstance(applications, list)
+        self.assertEqual(applications[0]['status_display'], 'Submitted')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_applications(self.user.id), applications)
+
+    def test_saving_an_application_invalidates_cached_results(self):
+        self.assertEqual(get_user_application_stats(self.user.id)['total'], 1)
+
+        Application.objects.create(student=self.user, application_type='visa')
+
+        stats = get_user_application_stats(self.user.id)
+        self.assertEqual(stats['total'], 2)
+        self.assertEqual(stats['pending_payment'], 1)
+
+    @PLAIN_STATIC
+    def test_dashboard_reuses_cached_queries(self):
+        self.client.force_login(self.user)
+        self.client.get('/student-portal/')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/student-portal/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'University Application')
+        tables = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('student_portal_application', tables)
+        self.assertNotIn('student_portal_document', tables)
+
+
+def make_photo(size=(2000, 1500)):
+    """A camera-sized JPEG with EXIF metadata"""
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera Maker'
+    buffer = BytesIO()
+    Image.new('RGB', size, 'green').save(buffer, 'JPEG', exif=exif, quality=95)
+    return buffer.getvalue()
+
+
+class ThumbnailTests(TestCase):
+    """Fixed-size thumbnails for uploaded images"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='student@example.com', password='pass12345')
+
+    def test_thumbnails_are_generated_on_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            document = Document.objects.create(
+                student=self.user, document_type='passport',
+                file=SimpleUploadedFile('passport.jpg', make_photo(), content_type='image/jpeg'),
+            )
+
+        for size, pixels in thumbnails.thumbnail_sizes().items():
+            name = thumbnails.thumbnail_name(document.file.name, size)
+            self.assertTrue(default_storage.exists(name))
+            with default_storage.open(name) as f, Image.open(f) as image:
+                self.assertEqual(max(image.size), pixels)
+                self.assertEqual(len(image.getexif()), 0)
+
+    def test_existing_files_get_thumbnails_lazily(self):
+        name = default_storage.save('documents/old.jpg', ContentFile(make_photo()))
+        document = Document(student=self.user, document_type='passport', file=name)
+
+        url = thumbnails.thumbnail_url(document.file, 'small')
+
+        self.assertEqual(url, '/media/documents/thumbs/old.jpg.small.jpg')
+        self.assertLess(os.path.getsize(thumbnails.thumbnail_path(document.file, 'small')), 5000)
+
+    def test_same_stem_with_different_extensions_do_not_collide(self):
+        jpg = Document(student=self.user, document_type='passport',
+                       file=default_storage.save('documents/photo.jpg', ContentFile(make_photo())))
+        png = Document(student=self.user, document_type='passport',
+                       file=default_storage.save('documents/photo.png', ContentFile(make_photo())))
+
+        self.assertNotEqual(thumbnails.get_thumbnail(jpg.file, 'small'), thumbnails.get_thumbnail(png.file, 'small'))
+
+    def test_non_images_have_no_thumbnail(self):
+        name = default_storage.save('documents/cv.pdf', ContentFile(b'%PDF-1.4'))
+        document = Document(student=self.user, document_type='cv', file=name)
+
+        self.assertIsNone(thumbnails.get_thumbnail(document.file, 'small'))
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Identical uploads share one blob; unreferenced blobs are garbage collected"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='student@example.com', password='pass12345')
+
+    def upload(self, name, content):
+        return Document.objects.create(
+            student=self.user, document_type='passport',
+            file=SimpleUploadedFile(name, content, content_type='application/pdf'),
+        )
+
+    def blobs(self):
+        return sorted(document_storage.iter_blobs('documents'))
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.upload('passport.pdf', b'%PDF-1.4 scan')
+        second = self.upload('passport-copy.pdf', b'%PDF-1.4 scan')
+        digest = hashlib.sha256(b'%PDF-1.4 scan').hexdigest()
+
+        self.assertEqual(first.file.name, f'documents/{digest[:2]}/{digest[2:4]}/{digest}.pdf')
+        self.assertEqual(second.file.name, first.file.name)
+        self.assertEqual(second.content_hash, digest)
+        self.assertEqual(second.display_name, 'passport-copy.pdf')
+        self.assertEqual(self.blobs(), [first.file.name])
+
+    def test_spooled_uploads_are_moved_not_copied(self):
+        upload = TemporaryUploadedFile('scan.pdf', 'application/pdf', 0, None)
+        self.addCleanup(upload.close)
+        upload.write(b'%PDF-1.4 large scan')
+        upload.flush()
+        spooled_path = upload.temporary_file_path()
+
+        document = Document.objects.create(student=self.user, document_type='passport', file=upload)
+
+        self.assertFalse(os.path.exists(spooled_path))
+        with document.file.open('rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.4 large scan')
+
+    def test_gc_deletes_only_old_unreferenced_blobs(self):
+        kept = self.upload('kept.pdf', b'kept')
+        orphan = self.upload('orphan.pdf', b'orphan')
+        young = self.upload('young.pdf', b'young')
+        Document.objects.filter(pk__in=[orphan.pk, young.pk]).delete()
+        old = time.time() - 2 * 86400
+        os.utime(document_storage.path(orphan.file.name), (old, old))
+
+        call_command('gc_documents', stdout=StringIO())
+
+        self.assertEqual(self.blobs(), sorted([kept.file.name, young.file.name]))
+
+    def test_reusing_a_blob_restarts_its_grace_period(self):
+        first = self.upload('old.pdf', b'reused')
+        path = document_storage.path(first.file.name)
+        old = time.time() - 2 * 86400
+        os.utime(path, (old, old))
+        first.delete()
+
+        second = self.upload('again.pdf', b'reused')
+
+        self.assertGreater(os.stat(path).st_mtime, old)
+        call_command('gc_documents', stdout=StringIO())
+        self.assertEqual(self.blobs(), [second.file.name])
+
+    def test_gc_rechecks_references_before_deleting(self):
+        document = self.upload('racing.pdf', b'racing')
+        old = time.time() - 2 * 86400
+        os.utime(document_storage.path(document.file.name), (old, old))
+
+        # The row appears after the command took its snapshot of referenced names
+        with mock.patch.object(Document.objects, 'values_list', return_value=Document.objects.none()):
+            call_command('gc_documents', stdout=StringIO())
+
+        self.assertEqual(self.blobs(), [document.file.name])
+
+    def test_legacy_uploads_are_migrated_and_deduplicated(self):
+        for name in ('logoo.png', 'logoo_0ipBNjx.png'):
+            path = os.path.join(self.media_root, 'documents', name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'same logo bytes')
+            Document.objects.create(student=self.user, document_type='cv', file=f'documents/{name}')
+
+        call_command('gc_documents', '--migrate-legacy', stdout=StringIO())
+
+        names = set(Document.objects.values_list('file', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertEqual(self.blobs(), list(names))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'documents', 'logoo.png')))
+        self.assertEqual(
+            set(Document.objects.values_list('original_filename', flat=True)),
+            {'logoo.png', 'logoo_0ipBNjx.png'},
+        )
+
+
+@PLAIN_STATIC
+class StreamingUploadTests(TestCase):
+    """Uploads are checked, hashed and spooled as they stream in"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='student@example.com', password='pass12345')
+        self.client.force_login(self.user)
+
+    def post_document(self, name, content):
+        return self.client.post(reverse('student_portal:documents'), {
+            'document_type': 'passport',
+            'file': SimpleUploadedFile(name, content),
+        })
+
+    def test_valid_upload_is_stored_under_streamed_hash(self):
+        content = b'%PDF-1.4 passport scan'
+        response = self.post_document('passport.pdf', content)
+
+        self.assertRedirects(response, reverse('student_portal:documents'))
+        document = Document.objects.get()
+        self.assertEqual(document.content_hash, hashlib.sha256(content).hexdigest())
+
+    def test_content_not_matching_extension_is_rejected(self):
+        with self.assertLogs('django.security', 'WARNING'):
+            response = self.post_document('passport.pdf', b'MZ\x90\x00 not a pdf')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].errors['file'], ['File content does not match its type'])
+        self.assertFalse(Document.objects.exists())
+
+    @override_settings(FILE_UPLOAD_MAX_SIZE=1024 * 1024)
+    def test_oversized_upload_is_rejected_without_being_stored(self):
+        with self.assertLogs('django.security', 'WARNING'):
+            response = self.post_document('scan.pdf', b'%PDF-1.4' + b'0' * (2 * 1024 * 1024))
+
+        self.assertEqual(response.context['form'].errors['file'], ['File size must be less than 1MB'])
+        self.assertFalse(Document.objects.exists())
+        self.assertEqual(list(document_storage.iter_blobs('documents')), [])
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=8)
+    def test_large_files_spill_to_disk(self):
+        handler = StreamingUploadHandler()
+        handler.new_file('file', 'scan.pdf', 'application/pdf', None)
+        handler.receive_data_chunk(b'%PDF-1.4', 0)
+        handler.receive_data_chunk(b' page two', 8)
+        uploaded = handler.file_complete(17)
+        self.addCleanup(uploaded.close)
+
+        self.assertIsInstance(uploaded, TemporaryUploadedFile)
+        self.assertEqual(uploaded.read(), b'%PDF-1.4 page two')
+        self.assertEqual(uploaded.sha256, hashlib.sha256(b'%PDF-1.4 page two').hexdigest())
+
+
+class ResumableUploadTests(TestCase):
+    """Chunked uploads that survive dropped connections"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            UPLOAD_SESSION_ROOT=os.path.join(self.media_root, 'sessions'),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='student@example.com', password='pass12345')
+        self.client.force_login(self.user)
+
+    def start(self, content, filename='transcript.pdf'):
+        response = self.client.post(
+            reverse('student_portal:start_upload'),
+            {'filename': filename, 'size': len(content), 'document_type': 'academic_transcript'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def patch(self, session, offset, chunk):
+        return self.client.patch(
+            session['url'], chunk, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_upload_resumes_from_server_offset(self):
+        content = b'%PDF-1.4 ' + os.urandom(3000)
+        session = self.start(content)
+
+        self.assertEqual(self.patch(session, 0, content[:1000]).status_code, 204)
+        # The client lost the response and retries the same chunk
+        retry = self.patch(session, 0, content[:1000])
+        self.assertEqual(retry.status_code, 409)
+        self.assertEqual(retry['Upload-Offset'], '1000')
+        self.assertEqual(self.client.head(session['url'])['Upload-Offset'], '1000')
+        self.assertEqual(self.patch(session, 1000, content[1000:]).status_code, 204)
+
+        response = self.client.post(session['finalize_url'])
+
+        self.assertEqual(response.status_code, 201)
+        document = Document.objects.get()
+        self.assertEqual(document.content_hash, hashlib.sha256(content).hexdigest())
+        self.assertEqual(document.display_name, 'transcript.pdf')
+        self.assertEqual(UploadSession.objects.get().document, document)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'sessions')), [])
+
+    def test_repeated_finalize_returns_the_same_document(self):
+        content = b'%PDF-1.4 ' + os.urandom(100)
+        session = self.start(content)
+        self.patch(session, 0, content)
+        # A second request read the session before the first one claimed it
+        stale = UploadSession.objects.get()
+
+        first = self.client.post(session['finalize_url'])
+        with mock.patch('student_portal.upload_views._get_session', return_value=(stale, None)):
+            racing = self.client.post(session['finalize_url'])
+        retry = self.client.post(session['finalize_url'])
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((racing.status_code, retry.status_code), (200, 200))
+        self.assertEqual({racing.json()['id'], retry.json()['id']}, {first.json()['id']})
+        self.assertEqual(Document.objects.count(), 1)
+
+    def test_finalized_uploads_do_not_count_as_active(self):
+        for i in range(upload_views.MAX_ACTIVE_SESSIONS + 1):
+            session = self.start(b'%PDF-1.4 scan')
+            self.patch(session, 0, b'%PDF-1.4 scan')
+            self.assertEqual(self.client.post(session['finalize_url']).status_code, 201)
+
+    def test_incomplete_upload_cannot_be_finalized(self):
+        session = self.start(b'%PDF-1.4 scan')
+        self.assertEqual(self.patch(session, 0, b'%PDF-1.4').status_code, 204)
+
+        response = self.client.post(session['finalize_url'])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Document.objects.exists())
+
+    def test_wrong_content_and_other_students_are_refused(self):
+        session = self.start(b'MZ not a pdf at all')
+        self.assertEqual(self.patch(session, 0, b'MZ not a pdf at all').status_code, 415)
+
+        other = User.objects.create_user(username='other@example.com', password='pass12345')
+        self.client.force_login(other)
+        self.assertEqual(self.client.head(session['url']).status_code, 404)
+
+    def test_signature_is_checked_however_the_chunks_are_split(self):
+        content = b'%PDF-1.4 ' + os.urandom(2000)
+        session = self.start(content)
+        self.assertEqual(self.patch(session, 0, content[:2]).status_code, 204)
+        self.assertEqual(self.patch(session, 2, content[2:]).status_code, 204)
+        self.assertEqual(self.client.post(session['finalize_url']).status_code, 201)
+
+        content = b'MZ' + os.urandom(2000)
+        session = self.start(content, filename='fake.pdf')
+        self.assertEqual(self.patch(session, 0, content[:2]).status_code, 204)
+        self.assertEqual(self.patch(session, 2, content[2:]).status_code, 204)
+        self.assertEqual(self.client.post(session['finalize_url']).status_code, 415)
+        self.assertEqual(Document.objects.count(), 1)
+        self.assertFalse(UploadSession.objects.filter(pk=session['id']).exists())
+
+    def test_racing_chunk_loses_before_writing(self):
+        content = b'%PDF-1.4 ' + os.urandom(2000)
+        session = self.start(content)
+        # Both requests read the session at offset 0; the first claims the range
+        stale = UploadSession.objects.get()
+        self.assertEqual(self.patch(session, 0, content[:1000]).status_code, 204)
+
+        with mock.patch('student_portal.upload_views._get_session', return_value=(stale, None)):
+            response = self.patch(session, 0, b'x' * 1000)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '1000')
+        with open(stale.partial_path, 'rb') as f:
+            self.assertEqual(f.read(), content[:1000])
+
+    def test_expired_sessions_are_cleaned_up(self):
+        session = self.start(b'%PDF-1.4 scan')
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+        call_command('cleanup_upload_sessions', stdout=StringIO())
+
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'sessions')), [])
+        self.assertEqual(self.client.head(session['url']).status_code, 404)
+
+
+class ProtectedDownloadTests(TestCase):
+    """Documents are only readable by their owner and staff"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, PROTECTED_MEDIA_SERVER='')
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='student@example.com', password='pass12345')
+        self.document = Document.objects.create(
+            student=self.user, document_type='passport',
+            file=SimpleUploadedFile('passport.pdf', b'%PDF-1.4 passport scan'),
+        )
+        self.url = self.document.get_absolute_url()
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_owner_downloads_with_content_etag(self):
+        self.client.force_login(self.user)
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 passport scan')
+        self.assertEqual(response['ETag'], f'"{self.document.content_hash}"')
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="passport.pdf"')
+        self.assertTrue(response['Cache-Control'].startswith('private'))
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_replacing_the_file_changes_the_etag(self):
+        self.client.force_login(self.user)
+        old_etag = self.get()['ETag']
+
+        # Same size, different bytes
+        self.document.file = SimpleUploadedFile('passport.pdf', b'%PDF-1.4 passport SCAN')
+        self.document.save()
+
+        self.assertEqual(self.document.content_hash, hashlib.sha256(b'%PDF-1.4 passport SCAN').hexdigest())
+        response = self.get(HTTP_IF_NONE_MATCH=old_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 passport SCAN')
+
+    def test_byte_ranges(self):
+        self.client.force_login(self.user)
+
+        middle = self.get(HTTP_RANGE='bytes=2-5')
+        self.assertEqual(middle.status_code, 206)
+        self.assertEqual(b''.join(middle.streaming_content), b'DF-1')
+        self.assertEqual(middle['Content-Range'], 'bytes 2-5/22')
+        self.assertEqual(middle['Content-Length'], '4')
+
+        tail = self.get(HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(tail.streaming_content), b'scan')
+        self.assertEqual(self.get(HTTP_RANGE='bytes=50-').status_code, 416)
+        # A stale If-Range gets the whole file
+        self.assertEqual(self.get(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"').status_code, 200)
+
+    def test_other_students_get_404_and_staff_get_the_file(self):
+        other = User.objects.create_user(username='other@example.com', password='pass12345')
+        self.client.force_login(other)
+        self.assertEqual(self.get().status_code, 404)
+
+        staff = User.objects.create_user(username='staff@example.com', password='pass12345')
+        UserProfile.objects.create(user=staff, role='employee', registration_method='admin')
+        self.client.force_login(staff)
+        self.assertEqual(self.get().status_code, 200)
+
+    def test_permission_check_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(_readable_document(self.user, self.document.pk))
+
+    @override_settings(PROTECTED_MEDIA_SERVER='x-accel-redirect')
+    def test_proxy_sends_the_bytes(self):
+        self.client.force_login(self.user)
+        response = self.get()
+
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.document.file.name}')
+        self.assertEqual(response.content, b'')
+
+
+class StudentImportTests(TestCase):
+    """CSV intakes are validated per row and inserted in batches"""
+
+    CSV = (
+        'Email,Full_Name,Password,Gender,Phone_Number,Olevel_School,Olevel_Year,Olevel_GPA\n'
+        'amina@example.com,Amina Mushi,Kilimanjaro-2024,Female,255700000001,Azania,2019,B\n'
+        'not-an-email,Baraka Njau,,male,,,,\n'
+        'AMINA@example.com,Amina Again,,female,,,,\n'
+        'taken@example.com,Taken Already,,male,,,,\n'
+        'juma@example.com,Juma,,robot,,,,\n'
+        'neema@example.com,Neema Said,,,,,,\n'
+    )
+
+    def setUp(self):
+        User.objects.create_user(username='taken@example.com', email='taken@example.com', password='pass12345')
+
+    def run_import(self, **kwargs):
+        from .importer import import_students
+        return import_students(StringIO(self.CSV), workers=0, batch_size=2, **kwargs)
+
+    def test_valid_rows_are_created_and_every_row_is_reported(self):
+        report = self.run_import()
+
+        self.assertEqual(
+            [(row.line, row.status) for row in report.rows],
+            [(2, 'created'), (3, 'error'), (4, 'error'), (5, 'error'), (6, 'error'), (7, 'created')],
+        )
+        messages = {row.line: row.message for row in report.errors}
+        self.assertIn('valid email', messages[3])
+        self.assertEqual(messages[4], 'Duplicate of line 2.')
+        self.assertIn('already exists', messages[5])
+        self.assertIn('gender', messages[6])
+
+        amina = User.objects.get(username='amina@example.com')
+        self.assertEqual((amina.first_name, amina.last_name), ('Amina', 'Mushi'))
+        self.assertTrue(amina.check_password('Kilimanjaro-2024'))
+        self.assertTrue(UserProfile.objects.get(user=amina).can_access_student_portal())
+        profile = StudentProfile.objects.get(user=amina)
+        self.assertEqual(profile.gender, 'female')
+        self.assertTrue(profile.academic_qualifications_complete)
+
+        # No password column value: one is generated and only shown in the report
+        neema = report.rows[-1]
+        self.assertTrue(neema.password)
+        self.assertTrue(User.objects.get(username='neema@example.com').check_password(neema.password))
+        self.assertEqual(report.rows[0].password, '')
+
+    def test_dry_run_validates_without_creating(self):
+        report = self.run_import(dry_run=True)
+
+        self.assertEqual(report.valid, 2)
+        self.assertEqual(len(report.errors), 4)
+        self.assertFalse(User.objects.filter(username='amina@example.com').exists())
+
+    def test_command_hashes_in_a_process_pool_and_writes_the_report(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source, report_path = os.path.join(directory, 'intake.csv'), os.path.join(directory, 'report.csv')
+        with open(source, 'w') as f:
+            f.write(self.CSV)
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_students', source, '--workers', '2', '--report', report_path,
+                     stdout=stdout, stderr=stderr)
+
+        self.assertIn('Created 2 student(s), 4 error(s)', stdout.getvalue())
+        self.assertIn('Line 4 (amina@example.com): Duplicate of line 2.', stderr.getvalue())
+        with open(report_path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'line,email,status,message,password')
+        password = lines[-1].rsplit(',', 1)[1]
+        self.assertTrue(User.objects.get(username='neema@example.com').check_password(password))
+
+    def test_file_without_email_column_is_refused(self):
+        from .importer import ImportFileError, import_students
+        with self.assertRaises(ImportFileError):
+            import_students(StringIO('name,phone\nAmina,1\n'), workers=0)
+
+
+class ProfileCompletionTests(TestCase):
+    """Completion stored as section flags and a percentage, kept current on save"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='amina@example.com')
+        self.profile = StudentProfile.objects.create(
+            user=self.user, father_name='Juma', olevel_school='Azania', olevel_year='2019', olevel_gpa='B',
+        )
+
+    def test_sections_are_stored_as_flags_and_percentage(self):
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.completion_flags, 2 | 4)
+        self.assertEqual(self.profile.get_completion_percentage(), 40)
+        self.assertTrue(self.profile.parents_details_complete)
+        self.assertTrue(self.profile.academic_qualifications_complete)
+        self.assertFalse(self.profile.personal_details_complete)
+        self.assertFalse(self.profile.is_complete())
+
+    def test_clearing_a_field_marks_its_section_incomplete(self):
+        self.profile.father_name = ''
+        self.profile.save()
+
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.parents_details_complete)
+        self.assertEqual(self.profile.completion_percentage, 20)
+
+    def test_update_fields_rechecks_only_the_sections_they_feed(self):
+        # Stale flags on a section the update does not touch are left alone
+        StudentProfile.objects.filter(pk=self.profile.pk).update(completion_flags=2 | 4 | 16, completion_percentage=60)
+        self.profile.refresh_from_db()
+
+        self.profile.heard_about_us = 'Radio'
+        with CaptureQueriesContext(connection) as queries:
+            self.profile.save(update_fields=['heard_about_us'])
+        self.assertNotIn('completion', queries[-1]['sql'])
+
+        self.profile.mother_name = 'Neema'
+        self.profile.father_name = ''
+        self.profile.olevel_gpa = ''
+        self.profile.save(update_fields=['olevel_gpa'])
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.completion_flags, 2 | 16)
+        self.assertEqual(self.profile.completion_percentage, 40)
+        self.assertEqual(self.profile.father_name, 'Juma')
+
+    def test_percentage_is_queryable(self):
+        Application.objects.create(student=self.user, application_type='university')
+        other = User.objects.create_user(username='juma@example.com')
+        StudentProfile.objects.create(user=other, father_name='Ally')
+        Application.objects.create(student=other, application_type='visa')
+
+        applied_this_week = StudentProfile.objects.filter(
+            completion_percentage=40,
+            user__application__created_at__gte=timezone.now() - timedelta(days=7),
+        )
+        self.assertEqual(list(applied_this_week.values_list('user__username', flat=True)), ['amina@example.com'])
+
+    def test_backfill_recomputes_stale_rows_in_batches(self):
+        for i in range(4):
+            StudentProfile.objects.create(user=User.objects.create_user(username=f'student{i}'), mother_name='Neema')
+        StudentProfile.objects.update(completion_flags=0, completion_percentage=0)
+
+        stdout = StringIO()
+        call_command('backfill_profile_completion', '--dry-run', stdout=stdout)
+        self.assertIn('Checked 5 profile(s), 5 would change', stdout.getvalue())
+        self.assertFalse(StudentProfile.objects.exclude(completion_percentage=0).exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('backfill_profile_completion', '--batch-size', '2', stdout=stdout)
+        self.assertIn('Checked 5 profile(s), 5 updated', stdout.getvalue())
+        # Three pages read, each followed by one bulk UPDATE, and the empty last page
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE')]), 3)
+        self.assertEqual(StudentProfile.objects.get(user=self.user).completion_percentage, 40)
+        self.assertEqual(StudentProfile.objects.filter(completion_percentage=20).count(), 4)
+
+
+class ProfileSectionTests(TestCase):
+    """Section forms and the autosave endpoint write only the changed columns"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='amina@example.com', password='pass12345')
+        UserProfile.objects.create(user=self.user, role='student', registration_method='self')
+        self.profile = StudentProfile.objects.create(user=self.user, father_name='Juma')
+        self.client.force_login(self.user)
+        self.api = reverse('student_portal:profile_section_api', args=['parents_details'])
+
+    def profile_updates(self, queries):
+        return [q['sql'] for q in queries if q['sql'].startswith('UPDATE "student_portal_studentprofile"')]
+
+    def patch(self, data, url=None):
+        return self.client.patch(url or self.api, json.dumps(data), content_type='application/json')
+
+    def test_form_saves_only_changed_columns(self):
+        data = {'father_name': 'Juma', 'mother_name': 'Neema', 'father_email': '', 'mother_email': ''}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('student_portal:parents_details'), data)
+        self.assertRedirects(response, reverse('student_portal:academic_qualifications'), fetch_redirect_response=False)
+
+        [update] = self.profile_updates(queries)
+        self.assertIn('"mother_name"', update)
+        self.assertNotIn('"father_name"', update)
+        self.assertNotIn('"olevel_school"', update)
+        self.assertEqual(StudentProfile.objects.get(user=self.user).mother_name, 'Neema')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('student_portal:parents_details'), data)
+        self.assertEqual(self.profile_updates(queries), [])
+
+    def test_webp_profile_picture_is_accepted(self):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 40), 'green').save(buffer, 'WEBP')
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+        with override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(reverse('student_portal:personal_details'), {
+                'gender': 'female', 'date_of_birth': '2004-05-01', 'nationality': 'Tanzanian',
+                'phone_number': '255700000000', 'address': 'Arusha',
+                'profile_picture': SimpleUploadedFile('me.webp', buffer.getvalue(), 'image/webp'),
+            })
+
+        self.assertRedirects(response, reverse('student_portal:parents_details'), fetch_redirect_response=False)
+        self.assertTrue(StudentProfile.objects.get(user=self.user).profile_picture.name.endswith('.webp'))
+
+    def test_patch_saves_one_field_in_one_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch({'mother_phone': '255700000000'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], ['mother_phone'])
+        [update] = self.profile_updates(queries)
+        self.assertEqual(update.split(' WHERE ')[0].count('='), 2)  # mother_phone and updated_at
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.mother_phone, self.profile.father_name), ('255700000000', 'Juma'))
+
+    def test_patch_reports_completion(self):
+        url = reverse('student_portal:profile_section_api', args=['academic_qualifications'])
+        self.patch({'olevel_school': 'Azania', 'olevel_year': '2019'}, url)
+        body = self.patch({'olevel_gpa': 'B'}, url).json()
+
+        self.assertEqual(body['completion_percentage'], 40)
+        self.assertTrue(body['sections']['academic_qualifications'])
+        self.assertEqual(self.client.get(url).json()['values']['olevel_gpa'], 'B')
+
+    def test_patch_rejects_bad_input(self):
+        response = self.patch({'mother_email': 'not-an-email'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('mother_email', response.json()['errors'])
+
+        self.assertEqual(self.patch({'olevel_school': 'Azania'}).status_code, 400)
+        self.assertEqual(self.client.patch(self.api, 'oops', content_type='application/json').status_code, 400)
+        self.assertEqual(self.patch({}, reverse('student_portal:profile_section_api', args=['nope'])).status_code, 404)
+        self.assertEqual(self.client.post(self.api).status_code, 405)
+        self.assertEqual(StudentProfile.objects.get(user=self.user).mother_email, '')
+
+
+@PLAIN_STATIC
+class StudentProfileAccessTests(TestCase):
+    """Profiles are provisioned at login and loaded lazily, once, by request.student_profile"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='amina@example.com', password='pass12345')
+        UserProfile.objects.create(user=self.user, role='student', registration_method='self')
+
+    def profile_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries if '"student_portal_studentprofile"' in q['sql']]
+
+    def test_login_provisions_the_profile(self):
+        self.client.post(reverse('student_portal:login'), {'username': 'amina@example.com', 'password': 'pass12345'})
+
+        self.assertTrue(StudentProfile.objects.filter(user=self.user).exists())
+
+    def test_pages_that_do_not_use_the_profile_do_not_query_it(self):
+        StudentProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+        application = Application.objects.create(student=self.user, application_type='visa')
+        payment = Payment.objects.create(student=self.user, application=application, amount=5000,
+                                         order_reference='REF1', status='success', is_successful=True)
+        self.assertEqual(self.profile_queries(reverse('student_portal:check_payment_status', args=[payment.id])), [])
+        # The sidebar of the portal pages shows completion, read once
+        self.assertEqual(len(self.profile_queries(reverse('student_portal:applications'))), 1)
+
+    def test_profile_is_loaded_once_per_request(self):
+        StudentProfile.objects.create(user=self.user, father_name='Juma')
+        self.client.force_login(self.user)
+
+        # The view and the dashboard template's user.studentprofile share one query
+        self.assertEqual(len(self.profile_queries(reverse('student_portal:dashboard'))), 1)
+
+    def test_account_without_a_profile_gets_one(self):
+        self.client.force_login(self.user)
+
+        self.client.get(reverse('student_portal:dashboard'))
+
+        self.assertTrue(StudentProfile.objects.filter(user=self.user).exists())
+
+
+class NotificationTests(TestCase):
+    """Application events become coalesced Messages and queued emails"""
+
+    def setUp(self):
+        self.student = User.objects.create_user(username='amina@example.com', email='amina@example.com',
+                                                first_name='Amina', password='pass12345')
+        self.application = Application.objects.create(student=self.student, application_type='university',
+                                                      university_name='University of Nairobi')
+
+    def change(self, old, new, seconds_ago=120, kind='status', application=None, note=''):
+        event = notifications.application_event(application or self.application, kind, old, new, note)
+        event.created_at = timezone.now() - timedelta(seconds=seconds_ago)
+        return notifications.emit([event])
+
+    def test_changes_in_the_window_are_coalesced_into_the_final_status(self):
+        self.change('pending_payment', 'submitted', seconds_ago=110)
+        self.change('submitted', 'under_review', seconds_ago=100)
+        self.change('under_review', 'approved', seconds_ago=90)
+
+        self.assertEqual(notifications.process_all(), (3, 1))
+
+        message = Message.objects.get(student=self.student)
+        self.assertEqual(message.subject, 'Application approved')
+        self.assertIn('university application to University of Nairobi is now: Approved', message.message)
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.to, ['amina@example.com'])
+        self.assertTrue(email.body.startswith('Hello Amina,'))
+        self.assertFalse(ApplicationEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_application_still_changing_waits_for_the_window(self):
+        self.change('pending_payment', 'submitted', seconds_ago=120)
+        self.change('submitted', 'under_review', seconds_ago=5)
+
+        self.assertEqual(notifications.process_all(), (0, 0))
+        self.assertEqual(notifications.process_all(window=0), (2, 1))
+        self.assertEqual(Message.objects.get().subject, 'Application under review')
+
+    def test_reverted_change_and_unchanged_value_notify_nobody(self):
+        self.assertEqual(self.change('approved', 'approved'), [])
+        self.change('pending_payment', 'submitted', seconds_ago=100)
+        self.change('submitted', 'pending_payment', seconds_ago=90)
+
+        self.assertEqual(notifications.process_all(), (2, 0))
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_payment_rejection_includes_the_reason(self):
+        self.change('pending_verification', 'rejected', kind='payment', note='Receipt unreadable')
+
+        notifications.process_all()
+
+        message = Message.objects.get()
+        self.assertEqual(message.subject, 'Payment rejected')
+        self.assertIn('Reason: Receipt unreadable', message.message)
+
+    def test_dashboard_cache_sees_new_messages(self):
+        self.assertEqual(get_user_dashboard_counts(self.student.id)['unread_messages_count'], 0)
+        self.change('pending_payment', 'submitted')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.process_all()
+
+        self.assertEqual(get_user_dashboard_counts(self.student.id)['unread_messages_count'], 1)
+
+    def test_many_changes_are_notified_in_a_few_queries(self):
+        applications = Application.objects.bulk_create([
+            Application(student=self.student, application_type='visa') for _ in range(500)
+        ])
+        for application in applications:
+            self.change('pending_payment', 'submitted', application=application)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(notifications.process_events(), (500, 500))
+
+        # A select, two bulk inserts and an update; sqlite splits the inserts into batches of 999 values
+        self.assertLessEqual(len(queries), 15)
+        self.assertEqual(Message.objects.count(), 500)
+        self.assertEqual(OutboundEmail.objects.count(), 500)
@@ -0,0 +1,113 @@
+"""
+Fixed-size thumbnails for uploaded profile pictures and image documents
+
+Thumbnails live next to the original in a ``thumbs/`` folder, named after the
+full original filename and the size (``documents/thumbs/scan.png.small.jpg``),
+so finding one needs no database lookup and scan.jpg and scan.png don't share
+thumbnails. They are generated when the file is uploaded (see
+signals.py) and lazily on first access for files uploaded before that.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp')
+
+# Longest side in pixels; the staff pages show at most 200px, the PDF 1.5in
+DEFAULT_THUMBNAIL_SIZES = {
+    'small': 96,
+    'medium': 400,
+    'pdf': 450,
+}
+
+
+def thumbnail_sizes():
+    return getattr(settings, 'THUMBNAIL_SIZES', DEFAULT_THUMBNAIL_SIZES)
+
+
+def is_image(name):
+    return bool(name) and name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def thumbnail_name(name, size):
+    """Storage name of the ``size`` thumbnail of the file stored as ``name``"""
+    directory, filename = os.path.split(name)
+    return os.path.join(directory, 'thumbs', f'{filename}.{size}.jpg').replace(os.sep, '/')
+
+
+def _render(fieldfile, size):
+    pixels = thumbnail_sizes()[size]
+    fieldfile.open('rb')
+    try:
+        with Image.open(fieldfile) as original:
+            # Let the JPEG decoder downscale while decoding large photos
+            original.draft('RGB', (pixels, pixels))
+            image = ImageOps.exif_transpose(original)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            else:
+                image = image.convert('RGB')
+            image.thumbnail((pixels, pixels), Image.LANCZOS)
+    finally:
+        fieldfile.close()
+
+    buffer = BytesIO()
+    # Saved without exif=, so camera/GPS metadata is dropped
+    image.save(buffer, 'JPEG', quality=82, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def get_thumbnail(fieldfile, size):
+    """
+    Return the storage name of the thumbnail, generating it if missing.
+    Returns None for non-image or unreadable files.
+    """
+    if not fieldfile or not is_image(fieldfile.name):
+        return None
+    storage = fieldfile.storage
+    name = thumbnail_name(fieldfile.name, size)
+    if storage.exists(name):
+        return name
+    try:
+        content = _render(fieldfile, size)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f'Could not create {size} thumbnail for {fieldfile.name}: {e}')
+        return None
+    # Another request may have just written it; keep that one
+    if not storage.exists(name):
+        storage.save(name, ContentFile(content))
+    return name
+
+
+def thumbnail_url(fieldfile, size):
+    name = get_thumbnail(fieldfile, size)
+    return fieldfile.storage.url(name) if name else None
+
+
+def thumbnail_path(fieldfile, size):
+    """Local filesystem path of the thumbnail (for reportlab)"""
+    name = get_thumbnail(fieldfile, size)
+    return fieldfile.storage.path(name) if name else None
+
+
+def generate_thumbnails(fieldfile):
+    """Create every configured size for a newly uploaded file"""
+    for size in thumbnail_sizes():
+        get_thumbnail(fieldfile, size)
+
+
+def delete_thumbnails(storage, name):
+    """Remove every thumbnail of the file stored as ``name``"""
+    if not is_image(name):
+        return
+    for size in thumbnail_sizes():
+        storage.delete(thumbnail_name(name, size))
@@ -0,0 +1,299 @@
+"""
+Resumable chunked document uploads for the student portal
+
+A small tus-like protocol for students on unreliable connections:
+
+    POST   documents/uploads/                    start: {filename, size, document_type, description}
+    HEAD   documents/uploads/<id>/               current Upload-Offset, to resume after a drop
+    PATCH  documents/uploads/<id>/               raw bytes starting at the Upload-Offset header
+    POST   documents/uploads/<id>/finalize/      turn the complete upload into a Document
+    DELETE documents/uploads/<id>/               abandon the upload
+
+Each PATCH first claims its byte range by moving the session offset past it
+with a conditional UPDATE, so only one request ever writes a range, then
+streams the body straight into the partial file with os.pwrite; a retry only
+resends the chunk that failed. The file signature is checked once its first
+SIGNATURE_WINDOW bytes are in, however the client splits the chunks.
+Finalizing claims the session with a conditional UPDATE too, so a repeated
+finalize returns the same Document, and hands the partial file to the
+document storage, which renames it into place.
+Abandoned sessions are removed by ``manage.py cleanup_upload_sessions``.
+"""
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.files import File
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods, require_POST
+
+from globalagency_project.utils.query_budget import query_budget
+from globalagency_project.utils.upload_handlers import SIGNATURE_WINDOW, check_signature
+from .models import Document, UploadSession
+
+READ_SIZE = 64 * 1024
+MAX_ACTIVE_SESSIONS = 5
+
+
+class PartialUpload(File):
+    """A finished partial file; the storage moves it instead of copying it"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def _error(message, status, **headers):
+    response = JsonResponse({'status': 'error', 'message': message}, status=status)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def _offset_headers(response, session):
+    response['Upload-Offset'] = str(session.offset)
+    response['Upload-Length'] = str(session.size)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def _remove_partial(session):
+    try:
+        os.remove(session.partial_path)
+    except FileNotFoundError:
+        pass
+
+
+def _signature_error(session, head):
+    return check_signature(os.path.splitext(session.filename)[1].lower(), head)
+
+
+def _conflict(session):
+    """409 with the session's current offset, or 404 if it is gone"""
+    offset = UploadSession.objects.filter(pk=session.pk).values_list('offset', flat=True).first()
+    if offset is None:
+        return _error('Upload not found', 404)
+    return _error('Offset does not match the upload', 409, **{'Upload-Offset': str(offset)})
+
+
+def _release(session, end, position):
+    """
+    Hand back the part of a claimed range that was never written. If another
+    request already continued past it the file has a gap no client will
+    resend, so the upload is dropped; returns False then.
+    """
+    if UploadSession.objects.filter(pk=session.pk, offset=end).update(offset=position):
+        return True
+    _remove_partial(session)
+    UploadSession.objects.filter(pk=session.pk).delete()
+    return False
+
+
+def _expiry_cutoff():
+    return timezone.now() - timedelta(hours=settings.UPLOAD_SESSION_EXPIRY_HOURS)
+
+
+def _get_session(request, session_id):
+    """The caller's live session, or an error response"""
+    session = UploadSession.objects.filter(pk=session_id, student=request.user).first()
+    if session is None:
+        return None, _error('Upload not found', 404)
+    if session.updated_at < _expiry_cutoff():
+        _remove_partial(session)
+        session.delete()
+        return None, _error('Upload expired, please start again', 410)
+    return session, None
+
+
+@query_budget(9)
+@login_required
+@require_POST
+def start_upload(request):
+    """Create an upload session for a document the client will send in chunks"""
+    try:
+        data = json.loads(request.body or b'{}')
+        size = int(data.get('size', 0))
+    except (ValueError, TypeError):
+        return _error('Invalid upload request', 400)
+
+    filename = os.path.basename(str(data.get('filename', '')))[:255]
+    document_type = data.get('document_type', '')
+    if document_type not in dict(Document.DOCUMENT_TYPES):
+        return _error('Select a valid document type', 400)
+    if os.path.splitext(filename)[1].lower() not in settings.ALLOWED_UPLOAD_EXTENSIONS:
+        return _error('File type not allowed', 400)
+    if size <= 0:
+        return _error('The file is empty', 400)
+    if size > settings.FILE_UPLOAD_MAX_SIZE:
+        max_mb = settings.FILE_UPLOAD_MAX_SIZE // (1024 * 1024)
+        return _error(f'File size must be less than {max_mb}MB', 413)
+
+    active = UploadSession.objects.filter(student=request.user, finalized=False, updated_at__gte=_expiry_cutoff())
+    if active.count() >= MAX_ACTIVE_SESSIONS:
+        return _error('Too many uploads in progress', 429)
+
+    session = UploadSession.objects.create(
+        student=request.user,
+        document_type=document_type,
+        description=str(data.get('description', '')),
+        filename=filename,
+        size=size,
+    )
+    os.makedirs(settings.UPLOAD_SESSION_ROOT, exist_ok=True)
+    # Created empty; chunks extend it as they are written
+    os.close(os.open(session.partial_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+
+    url = reverse('student_portal:upload_session', args=[session.id])
+    response = JsonResponse({
+        'status': 'success',
+        'id': str(session.id),
+        'url': url,
+        'finalize_url': reverse('student_portal:finalize_upload', args=[session.id]),
+        'offset': 0,
+        'chunk_size': settings.UPLOAD_CHUNK_SIZE,
+    }, status=201)
+    response['Location'] = url
+    return _offset_headers(response, session)
+
+
+@query_budget(6)
+@login_required
+@require_http_methods(['HEAD', 'PATCH', 'DELETE'])
+def upload_session(request, session_id):
+    session, error = _get_session(request, session_id)
+    if error:
+        return error
+
+    if request.method == 'HEAD':
+        return _offset_headers(HttpResponse(), session)
+
+    if request.method == 'DELETE':
+        _remove_partial(session)
+        session.delete()
+        return HttpResponse(status=204)
+
+    try:
+        offset = int(request.headers['Upload-Offset'])
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except (KeyError, ValueError):
+        return _error('Upload-Offset and Content-Length headers are required', 400)
+    if offset != session.offset:
+        # Usually a retry of a chunk that did arrive; the client resumes from here
+        return _error('Offset does not match the upload', 409, **{'Upload-Offset': str(session.offset)})
+    if length <= 0:
+        return _error('Empty chunk', 400)
+    if offset + length > session.size:
+        return _error('Chunk goes past the declared file size', 413)
+
+    # Claim the range before writing it: of two clients racing on the same
+    # offset only one gets here, and the other never touches the file
+    end = offset + length
+    claimed = UploadSession.objects.filter(pk=session.pk, offset=offset).update(
+        offset=end, updated_at=timezone.now()
+    )
+    if not claimed:
+        return _conflict(session)
+
+    position = offset
+    message = None
+    try:
+        fd = os.open(session.partial_path, os.O_WRONLY)
+    except FileNotFoundError:
+        return _error('Upload not found', 404)
+    try:
+        while position < end:
+            block = request.read(min(READ_SIZE, end - position))
+            if not block:
+                # Connection dropped mid-chunk: keep what arrived
+                break
+            # Decide as soon as the chunk holds every byte the check looks at
+            if position == 0 and len(block) >= min(SIGNATURE_WINDOW, session.size):
+                message = _signature_error(session, block)
+                if message:
+                    break
+            os.pwrite(fd, block, position)
+            position += len(block)
+    except BaseException:
+        _release(session, end, position)
+        raise
+    finally:
+        os.close(fd)
+
+    if position < end and not _release(session, end, position):
+        return _error('Upload was interrupted, please start again', 410)
+    if message:
+        return _error(message, 415)
+    session.offset = position
+    return _offset_headers(HttpResponse(status=204), session)
+
+
+def _finalized(document, status=200):
+    return JsonResponse({
+        'status': 'success',
+        'id': document.id,
+        'name': document.display_name,
+    }, status=status)
+
+
+def _finalize_result(session):
+    """Response for a session another request has already claimed"""
+    session.refresh_from_db(fields=['finalized', 'document'])
+    if session.document is not None:
+        return _finalized(session.document)
+    if session.finalized:
+        return _error('Upload is being finalized', 409)
+    return _error('Upload not found', 404)
+
+
+@query_budget(9)
+@login_required
+@require_POST
+def finalize_upload(request, session_id):
+    """Create the Document for a fully received upload, once"""
+    session, error = _get_session(request, session_id)
+    if error:
+        return error
+    if session.finalized:
+        return _finalize_result(session)
+    if not session.is_complete:
+        return _error('Upload is not complete', 409, **{'Upload-Offset': str(session.offset)})
+
+    # Claim the session the way PATCH claims ranges: of two finalize requests
+    # (a retry, a double click) only one creates the Document
+    claimed = UploadSession.objects.filter(pk=session.pk, finalized=False, offset=session.size).update(
+        finalized=True, updated_at=timezone.now()
+    )
+    if not claimed:
+        return _finalize_result(session)
+
+    try:
+        with open(session.partial_path, 'rb') as partial:
+            # Chunks may have been too short to check on arrival
+            message = _signature_error(session, partial.read(SIGNATURE_WINDOW))
+            if message:
+                _remove_partial(session)
+                session.delete()
+                return _error(message, 415)
+            partial.seek(0)
+            document = Document(
+                student=session.student,
+                document_type=session.document_type,
+                description=session.description,
+                file=PartialUpload(partial, name=session.filename),
+            )
+            document.save()
+    except FileNotFoundError:
+        session.delete()
+        return _error('Upload not found', 404)
+    except BaseException:
+        # Let a retry have another go
+        UploadSession.objects.filter(pk=session.pk, document=None).update(finalized=False)
+        raise
+    UploadSession.objects.filter(pk=session.pk).update(document=document)
+    # Left behind only when the content was already stored
+    _remove_partial(session)
+
+    return _finalized(document, status=201)
@@ -1,5 +1,7 @@
 from django.urls import path
 from . import views
+from .download_views import download_document
+from .upload_views import start_upload, upload_session, finalize_upload
 from .password_reset_views import student_forgot_password, student_password_reset_confirm
 
 app_name = 'student_portal'
@@ -15,11 +17,12 @@ urlpatterns = [
     
     # Profile
     path('profile/', views.student_profile, name='profile'),
-    path('profile/personal-details/', views.personal_details, name='personal_details'),
-    path('profile/parents-details/', views.parents_details, name='parents_details'),
-    path('profile/academic-qualifications/', views.academic_qualifications, name='academic_qualifications'),
-    path('profile/study-preferences/', views.study_preferences, name='study_preferences'),
-    path('profile/emergency-contact/', views.emergency_contact, name='emergency_contact'),
+    path('profile/personal-details/', views.profile_section, {'section': 'personal_details'}, name='personal_details'),
+    path('profile/parents-details/', views.profile_section, {'section': 'parents_details'}, name='parents_details'),
+    path('profile/academic-qualifications/', views.profile_section, {'section': 'academic_qualifications'}, name='academic_qualifications'),
+    path('profile/study-preferences/', views.profile_section, {'section': 'study_preferences'}, name='study_preferences'),
+    path('profile/emergency-contact/', views.profile_section, {'section': 'emergency_contact'}, name='emergency_contact'),
+    path('profile/sections/<str:section>/', views.profile_section_api, name='profile_section_api'),
     
     # Applications
     path('applications/', views.applications, name='applications'),
@@ -36,6 +39,10 @@ urlpatterns = [
     
     # Documents
     path('documents/', views.documents, name='documents'),
+    path('documents/<int:document_id>/file/', download_document, name='download_document'),
+    path('documents/uploads/', start_upload, name='start_upload'),
+    path('documents/uploads/<uuid:session_id>/', upload_session, name='upload_session'),
+    path('documents/uploads/<uuid:session_id>/finalize/', finalize_upload, name='finalize_upload'),
     path('documents/services/', views.document_services, name='document_services'),
     path('documents/services/<str:service_type>/', views.service_form, name='service_form'),
     
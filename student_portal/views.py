@@ -7,18 +7,26 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.http import require_http_methods
 from django.conf import settings
 import json
 from datetime import datetime
-from .models import StudentProfile, Application, Document, Message, Payment
-from .forms import (StudentProfileForm, DocumentForm, ApplicationForm, 
-                    PersonalDetailsForm, ParentsDetailsForm, AcademicQualificationsForm,
-                    StudyPreferencesForm, EmergencyContactForm)
+from .models import Application, Document, Message, Payment
+from .forms import StudentProfileForm, DocumentForm, ApplicationForm, UploadErrorsMixin
+from .profile_sections import SECTIONS, partial_form, section_state, update_section
 from .clickpesa_service import clickpesa_service
+from .middleware import get_student_profile
+from globalagency_project.utils.cache_utils import (
+    USER_MESSAGES_TAG, get_user_applications, get_user_application_stats,
+    get_user_dashboard_counts, invalidate_tags,
+)
+from globalagency_project.utils.upload_handlers import upload_errors
 
 # ADD THIS IMPORT
 from employee.models import UserProfile
+from globalagency_project.utils.query_budget import query_budget
 
+@query_budget(12)
 @csrf_protect
 def student_login(request):
     # If user is already authenticated, redirect to dashboard
@@ -50,21 +58,8 @@ def student_login(request):
             # Login the user
             login(request, user)
             
-            # Ensure student profile exists
-            try:
-                StudentProfile.objects.get(user=user)
-            except StudentProfile.DoesNotExist:
-                try:
-                    StudentProfile.objects.create(
-                        user=user,
-                        phone_number='',
-                        address='',
-                        nationality='',
-                        emergency_contact=''
-                    )
-                    print("Student profile created")
-                except Exception as e:
-                    print(f"Profile creation error: {e}")
+            # Provision the profile here so views can rely on request.student_profile
+            get_student_profile(user)
             
             messages.success(request, 'Login successful!')
             return redirect('student_portal:dashboard')
@@ -75,21 +70,20 @@ def student_login(request):
     return render(request, 'student_portal/login.html')
 
 # ALL OTHER VIEWS
+@query_budget(11)
 @login_required(login_url='student_portal:login')
 def student_dashboard(request):
     """Student dashboard view"""
-    # Ensure student profile exists
-    profile, created = StudentProfile.objects.get_or_create(user=request.user)
+    profile = request.student_profile
     
-    # Get student data
-    applications = Application.objects.filter(student=request.user).select_related('student').prefetch_related('payment_set')
-    documents = Document.objects.filter(student=request.user)
-    unread_messages = Message.objects.filter(student=request.user, is_read=False)
+    # Get student data (cached; invalidated by student_portal.signals)
+    applications = get_user_applications(request.user.id)
+    counts = get_user_dashboard_counts(request.user.id)
     
     context = {
         'applications': applications,
-        'documents_count': documents.count(),
-        'unread_messages_count': unread_messages.count(),
+        'documents_count': counts['documents_count'],
+        'unread_messages_count': counts['unread_messages_count'],
         'profile_completion': profile.get_completion_percentage(),
     }
     
@@ -100,17 +94,14 @@ def student_dashboard(request):
     response['Expires'] = '0'
     return response
 
+@query_budget(9)
 @login_required
 def student_profile(request):
     """Student profile view"""
-    # This will automatically create profile if it doesn't exist
-    profile, created = StudentProfile.objects.get_or_create(user=request.user)
-    
-    if created:
-        messages.info(request, 'Please complete your profile information.')
+    profile = request.student_profile
     
     if request.method == 'POST':
-        form = StudentProfileForm(request.POST, request.FILES, instance=profile)
+        form = StudentProfileForm(request.POST, request.FILES, instance=profile, upload_errors=upload_errors(request))
         if form.is_valid():
             form.save()
             messages.success(request, 'Profile updated successfully!')
@@ -128,123 +119,72 @@ def student_profile(request):
     return response
 
 # Profile Section Views
+@query_budget(9)
 @login_required
-def personal_details(request):
-    """Personal details form view"""
-    profile, created = StudentProfile.objects.get_or_create(user=request.user)
-    
-    if request.method == 'POST':
-        form = PersonalDetailsForm(request.POST, request.FILES, instance=profile)
-        if form.is_valid():
-            form.save()
-            messages.success(request, 'Personal details saved successfully!')
-            return redirect('student_portal:parents_details')
-        else:
-            messages.error(request, 'Please correct the errors below.')
-    else:
-        form = PersonalDetailsForm(instance=profile)
-    
-    context = {
-        'form': form,
-        'profile_completion': profile.get_completion_percentage(),
-    }
-    return render(request, 'student_portal/personal_details.html', context)
-
-@login_required
-def parents_details(request):
-    """Parents details form view"""
-    profile, created = StudentProfile.objects.get_or_create(user=request.user)
-    
-    if request.method == 'POST':
-        form = ParentsDetailsForm(request.POST, instance=profile)
-        if form.is_valid():
-            form.save()
-            messages.success(request, 'Parents details saved successfully!')
-            return redirect('student_portal:academic_qualifications')
-        else:
-            messages.error(request, 'Please correct the errors below.')
-    else:
-        form = ParentsDetailsForm(instance=profile)
-    
-    context = {
-        'form': form,
-        'profile_completion': profile.get_completion_percentage(),
-    }
-    return render(request, 'student_portal/parents_details.html', context)
-
-@login_required
-def academic_qualifications(request):
-    """Academic qualifications form view"""
-    profile, created = StudentProfile.objects.get_or_create(user=request.user)
-    
-    if request.method == 'POST':
-        form = AcademicQualificationsForm(request.POST, instance=profile)
-        if form.is_valid():
-            form.save()
-            messages.success(request, 'Academic qualifications saved successfully!')
-            return redirect('student_portal:study_preferences')
-        else:
-            messages.error(request, 'Please correct the errors below.')
-    else:
-        form = AcademicQualificationsForm(instance=profile)
-    
-    context = {
-        'form': form,
-        'profile_completion': profile.get_completion_percentage(),
-    }
-    return render(request, 'student_portal/academic_qualifications.html', context)
-
-@login_required
-def study_preferences(request):
-    """Study preferences form view"""
-    profile, created = StudentProfile.objects.get_or_create(user=request.user)
+def profile_section(request, section):
+    """Form page for one profile section (see profile_sections.SECTIONS)"""
+    section_info = SECTIONS[section]
+    profile = request.student_profile
     
     if request.method == 'POST':
-        form = StudyPreferencesForm(request.POST, instance=profile)
+        form_kwargs = {'instance': profile}
+        if issubclass(section_info.form_class, UploadErrorsMixin):
+            form_kwargs['upload_errors'] = upload_errors(request)
+        form = section_info.form_class(request.POST, request.FILES, **form_kwargs)
         if form.is_valid():
-            form.save()
-            messages.success(request, 'Study preferences saved successfully!')
-            return redirect('student_portal:emergency_contact')
+            update_section(form)
+            messages.success(request, section_info.success_message)
+            return redirect(section_info.next_url)
         else:
             messages.error(request, 'Please correct the errors below.')
     else:
-        form = StudyPreferencesForm(instance=profile)
+        form = section_info.form_class(instance=profile)
     
     context = {
         'form': form,
         'profile_completion': profile.get_completion_percentage(),
     }
-    return render(request, 'student_portal/study_preferences.html', context)
+    return render(request, section_info.template, context)
 
+@query_budget(5)
 @login_required
-def emergency_contact(request):
-    """Emergency contact form view"""
-    profile, created = StudentProfile.objects.get_or_create(user=request.user)
-    
-    if request.method == 'POST':
-        form = EmergencyContactForm(request.POST, instance=profile)
-        if form.is_valid():
-            form.save()
-            messages.success(request, 'Emergency contact information saved successfully! Your profile is now complete.')
-            return redirect('student_portal:dashboard')
-        else:
-            messages.error(request, 'Please correct the errors below.')
-    else:
-        form = EmergencyContactForm(instance=profile)
+@require_http_methods(['GET', 'PATCH'])
+def profile_section_api(request, section):
+    """
+    JSON autosave for a profile section: GET returns the section's values,
+    PATCH {"field": value, ...} saves only the fields sent
+    """
+    if section not in SECTIONS:
+        return JsonResponse({'status': 'error', 'message': 'Unknown profile section'}, status=404)
+    form_class = SECTIONS[section].form_class
+    profile = request.student_profile
     
-    context = {
-        'form': form,
-        'profile_completion': profile.get_completion_percentage(),
-    }
-    return render(request, 'student_portal/emergency_contact.html', context)
+    if request.method == 'PATCH':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return JsonResponse({'status': 'error', 'message': 'Send a JSON object of fields'}, status=400)
+        writable = set(form_class._meta.fields) - {'profile_picture'}
+        unknown = sorted(set(data) - writable)
+        if unknown:
+            return JsonResponse({'status': 'error', 'message': f'Unknown fields: {", ".join(unknown)}'}, status=400)
+        
+        form = partial_form(form_class, profile, {name: '' if value is None else value for name, value in data.items()})
+        if not form.is_valid():
+            return JsonResponse({'status': 'error', 'message': 'Invalid values', 'errors': form.errors}, status=400)
+        return JsonResponse({'status': 'success', 'updated': update_section(form), **section_state(profile)})
+    
+    form = form_class(instance=profile)
+    values = {name: form[name].value() for name in form.fields if name != 'profile_picture'}
+    return JsonResponse({'status': 'success', 'values': values, **section_state(profile)}, json_dumps_params={'default': str})
 
+@query_budget(6)
 @login_required
 def applications(request):
     """Applications list view"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
-    applications_list = Application.objects.filter(student=request.user).order_by('-created_at')
+    applications_list = get_user_applications(request.user.id)
     
     # Add cache control
     response = render(request, 'student_portal/applications.html', {'applications': applications_list})
@@ -253,12 +193,10 @@ def applications(request):
     response['Expires'] = '0'
     return response
 
+@query_budget(5)
 @login_required
 def application_detail(request, application_id):
     """Application detail view"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
     application = get_object_or_404(Application, id=application_id, student=request.user)
     
     # Add cache control
@@ -268,13 +206,11 @@ def application_detail(request, application_id):
     response['Expires'] = '0'
     return response
 
+@query_budget(9)
 @login_required
 @csrf_protect
 def create_application(request):
     """Create application view"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
     if request.method == 'POST':
         form = ApplicationForm(request.POST)
         if form.is_valid():
@@ -316,13 +252,11 @@ def create_application(request):
     response['Expires'] = '0'
     return response
 
+@query_budget(9)
 @login_required
 @csrf_protect
 def payment_page(request, application_id):
     """M-PESA Manual Payment Instructions"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
     application = get_object_or_404(Application, id=application_id, student=request.user)
     
     # Check if application is already paid
@@ -363,6 +297,7 @@ def payment_page(request, application_id):
     response['Expires'] = '0'
     return response
 
+@query_budget(9)
 @login_required
 def make_payment(request, application_id):
     """Enhanced payment retry functionality"""
@@ -490,7 +425,7 @@ def process_clickpesa_card_payment(request, application):
         order_reference = f"APP{application.id}_{int(datetime.now().timestamp())}"
         
         # Get customer details
-        student_profile = StudentProfile.objects.get(user=request.user)
+        student_profile = request.student_profile
         customer_email = request.user.email or f"{request.user.username}@example.com"
         customer_name = f"{request.user.first_name} {request.user.last_name}".strip() or request.user.username
         customer_phone = student_profile.phone_number if hasattr(student_profile, 'phone_number') else ""
@@ -677,12 +612,10 @@ def process_card_payment(request, application, card_number, card_holder, expiry_
         messages.error(request, f'Card payment failed: {str(e)}')
         return redirect('student_portal:payment', application_id=application.id)
 
+@query_budget(10)
 @login_required
 def payment_verification(request, payment_id):
     """Page to verify payment status"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
     payment = get_object_or_404(Payment, id=payment_id, student=request.user)
     
     # Auto-check status if payment is pending and using ClickPesa
@@ -773,6 +706,7 @@ def payment_verification(request, payment_id):
     response['Expires'] = '0'
     return response
 
+@query_budget(6)
 @login_required
 def check_payment_status_ajax(request, payment_id):
     """AJAX endpoint to check payment status"""
@@ -830,9 +764,6 @@ def check_payment_status_ajax(request, payment_id):
 @login_required
 def check_payment_status(request, payment_id):
     """Utility function to check payment status"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
     payment = get_object_or_404(Payment, id=payment_id, student=request.user)
     return JsonResponse({
         'is_successful': payment.is_successful,
@@ -841,14 +772,12 @@ def check_payment_status(request, payment_id):
         'amount': payment.amount
     })
 
+@query_budget(9)
 @login_required
 def documents(request):
     """Documents view"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
     if request.method == 'POST':
-        form = DocumentForm(request.POST, request.FILES)
+        form = DocumentForm(request.POST, request.FILES, upload_errors=upload_errors(request))
         if form.is_valid():
             try:
                 document = form.save(commit=False)
@@ -875,12 +804,10 @@ def documents(request):
     response['Expires'] = '0'
     return response
 
+@query_budget(4)
 @login_required
 def document_services(request):
     """Document services view"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
     services = [
         {'type': 'university', 'name': 'University Application', 'description': 'Assistance with university applications'},
         {'type': 'visa', 'name': 'Visa Support', 'description': 'Visa application and processing support'},
@@ -897,12 +824,10 @@ def document_services(request):
     response['Expires'] = '0'
     return response
 
+@query_budget(8)
 @login_required
 def service_form(request, service_type):
     """Service form view"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
     service_names = {
         'university': 'University Application',
         'visa': 'Visa Support',
@@ -946,18 +871,17 @@ def service_form(request, service_type):
     response['Expires'] = '0'
     return response
 
+@query_budget(6)
 @login_required
 def messages_list(request):
     """Messages list view"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
     messages_list = Message.objects.filter(student=request.user).order_by('-created_at')
     
     # Mark all as read when user visits messages page
     unread_messages = messages_list.filter(is_read=False)
-    if unread_messages.exists():
-        unread_messages.update(is_read=True)
+    if unread_messages.update(is_read=True):
+        # update() bypasses post_save, so drop the cached unread count here
+        invalidate_tags(USER_MESSAGES_TAG.format(user_id=request.user.id))
     
     # Add cache control
     response = render(request, 'student_portal/messages.html', {'messages_list': messages_list})
@@ -966,6 +890,7 @@ def messages_list(request):
     response['Expires'] = '0'
     return response
 
+@query_budget(8)
 @login_required
 def mark_message_read(request, message_id):
     """Mark message as read"""
@@ -980,6 +905,7 @@ def mark_message_read(request, message_id):
     
     return JsonResponse({'success': False, 'error': 'Invalid method'})
 
+@query_budget(6)
 @login_required
 def student_logout(request):
     """Student logout view"""
@@ -991,9 +917,6 @@ def student_logout(request):
 @login_required
 def delete_application(request, application_id):
     """Delete an application"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
     if request.method == 'POST':
         try:
             application = get_object_or_404(Application, id=application_id, student=request.user)
@@ -1013,9 +936,6 @@ def delete_application(request, application_id):
 @login_required
 def delete_document(request, document_id):
     """Delete a document"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
     if request.method == 'POST':
         try:
             document = get_object_or_404(Document, id=document_id, student=request.user)
@@ -1029,19 +949,7 @@ def delete_document(request, document_id):
 @login_required
 def application_statistics(request):
     """Get application statistics for dashboard"""
-    # Ensure student profile exists
-    StudentProfile.objects.get_or_create(user=request.user)
-    
-    applications = Application.objects.filter(student=request.user).select_related('student').prefetch_related('payment_set')
-    
-    stats = {
-        'total': applications.count(),
-        'submitted': applications.filter(status='submitted').count(),
-        'pending_payment': applications.filter(status='pending_payment').count(),
-        'under_review': applications.filter(status='under_review').count(),
-        'approved': applications.filter(status='approved').count(),
-        'rejected': applications.filter(status='rejected').count(),
-    }
+    stats = get_user_application_stats(request.user.id)
     
     return JsonResponse(stats)
 
@@ -1059,6 +967,7 @@ def handler400(request, exception):
     return render(request, 'student_portal/400.html', status=400)
 
 # KEEP ALL CSRF EXEMPT WEBHOOK FUNCTIONS EXACTLY THE SAME
+@query_budget(6)
 @csrf_exempt
 def payment_webhook(request, provider):
     """Webhook endpoint for payment providers (Legacy)"""
@@ -1115,6 +1024,7 @@ def payment_webhook(request, provider):
     
     return JsonResponse({'status': 'error', 'message': 'Method not allowed'})
 
+@query_budget(6)
 @csrf_exempt
 def clickpesa_webhook(request):
     """